@@ -0,0 +1,105 @@
+import numpy as np
+from Archive import overlapping_sessions
+from Schema import from_timestamp, SECONDS_PER_DAY
+
+DEFAULT_SLOT_SECONDS = 300  # 默认时间槽长度（5分钟）
+CHUNK_DAYS = 31  # 按块栅格化的天数，限制在场矩阵的内存占用
+
+
+# --------------------------
+# 实验室占用分析（NumPy 向量化）
+# --------------------------
+def load_sessions(conn, start_ts, end_ts, names):
+    """
+    读取与 [start_ts, end_ts) 有交集的会话
+    :param names: 参与统计的成员列表，决定矩阵的行序
+    :return: (user_idx, starts, ends) 三个等长的 int64 数组
+    """
+    row_of = {name: i for i, name in enumerate(names)}
+    params = {"range_start": start_ts, "range_end": end_ts}
+    rows = [
+        (row_of[name], start_time, end_time)
+        for sessions in overlapping_sessions(conn, start_ts, end_ts)
+        for name, start_time, end_time in conn.execute(sessions, params)
+        if name in row_of
+    ]
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    data = np.array(rows, dtype=np.int64)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def presence_matrix(user_idx, starts, ends, n_users, start_ts, n_slots, slot_seconds):
+    """
+    将会话栅格化为 用户 × 时间槽 的在场矩阵（差分数组 + 累加，无 Python 循环）
+    会话与某个时间槽有交集即视为该槽在场；同一用户重叠的会话不会重复计数
+    :return: bool 矩阵，形状 (n_users, n_slots)
+    """
+    first = (starts - start_ts) // slot_seconds
+    last = (ends - start_ts) // slot_seconds + 1  # 不含
+    first = np.clip(first, 0, n_slots)
+    last = np.clip(last, 0, n_slots)
+    keep = first < last
+
+    diff = np.zeros((n_users, n_slots + 1), dtype=np.int32)
+    np.add.at(diff, (user_idx[keep], first[keep]), 1)
+    np.add.at(diff, (user_idx[keep], last[keep]), -1)
+    return np.cumsum(diff[:, :n_slots], axis=1) > 0
+
+
+def occupancy_heatmap(conn, start_ts, end_ts, names, slot_seconds=DEFAULT_SLOT_SECONDS):
+    """
+    统计 [start_ts, end_ts)（整天）内每个时间槽的在场人数，并按星期聚合
+    :return: {
+        "slot_minutes", "days",
+        "mean"/"peak": [每个时间槽的平均/最高人数],
+        "weekday_mean"/"weekday_peak": 7 × 时间槽（周一为第 0 行），
+        "weekday_days": 各星期参与统计的天数
+    }
+    """
+    if SECONDS_PER_DAY % slot_seconds:
+        raise ValueError("时间槽长度需能整除一天")
+    slots_per_day = SECONDS_PER_DAY // slot_seconds
+    n_days = (end_ts - start_ts) // SECONDS_PER_DAY
+
+    user_idx, starts, ends = load_sessions(conn, start_ts, end_ts, names)
+
+    # 按块栅格化，得到每天每槽的在场人数
+    daily = np.zeros((n_days, slots_per_day), dtype=np.int32)
+    for chunk_start in range(0, n_days, CHUNK_DAYS):
+        chunk_days = min(CHUNK_DAYS, n_days - chunk_start)
+        chunk_ts = start_ts + chunk_start * SECONDS_PER_DAY
+        chunk_end = chunk_ts + chunk_days * SECONDS_PER_DAY
+        mask = (starts < chunk_end) & (ends >= chunk_ts)
+        presence = presence_matrix(
+            user_idx[mask],
+            starts[mask],
+            ends[mask],
+            len(names),
+            chunk_ts,
+            chunk_days * slots_per_day,
+            slot_seconds,
+        )
+        daily[chunk_start : chunk_start + chunk_days] = presence.sum(
+            axis=0, dtype=np.int32
+        ).reshape(chunk_days, slots_per_day)
+
+    first_weekday = from_timestamp(start_ts).weekday()
+    weekdays = (np.arange(n_days) + first_weekday) % 7
+    weekday_days = np.bincount(weekdays, minlength=7)
+    weekday_sum = np.zeros((7, slots_per_day), dtype=np.int64)
+    np.add.at(weekday_sum, weekdays, daily)
+    weekday_peak = np.zeros((7, slots_per_day), dtype=np.int32)
+    np.maximum.at(weekday_peak, weekdays, daily)
+    weekday_mean = weekday_sum / np.maximum(weekday_days, 1)[:, None]
+
+    return {
+        "slot_minutes": slot_seconds // 60,
+        "days": int(n_days),
+        "mean": np.round(daily.mean(axis=0), 3).tolist() if n_days else [],
+        "peak": daily.max(axis=0).tolist() if n_days else [],
+        "weekday_mean": np.round(weekday_mean, 3).tolist(),
+        "weekday_peak": weekday_peak.tolist(),
+        "weekday_days": weekday_days.tolist(),
+    }
@@ -0,0 +1,355 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from Logger import setup_logger
+from Schema import (
+    to_timestamp,
+    from_timestamp,
+    read_meta,
+    write_meta,
+    bump_version,
+    overlap_query,
+    ATTENDANCE_MAX_SPAN,
+    HISTORY_EPOCH,
+    LONG_SESSION_SPAN,
+)
+
+logger = setup_logger("archive")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "12"))  # 0 表示不归档
+ARCHIVE_RETENTION_MONTHS = int(
+    os.getenv("ARCHIVE_RETENTION_MONTHS", "0")
+)  # 0 表示永久保留
+ARCHIVE_COMPACT = os.getenv("ARCHIVE_COMPACT", "incremental")  # vacuum/incremental/none
+MERGE_GAP_SECONDS = int(os.getenv("MERGE_GAP_SECONDS", "1800"))  # 与考勤服务一致
+
+ATTACH_BATCH = 8  # 每批附加的归档文件数（SQLite 默认最多同时附加 10 个数据库）
+
+_FILE_PATTERN = re.compile(r"^attendance-(\d{4})-(\d{2})\.db$")
+
+
+def month_start(ts):
+    """时间戳所在月份第一天零点"""
+    dt = from_timestamp(ts)
+    return to_timestamp(datetime(dt.year, dt.month, 1))
+
+
+def add_months(month_ts, months):
+    dt = from_timestamp(month_ts)
+    index = dt.year * 12 + dt.month - 1 + months
+    return to_timestamp(datetime(index // 12, index % 12 + 1, 1))
+
+
+def archive_path(month_ts, directory=ARCHIVE_DIR):
+    return os.path.join(
+        directory, f"attendance-{from_timestamp(month_ts).strftime('%Y-%m')}.db"
+    )
+
+
+def _alias(month_ts):
+    return f"archive_{from_timestamp(month_ts).strftime('%Y%m')}"
+
+
+def span_key(month_ts):
+    """主库 meta 中记录各归档月份最长会话时长的键"""
+    return f"{ATTENDANCE_MAX_SPAN}:{from_timestamp(month_ts).strftime('%Y-%m')}"
+
+
+# --------------------------
+# 归档目录（按月份索引各归档文件，目录变化时重新扫描）
+# --------------------------
+class ArchiveCatalog:
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._months = []
+
+    def months(self):
+        """:return: 按月份排序的 [(month_ts, path), ...]"""
+        try:
+            stamp = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if stamp != self._stamp:
+                months = []
+                for filename in os.listdir(self.directory):
+                    match = _FILE_PATTERN.match(filename)
+                    if match:
+                        month_ts = to_timestamp(
+                            datetime(int(match.group(1)), int(match.group(2)), 1)
+                        )
+                        months.append(
+                            (month_ts, os.path.join(self.directory, filename))
+                        )
+                self._months, self._stamp = sorted(months), stamp
+            return self._months
+
+
+archive_catalog = ArchiveCatalog()
+
+
+def _months_in_range(conn, start_ts, end_ts, catalog):
+    """:return: 可能含有与 [start_ts, end_ts) 相交会话的归档月份 [(month_ts, path), ...]"""
+    months = catalog.months()
+    if not months:
+        return []
+    # 按各月份自己的最长会话判断是否可能与查询范围相交；
+    # 未记录的月份（早期生成的归档文件）按全局最长会话保守估计
+    spans = dict(
+        conn.execute(
+            "SELECT key, value FROM meta WHERE key LIKE ?",
+            (f"{ATTENDANCE_MAX_SPAN}:%",),
+        ).fetchall()
+    )
+    fallback = read_meta(conn, ATTENDANCE_MAX_SPAN, 0)
+    return [
+        (month_ts, path)
+        for month_ts, path in months
+        if month_ts < end_ts
+        and add_months(month_ts, 1) + spans.get(span_key(month_ts), fallback) > start_ts
+    ]
+
+
+def overlapping_sessions(
+    conn,
+    start_ts,
+    end_ts,
+    columns="name, start_time, end_time",
+    catalog=archive_catalog,
+):
+    """
+    查询与 [:range_start, :range_end) 有交集的考勤会话，按查询范围附加所需的归档文件
+    归档文件按月份分批附加，每批生成一条语句；各批按月份先后排列，主库在最后一批，
+    因此逐批按 start_time 排序即得到整体有序的结果
+    :param columns: 查询的列（attendance 表的列）
+    :yield: SELECT {columns} ... 语句（命名参数 range_start/range_end），
+            可直接执行或作为子查询；进入下一批前分离上一批附加的归档文件
+    """
+    months = _months_in_range(conn, start_ts, end_ts, catalog)
+    batches = [
+        months[i : i + ATTACH_BATCH] for i in range(0, len(months), ATTACH_BATCH)
+    ]
+    readonly = bool(months) and conn.execute("PRAGMA query_only").fetchone()[0]
+
+    for number, batch in enumerate(batches or [[]], 1):
+        attached, tables = [], []
+        try:
+            existing = {row[1] for row in conn.execute("PRAGMA database_list")}
+            for month_ts, path in batch:
+                alias = _alias(month_ts)
+                if alias not in existing:
+                    source = f"file:{path}?mode=ro" if readonly else path
+                    conn.execute("ATTACH DATABASE ? AS " + alias, (source,))
+                    attached.append(alias)
+                tables.append(f"{alias}.attendance")
+            if number == max(len(batches), 1):
+                tables.append("main.attendance")
+            yield " UNION ALL ".join(overlap_query(columns, table) for table in tables)
+        finally:
+            for alias in attached:
+                conn.execute(f"DETACH DATABASE {alias}")
+
+
+def archived_sessions(conn, start_ts, end_ts, catalog=archive_catalog):
+    """
+    读取归档文件中与 [start_ts, end_ts) 有交集的会话
+    每个归档文件单独以只读连接打开，不附加到 conn：供写事务内使用
+    （事务中读取过的附加数据库在提交前无法分离）
+    :return: [(name, start_time, end_time), ...]
+    """
+    params = {"range_start": start_ts, "range_end": end_ts}
+    sessions = []
+    for _, path in _months_in_range(conn, start_ts, end_ts, catalog):
+        archive = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            sessions += archive.execute(overlap_query(), params).fetchall()
+        finally:
+            archive.close()
+    return sessions
+
+
+# --------------------------
+# 归档：将已结束月份的会话移入按月的归档文件，并压缩主库
+# --------------------------
+def _archive_month(db, month_ts, path, open_after):
+    """
+    将开始于该月的会话移入归档文件（先提交复制、再删除，重复执行是安全的）
+    结束时间不早于 open_after 的会话可能仍在延长（考勤服务按 id 更新），留在主库，
+    结束后由之后的归档移出
+    :return: 移动的记录数
+    """
+    next_month = add_months(month_ts, 1)
+    alias = _alias(month_ts)
+    with db.get_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        try:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {alias}.attendance (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    start_time INTEGER NOT NULL,
+                    end_time INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS {alias}.idx_attendance_name_start
+                ON attendance (name, start_time, end_time)
+                """
+            )
+            conn.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS {alias}.idx_attendance_start
+                ON attendance (start_time, end_time, name)
+                """
+            )
+            conn.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS {alias}.idx_attendance_long
+                ON attendance (start_time, end_time, name)
+                WHERE end_time - start_time >= {LONG_SESSION_SPAN}
+                """
+            )
+            conn.execute(
+                f"""
+                INSERT OR IGNORE INTO {alias}.attendance (id, name, start_time, end_time)
+                SELECT id, name, start_time, end_time FROM main.attendance
+                WHERE start_time >= ? AND start_time < ? AND end_time < ?
+                """,
+                (month_ts, next_month, open_after),
+            )
+            conn.commit()
+            # 主库与归档文件的提交不保证整体原子，复制提交后再删除，中断后重跑即可
+            moved = conn.execute(
+                """
+                DELETE FROM main.attendance
+                WHERE start_time >= ? AND start_time < ? AND end_time < ?
+                """,
+                (month_ts, next_month, open_after),
+            ).rowcount
+            max_span = conn.execute(
+                f"SELECT COALESCE(MAX(end_time - start_time), 0) FROM {alias}.attendance"
+            ).fetchone()[0]
+            write_meta(conn, span_key(month_ts), max_span)
+            conn.commit()
+        finally:
+            conn.execute(f"DETACH DATABASE {alias}")
+    return moved
+
+
+def compact(db, mode=ARCHIVE_COMPACT):
+    """
+    按策略回收主库空间
+    :param mode: vacuum（整库重建）/ incremental（增量回收，首次会切换并重建一次）/ none
+    """
+    if mode == "none":
+        return
+    with db.get_connection() as conn:
+        if mode == "incremental":
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            else:
+                conn.execute("PRAGMA incremental_vacuum")
+        elif mode == "vacuum":
+            conn.execute("VACUUM")
+        else:
+            raise ValueError(f"未知的压缩策略: {mode}")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def run_archive(
+    db,
+    now_ts,
+    keep_months=ARCHIVE_KEEP_MONTHS,
+    retention_months=ARCHIVE_RETENTION_MONTHS,
+    compact_mode=ARCHIVE_COMPACT,
+    catalog=archive_catalog,
+    merge_gap=MERGE_GAP_SECONDS,
+):
+    """
+    归档早于最近 keep_months 个整月的会话，删除超出保留期的归档文件，有变化时压缩主库
+    :param merge_gap: 会话合并间隔，最近该时长内仍在延长的会话暂不归档
+    :return: {"archived": {月份: 记录数}, "removed": [归档文件, ...]}
+    """
+    if keep_months < 1:
+        raise ValueError("主库至少保留 1 个整月")
+    if retention_months and retention_months <= keep_months:
+        raise ValueError("归档保留期需大于主库保留月数")
+
+    cutoff = add_months(month_start(now_ts), -keep_months)
+    with db.get_connection() as conn:
+        low = conn.execute(
+            "SELECT MIN(start_time) FROM attendance WHERE start_time < ?", (cutoff,)
+        ).fetchone()[0]
+
+    archived = {}
+    if low is not None:
+        os.makedirs(catalog.directory, exist_ok=True)
+        month_ts = month_start(low)
+        while month_ts < cutoff:
+            moved = _archive_month(
+                db,
+                month_ts,
+                archive_path(month_ts, catalog.directory),
+                now_ts - merge_gap,
+            )
+            if moved:
+                archived[from_timestamp(month_ts).strftime("%Y-%m")] = moved
+                logger.info(
+                    f"已归档 {from_timestamp(month_ts).strftime('%Y-%m')}: {moved} 条记录"
+                )
+            month_ts = add_months(month_ts, 1)
+
+    removed = []
+    if retention_months:
+        expire = add_months(month_start(now_ts), -retention_months)
+        for month_ts, path in catalog.months():
+            if month_ts < expire:
+                os.remove(path)
+                removed.append(path)
+                logger.info(f"已删除超出保留期的归档文件: {path}")
+    if removed:
+        # 删除的月份不再能查到，已结束日期的缓存需失效
+        with db.get_connection() as conn:
+            bump_version(conn, HISTORY_EPOCH)
+
+    if archived:
+        compact(db, compact_mode)
+    return {"archived": archived, "removed": removed}
+
+
+if __name__ == "__main__":
+    from Database import database_manager
+    from Schema import init_schema
+
+    parser = argparse.ArgumentParser(description="归档已结束月份的考勤记录")
+    parser.add_argument("--keep", type=int, default=ARCHIVE_KEEP_MONTHS)
+    parser.add_argument("--retention", type=int, default=ARCHIVE_RETENTION_MONTHS)
+    parser.add_argument(
+        "--compact",
+        choices=["vacuum", "incremental", "none"],
+        default=ARCHIVE_COMPACT,
+    )
+    args = parser.parse_args()
+
+    init_schema(database_manager)
+    result = run_archive(
+        database_manager,
+        to_timestamp(datetime.now()),
+        args.keep,
+        args.retention,
+        args.compact,
+    )
+    print(
+        f"归档 {sum(result['archived'].values())} 条记录"
+        f"（{len(result['archived'])} 个月），删除 {len(result['removed'])} 个过期归档文件"
+    )
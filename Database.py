@@ -1,20 +1,168 @@
 import sqlite3
 import os
+import atexit
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 
+# --------------------------
+# 连接池（线程安全，同一线程内可重入复用）
+# --------------------------
+class ConnectionPool:
+    def __init__(self, db_path, pragmas, readonly=False, max_idle=4):
+        """
+        :param db_path: 数据库文件路径
+        :param pragmas: 新建连接时执行的 PRAGMA {name: value}
+        :param readonly: 是否以只读方式打开（供 Web 读端使用）
+        :param max_idle: 最多保留的空闲连接数，多余的连接归还时直接关闭
+        """
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.readonly = readonly
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._local = threading.local()
+        self._closed = False
+
+    def _connect(self):
+        """新建连接并应用 PRAGMA"""
+        if self.readonly:
+            conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """借出连接；同一线程嵌套借用时复用同一个连接"""
+        local = self._local
+        if getattr(local, "conn", None) is not None:
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        local.conn, local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            local.conn, local.depth = None, 0
+            self._release(conn)
+
+    def _release(self, conn):
+        """归还连接，未结束的事务一律回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        """关闭全部空闲连接，之后归还的连接也会被直接关闭"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
 # --------------------------
 # 数据库管理器（封装数据库操作）
 # --------------------------
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, pragmas=None, read_pragmas=None, pool_size=4):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pragmas or {}, max_idle=pool_size)
+        self.read_pool = ConnectionPool(
+            db_path, read_pragmas or {}, readonly=True, max_idle=pool_size
+        )
 
+    @contextmanager
     def get_connection(self):
-        """获取数据库连接（使用上下文管理）"""
-        return sqlite3.connect(self.db_path)
+        """获取读写连接（使用上下文管理，正常退出提交，异常时回滚）"""
+        with self.pool.connection() as conn:
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            if conn.in_transaction and self.pool._local.depth == 1:
+                conn.commit()
+
+    def get_read_connection(self):
+        """获取只读连接（供 Web 读端使用，不会阻塞写端）"""
+        return self.read_pool.connection()
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        self.pool.close_all()
+        self.read_pool.close_all()
+
+    def migrate(self, migrations):
+        """
+        依次执行尚未应用的结构迁移（版本号记录在 PRAGMA user_version）
+        :param migrations: [(version, description, func(cursor)), ...]，按版本号递增
+        :return: 本次应用的迁移列表 [(version, description), ...]
+        """
+        applied = []
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            # 写锁保证多个进程同时启动时只有一个执行迁移
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            current = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for version, description, migration in migrations:
+                if version <= current:
+                    continue
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                applied.append((version, description))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return applied
 
 
 load_dotenv()
 DATABASE_PATH = os.getenv("DATABASE_PATH", "database.db")
-database_manager = DatabaseManager(DATABASE_PATH)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# 读写两端共用的 PRAGMA
+_COMMON_PRAGMAS = {
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT", "5000")),  # 毫秒
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),  # 字节
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", "-16000")),  # 负数表示 KiB
+}
+DB_PRAGMAS = {
+    "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+    **_COMMON_PRAGMAS,
+}
+DB_READ_PRAGMAS = {"query_only": "ON", **_COMMON_PRAGMAS}
+
+database_manager = DatabaseManager(
+    DATABASE_PATH, DB_PRAGMAS, DB_READ_PRAGMAS, pool_size=DB_POOL_SIZE
+)
+atexit.register(database_manager.close)
@@ -0,0 +1,149 @@
+import json
+import queue
+import threading
+import time
+
+SESSION_STARTED = "session_started"
+SESSION_EXTENDED = "session_extended"
+SESSION_ENDED = "session_ended"
+SCHEDULE_REFRESHED = "schedule_refreshed"
+
+EVENT_RETENTION = 86400  # 事件表保留时长（秒），断线重连时可补发这段时间内的事件
+READ_BATCH = 1000  # 每次从事件表读取的最多条数
+
+
+# --------------------------
+# 事件发布（写入方在自己的事务内调用，与数据变更一同提交）
+# --------------------------
+def publish_events(cursor, events, ts):
+    """
+    :param events: [(kind, payload_dict), ...]
+    :param ts: 事件时间戳
+    """
+    cursor.executemany(
+        "INSERT INTO events (ts, kind, payload) VALUES (?, ?, ?)",
+        [
+            (ts, kind, json.dumps(payload, ensure_ascii=False))
+            for kind, payload in events
+        ],
+    )
+
+
+def session_event(kind, name, session):
+    """会话事件，session 为 (id, start_ts, end_ts)"""
+    record_id, start_ts, end_ts = session
+    return kind, {"id": record_id, "name": name, "start": start_ts, "end": end_ts}
+
+
+def prune_events(cursor, before_ts):
+    """删除早于 before_ts 的事件"""
+    cursor.execute("DELETE FROM events WHERE ts < ?", (before_ts,))
+
+
+def read_events(conn, after_id, limit=READ_BATCH):
+    """:return: id 大于 after_id 的事件 [(id, kind, payload_json), ...]"""
+    return conn.execute(
+        "SELECT id, kind, payload FROM events WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit),
+    ).fetchall()
+
+
+# --------------------------
+# 事件广播
+# 单个后台线程轮询事件表，分发到各订阅者的队列；订阅者只等待自己的队列，不访问数据库
+# --------------------------
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False  # 队列积压溢出后被移除，客户端需重连补发
+
+    def get(self, timeout):
+        """:return: (id, kind, payload_json)，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroadcaster:
+    def __init__(self, db, interval=1.0, queue_size=1000, logger=None):
+        """
+        :param db: DatabaseManager
+        :param interval: 轮询事件表的间隔（秒）
+        :param queue_size: 每个订阅者最多积压的事件数
+        """
+        self.db = db
+        self.interval = interval
+        self.queue_size = queue_size
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self.last_id = None
+
+    def _latest_id(self):
+        with self.db.get_read_connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def subscribe(self, last_event_id=None):
+        """
+        注册订阅者；提供 last_event_id 时先补发其后的事件
+        :return: (Subscription, 补发的事件列表)
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if self._thread is None:
+                self.last_id = self._latest_id()
+                self._thread = threading.Thread(
+                    target=self._run, name="event-broadcaster", daemon=True
+                )
+                self._thread.start()
+            self._subscribers.add(subscription)
+            current = self.last_id
+
+        backlog = []
+        if last_event_id is not None and last_event_id < current:
+            with self.db.get_read_connection() as conn:
+                while True:
+                    rows = read_events(conn, last_event_id)
+                    rows = [row for row in rows if row[0] <= current]
+                    if not rows:
+                        break
+                    backlog.extend(rows)
+                    last_event_id = rows[-1][0]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _dispatch(self, rows):
+        """推进 last_id 并分发（持锁进行，保证新订阅者的补发与实时事件不重不漏）"""
+        with self._lock:
+            self.last_id = rows[-1][0]
+            for subscription in list(self._subscribers):
+                for row in rows:
+                    try:
+                        subscription.queue.put_nowait(row)
+                    except queue.Full:
+                        subscription.dropped = True
+                        self._subscribers.discard(subscription)
+                        break
+
+    def _run(self):
+        while True:
+            try:
+                with self.db.get_read_connection() as conn:
+                    rows = read_events(conn, self.last_id)
+                if rows:
+                    self._dispatch(rows)
+                    if len(rows) == READ_BATCH:
+                        continue
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"读取事件失败: {str(e)}")
+            time.sleep(self.interval)
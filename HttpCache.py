@@ -0,0 +1,86 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+
+# --------------------------
+# 已序列化的响应（同时保存原文与 gzip 压缩结果）
+# --------------------------
+class CachedResponse:
+    GZIP_MIN_SIZE = 512  # 小于该字节数的响应不压缩
+
+    def __init__(self, etag, body, headers=None):
+        """
+        :param etag: 强 ETag（不含引号）
+        :param body: 序列化后的响应体 bytes
+        :param headers: 需要随响应返回的额外头部
+        """
+        self.etag = etag
+        self.body = body
+        self.headers = headers or {}
+        self.gzip_body = (
+            gzip.compress(body, compresslevel=6)
+            if len(body) >= self.GZIP_MIN_SIZE
+            else None
+        )
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzip_body or b"")
+
+    def negotiate(self, if_none_match, accept_encoding):
+        """
+        根据请求头选择返回内容
+        :return: (status, headers, body)；命中协商缓存时 status 为 304，body 为空
+        """
+        use_gzip = self.gzip_body is not None and "gzip" in (accept_encoding or "")
+        # 不同编码是不同的表示，强 ETag 需区分
+        etag = f'"{self.etag}-gzip"' if use_gzip else f'"{self.etag}"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", **self.headers}
+
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or etag in (tag.strip() for tag in if_none_match.split(","))
+        ):
+            return 304, headers, b""
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return 200, headers, self.gzip_body
+        return 200, headers, self.body
+
+
+# --------------------------
+# 按内存上限淘汰的 LRU 响应缓存（线程安全）
+# --------------------------
+class ResponseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, entry):
+        """写入缓存并淘汰最久未使用的条目；超过上限的单个响应不缓存"""
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(entry.etag, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._entries[entry.etag] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
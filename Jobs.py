@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# --------------------------
+# 单飞后台任务
+# 同一时间最多只有一个实例在排队或执行，期间的新请求合并到该实例上
+# --------------------------
+class SingleFlightJob:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, name, func, executor=None, logger=None):
+        """
+        :param name: 任务名称
+        :param func: 任务函数，返回值（dict）会记录在状态的 result 字段中，抛出异常视为失败
+        :param executor: 执行器，默认使用单线程执行器
+        """
+        self.name = name
+        self.func = func
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=name
+        )
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._status = {"name": name, "state": None, "runs": 0}
+
+    def submit(self):
+        """
+        提交任务；已有任务在排队或执行时不重复提交
+        :return: (是否新提交, 当前状态)
+        """
+        with self._lock:
+            if self._status["state"] in (self.QUEUED, self.RUNNING):
+                self._status["coalesced"] += 1
+                return False, dict(self._status)
+            self._status = {
+                "name": self.name,
+                "state": self.QUEUED,
+                "runs": self._status["runs"] + 1,
+                "coalesced": 0,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration": None,
+                "result": None,
+                "error": None,
+            }
+            status = dict(self._status)
+        self.executor.submit(self._run)
+        return True, status
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _run(self):
+        with self._lock:
+            self._status.update(state=self.RUNNING, started_at=time.time())
+        start = time.perf_counter()
+        try:
+            result = self.func()
+            update = {"state": self.DONE, "result": result}
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"后台任务 {self.name} 失败: {str(e)}")
+            update = {"state": self.FAILED, "error": str(e)}
+        with self._lock:
+            self._status.update(
+                finished_at=time.time(),
+                duration=round(time.perf_counter() - start, 3),
+                **update,
+            )
@@ -1,30 +1,150 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import sys
+import threading
+import time
 from dotenv import load_dotenv
-from datetime import datetime
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 load_dotenv()
 LOG_DIR = os.getenv("LOG_DIR", ".logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text / json（每行一个 JSON 对象）
+LOG_BACKUP_DAYS = int(os.getenv("LOG_BACKUP_DAYS", "7"))
 
+TEXT_FORMAT = "%(asctime)s - <%(name)s> - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-def setup_logger(module_name: str, log_dir: str | None = LOG_DIR) -> logging.Logger:
-    """配置日志系统"""
-    os.makedirs(log_dir, exist_ok=True)
-    handler = TimedRotatingFileHandler(
-        filename=os.path.join(log_dir, f"{datetime.now().strftime('%Y-%m-%d')}.log"),
-        when="midnight",
-        backupCount=7,
-        encoding="utf-8",
-    )
-    formatter = logging.Formatter(
-        "%(asctime)s - <%(name)s> - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    handler.setFormatter(formatter)
 
-    logger = logging.getLogger(module_name)
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
+class JsonFormatter(logging.Formatter):
+    """结构化日志：每条记录一行 JSON，extra={"data": {...}} 中的字段原样输出"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data:
+            entry["data"] = data
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    入队前只合并消息参数，异常堆栈保留在 exc_text 中由后台的格式化器处理
+    （标准 QueueHandler 会把堆栈并入 msg，JSON 格式下无法单独输出 exc 字段）
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _EXC_FORMATTER.formatException(
+                record.exc_info
+            )
+            record.exc_info = None  # traceback 对象不随记录跨线程保留
+        return record
+
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+def _process_name():
+    """日志文件名取自入口脚本（attendance.log、server.log），各进程各写一个文件"""
+    name = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0]
+    return name if name and name != "-c" else "python"
+
+
+# --------------------------
+# 每个进程每个日志目录只有一个后台写线程：各模块的 logger 只把记录放入队列，
+# 文件写入与按天轮转都在后台线程完成，不阻塞监控循环与请求处理
+# --------------------------
+_lock = threading.Lock()
+_queue_handlers = {}  # 日志目录 -> QueueHandler
+_listeners = []
+
 
+def _queue_handler(log_dir):
+    with _lock:
+        handler = _queue_handlers.get(log_dir)
+        if handler is not None:
+            return handler
+
+        os.makedirs(log_dir, exist_ok=True)
+        # 固定的文件名，轮转后的文件带日期后缀（attendance.log.2025-03-01）
+        file_handler = TimedRotatingFileHandler(
+            filename=os.path.join(log_dir, f"{_process_name()}.log"),
+            when="midnight",
+            backupCount=LOG_BACKUP_DAYS,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(
+            JsonFormatter()
+            if LOG_FORMAT == "json"
+            else logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+        )
+
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, file_handler, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+        if len(_listeners) == 1:
+            atexit.register(_stop_listeners)
+
+        handler = _queue_handlers[log_dir] = _QueueHandler(records)
+        return handler
+
+
+def _stop_listeners():
+    """进程退出时写完队列中剩余的记录"""
+    for listener in _listeners:
+        listener.stop()
+
+
+def setup_logger(module_name: str, log_dir: str | None = LOG_DIR) -> logging.Logger:
+    """
+    配置日志系统（可重复调用，同一 logger 不会重复添加 handler）
+    :param log_dir: 日志目录，同一进程内相同目录的 logger 共用一个文件与后台写线程
+    """
+    handler = _queue_handler(log_dir)
+    logger = logging.getLogger(module_name)
+    logger.setLevel(LOG_LEVEL)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
     return logger
+
+
+class RateLimiter:
+    """限制高频日志的输出频率，期间被省略的次数在下一次输出时一并给出"""
+
+    def __init__(self, interval):
+        """
+        :param interval: 两次输出的最小间隔（秒），0 表示不限制
+        """
+        self.interval = interval
+        self.last = None
+        self.suppressed = 0
+
+    def allow(self, now=None):
+        """
+        :return: (本次是否输出, 上次输出以来省略的次数)
+        """
+        now = time.monotonic() if now is None else now
+        if self.last is not None and now - self.last < self.interval:
+            self.suppressed += 1
+            return False, self.suppressed
+        suppressed, self.suppressed, self.last = self.suppressed, 0, now
+        return True, suppressed
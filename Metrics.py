@@ -0,0 +1,221 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+COUNTER = "counter"
+HISTOGRAM = "histogram"
+
+# 默认的耗时分桶（秒）与行数分桶
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+# --------------------------
+# 进程内指标（计数器 / 直方图），各序列按标签区分
+# 记录只做一次加锁累加，不分配新对象（首次出现的标签组合除外）
+# --------------------------
+class Metric:
+    def __init__(self, name, description, kind, buckets=None):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.buckets = tuple(buckets) if buckets else ()
+        self._lock = threading.Lock()
+        self._series = {}  # 标签元组 -> 计数器数值 / 直方图 [各桶计数, 总和, 次数]
+
+    def inc(self, amount=1, **labels):
+        """计数器累加"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def observe(self, value, **labels):
+        """直方图记录一次观测值"""
+        key = tuple(sorted(labels.items()))
+        # 落入的第一个上界 >= value 的桶
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块耗时（秒），代码块抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """:return: [(标签字典, 数值), ...]，直方图数值为 {"buckets", "sum", "count"}"""
+        with self._lock:
+            items = list(self._series.items())
+            if self.kind == HISTOGRAM:
+                items = [(key, (list(s[0]), s[1], s[2])) for key, s in items]
+        if self.kind == COUNTER:
+            return [(dict(key), value) for key, value in items]
+        return [
+            (dict(key), {"buckets": counts, "sum": total, "count": count})
+            for key, (counts, total, count) in items
+        ]
+
+    def family(self):
+        """:return: 可序列化的指标快照"""
+        return {
+            "name": self.name,
+            "help": self.description,
+            "kind": self.kind,
+            "buckets": list(self.buckets),
+            "series": self.snapshot(),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, name, description, kind, buckets=None):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(name, description, kind, buckets)
+            elif metric.kind != kind:
+                raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name, description):
+        return self._get(name, description, COUNTER)
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        return self._get(name, description, HISTOGRAM, buckets)
+
+    def collect(self):
+        """:return: 各指标的快照列表（按名称排序）"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return [metric.family() for metric in metrics]
+
+
+registry = MetricsRegistry()
+
+
+# --------------------------
+# 跨进程共享（各进程定期将快照写入 metrics 表，Web 端统一输出）
+# --------------------------
+def publish_metrics(cursor, process, metrics=registry):
+    """将本进程的指标快照写入 metrics 表（覆盖该进程上一次的快照）"""
+    now = int(time.time())
+    cursor.executemany(
+        """
+        INSERT OR REPLACE INTO metrics (process, name, snapshot, updated)
+        VALUES (?, ?, ?, ?)""",
+        [
+            (process, family["name"], json.dumps(family, ensure_ascii=False), now)
+            for family in metrics.collect()
+        ],
+    )
+
+
+def read_published(conn, exclude=None):
+    """
+    :param exclude: 跳过的进程名（通常是读取方自己）
+    :return: ({process: [指标快照, ...]}, {process: 最近写入时间})
+    """
+    families, updated = {}, {}
+    for process, snapshot, ts in conn.execute(
+        "SELECT process, snapshot, updated FROM metrics ORDER BY process, name"
+    ):
+        if process == exclude:
+            continue
+        families.setdefault(process, []).append(json.loads(snapshot))
+        updated[process] = max(updated.get(process, 0), ts)
+    return families, updated
+
+
+# --------------------------
+# Prometheus 文本格式
+# --------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(families_by_process, updated=None):
+    """
+    :param families_by_process: {process: [指标快照, ...]}，输出时附加 process 标签
+    :param updated: {process: 最近写入时间}，输出为各进程的指标更新时间
+    :return: Prometheus 文本格式
+    """
+    merged = {}
+    for process, families in families_by_process.items():
+        for family in families:
+            entry = merged.setdefault(family["name"], {**family, "series": []})
+            entry["series"].extend(
+                ({"process": process, **labels}, value)
+                for labels, value in family["series"]
+            )
+
+    lines = []
+    for name in sorted(merged):
+        family = merged[name]
+        text = family["help"].replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        for labels, value in family["series"]:
+            if family["kind"] == COUNTER:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(
+                list(family["buckets"]) + [float("inf")], value["buckets"]
+            ):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+
+    if updated:
+        name = "metrics_updated_timestamp_seconds"
+        lines.append(f"# HELP {name} 各进程最近一次写入指标的时间")
+        lines.append(f"# TYPE {name} gauge")
+        for process, ts in sorted(updated.items()):
+            lines.append(f"{name}{_labels({'process': process})} {ts}")
+    return "\n".join(lines) + "\n"
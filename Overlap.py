@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+from Archive import overlapping_sessions
+from ScheduleIndex import get_weekday_and_week, CLASS_TIME_MAP
+from Schema import (
+    from_timestamp,
+    parse_date,
+    SECONDS_PER_DAY,
+)
+
+FREE_HOURS = (8, 22)  # 统计空闲时间的时段（小时），扣除上课时间后即为空闲时间
+MIN_CONFLICT_SECONDS = 600  # 上课期间在实验室超过该时长才计为冲突
+
+# 事件类型（同一时刻的事件先累计时长再统一生效，顺序不影响结果）
+PRESENT, CLASS, WINDOW = 0, 1, 2
+
+
+def _hour_to_seconds(hour):
+    return round(hour * 3600)
+
+
+def class_sessions(index, names, start_ts, end_ts):
+    """
+    展开 [start_ts, end_ts) 内各成员的上课时段
+    :return: {name: [(start_ts, end_ts, class_index), ...]}
+    """
+    wanted = set(names)
+    classes = {}
+    for day_ts in range(start_ts, end_ts, SECONDS_PER_DAY):
+        week, weekday = get_weekday_and_week(from_timestamp(day_ts))
+        for name, class_indexes in index.classes_on_day(week, weekday):
+            if name not in wanted:
+                continue
+            for class_index in class_indexes:
+                start_hour, end_hour = CLASS_TIME_MAP[class_index]
+                classes.setdefault(name, []).append(
+                    (
+                        day_ts + _hour_to_seconds(start_hour),
+                        day_ts + _hour_to_seconds(end_hour),
+                        class_index,
+                    )
+                )
+    return classes
+
+
+def attendance_sessions(conn, names, start_ts, end_ts):
+    """
+    读取 [start_ts, end_ts) 内各成员的在岗时段（截取到范围内）
+    :return: {name: [(start_ts, end_ts), ...]}
+    """
+    wanted = set(names)
+    sessions = {}
+    params = {"range_start": start_ts, "range_end": end_ts}
+    for query in overlapping_sessions(conn, start_ts, end_ts):
+        for name, start_time, end_time in conn.execute(query, params):
+            if name in wanted:
+                sessions.setdefault(name, []).append(
+                    (max(start_time, start_ts), min(end_time, end_ts))
+                )
+    return sessions
+
+
+def sweep_user(sessions, classes, windows, min_conflict=MIN_CONFLICT_SECONDS):
+    """
+    扫描线计算单个成员的在岗/上课/空闲时间关系，复杂度 O((n + m) log(n + m))
+    :param sessions: 在岗时段 [(start, end), ...]，允许互相重叠
+    :param classes: 上课时段 [(start, end, class_index), ...]
+    :param windows: 统计空闲时间的时段 [(start, end), ...]
+    :return: 各项时长（秒）与冲突列表 [(start, end, class_index, overlap_seconds), ...]
+    """
+    events = []
+    for start, end in sessions:
+        if start < end:
+            events.append((start, PRESENT, 1, None))
+            events.append((end, PRESENT, -1, None))
+    for start, end, class_index in classes:
+        events.append((start, CLASS, 1, (start, end, class_index)))
+        events.append((end, CLASS, -1, (start, end, class_index)))
+    for start, end in windows:
+        events.append((start, WINDOW, 1, None))
+        events.append((end, WINDOW, -1, None))
+    events.sort(key=lambda event: (event[0], event[1], event[2]))
+
+    totals = {"present": 0, "class": 0, "overlap": 0, "free": 0, "free_present": 0}
+    conflicts = []
+    depth = [0, 0, 0]  # 当前处于在岗/上课/统计时段内的层数
+    class_overlap = 0  # 当前这节课内已累计的在岗时长
+    last = None
+    for time, kind, delta, payload in events:
+        if last is not None and time > last:
+            span = time - last
+            present, in_class, in_window = (d > 0 for d in depth)
+            totals["present"] += span * present
+            totals["class"] += span * in_class
+            totals["overlap"] += span * (present and in_class)
+            totals["free"] += span * (in_window and not in_class)
+            totals["free_present"] += span * (in_window and not in_class and present)
+            class_overlap += span * (present and in_class)
+        last = time
+
+        depth[kind] += delta
+        if kind == CLASS:
+            if delta > 0 and depth[CLASS] == 1:
+                class_overlap = 0
+            elif delta < 0 and depth[CLASS] == 0 and class_overlap >= min_conflict:
+                conflicts.append((*payload, class_overlap))
+    return totals, conflicts
+
+
+def overlap_report(
+    conn,
+    index,
+    names,
+    start_ts,
+    end_ts,
+    free_hours=FREE_HOURS,
+    min_conflict=MIN_CONFLICT_SECONDS,
+):
+    """
+    统计 [start_ts, end_ts)（整天）内各成员的在岗与课表关系
+    :return: [{
+        "name", "present_hours", "class_hours",
+        "overlap_hours": 上课期间在实验室的时长,
+        "free_hours": 统计时段内扣除上课后的空闲时长,
+        "free_present_hours": 空闲时间中在实验室的时长,
+        "utilization": free_present_hours / free_hours,
+        "conflicts": [{"date", "class", "minutes"}, ...]
+    }, ...]，按名册顺序
+    """
+    window_start, window_end = (hour * 3600 for hour in free_hours)
+    windows = [
+        (day_ts + window_start, day_ts + window_end)
+        for day_ts in range(start_ts, end_ts, SECONDS_PER_DAY)
+    ]
+    sessions = attendance_sessions(conn, names, start_ts, end_ts)
+    classes = class_sessions(index, names, start_ts, end_ts)
+
+    report = []
+    for name in names:
+        totals, conflicts = sweep_user(
+            sessions.get(name, []), classes.get(name, []), windows, min_conflict
+        )
+        report.append(
+            {
+                "name": name,
+                **{
+                    f"{key}_hours": round(seconds / 3600, 2)
+                    for key, seconds in totals.items()
+                },
+                "utilization": (
+                    round(totals["free_present"] / totals["free"], 4)
+                    if totals["free"]
+                    else 0
+                ),
+                "conflicts": [
+                    {
+                        "date": from_timestamp(start).strftime("%Y-%m-%d"),
+                        "class": class_index,
+                        "minutes": round(seconds / 60),
+                    }
+                    for start, end, class_index, seconds in conflicts
+                ],
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    from Database import database_manager
+    from Roster import Roster
+    from ScheduleIndex import ScheduleIndex
+    from Schema import init_schema
+
+    parser = argparse.ArgumentParser(description="在岗时间与课表的重叠报告")
+    parser.add_argument("--start", required=True, help="起始日期 YYYY-MM-DD（含）")
+    parser.add_argument("--end", required=True, help="结束日期 YYYY-MM-DD（含）")
+    parser.add_argument("--group", help="只统计指定分组")
+    parser.add_argument(
+        "--userlist", default=os.getenv("USER_MAC_LIST_PATH", "userlist.json")
+    )
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整结果")
+    args = parser.parse_args()
+
+    init_schema(database_manager)
+    names = Roster.load(args.userlist).select(group=args.group)
+    start = parse_date(args.start)
+    end = parse_date(args.end) + SECONDS_PER_DAY
+    with database_manager.get_read_connection() as conn:
+        rows = overlap_report(
+            conn, ScheduleIndex.load(database_manager), names, start, end
+        )
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print(
+            f"{'姓名':<8}{'在岗':>8}{'上课':>8}{'课中在岗':>10}{'空闲':>8}{'利用率':>8}{'冲突':>6}"
+        )
+        for row in rows:
+            print(
+                f"{row['name']:<8}{row['present_hours']:>8}{row['class_hours']:>8}"
+                f"{row['overlap_hours']:>10}{row['free_hours']:>8}"
+                f"{row['utilization']:>8.1%}{len(row['conflicts']):>6}"
+            )
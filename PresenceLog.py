@@ -0,0 +1,388 @@
+import argparse
+import json
+import mmap
+import os
+from Archive import archive_catalog, add_months
+from Rollup import rebuild_rollup
+from Schema import (
+    day_start,
+    from_timestamp,
+    bump_version,
+    write_meta,
+    ATTENDANCE_VERSION,
+    HISTORY_EPOCH,
+    ATTENDANCE_MAX_SPAN,
+    SECONDS_PER_DAY,
+)
+
+# --------------------------
+# 原始在线记录日志（只追加，可内存映射读取）
+# 文件格式（小端、变长整数 varint）:
+#   文件头 MAGIC
+#   名册快照 'S' ts len <JSON 姓名列表>     之后的位序号均指向该快照
+#   时间锚点 'K' ts                         名册未变化时代替快照，只给出绝对时间
+#   位图记录 'B' dt <ceil(n/8) 字节位图>    第 i 位为 1 表示快照中第 i 人在线
+#   序号记录 'I' dt count <递增序号差分>    在线人数少时比位图更短
+#   增量记录 'D' dt count <递增序号差分>    与上一次轮询相比状态翻转的序号
+# dt 为与上一条记录的时间差（秒），时间回拨时先写入快照重新给出绝对时间；
+# 快照/时间锚点之后的第一条轮询记录不使用增量，便于从任一锚点开始解析
+# --------------------------
+MAGIC = b"PLOG\x01"
+SNAPSHOT = ord("S")
+KEYFRAME = ord("K")
+BITSET = ord("B")
+INDEXES = ord("I")
+DELTA = ord("D")
+SNAPSHOT_INTERVAL = SECONDS_PER_DAY  # 至少每隔该时长写入一次快照或时间锚点
+
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varint(buf, pos):
+    """:return: (value, 下一个位置)，数据不完整时抛出 IndexError"""
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _iter_bits(bits):
+    """整数位图 -> 递增的置位序号"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _encode_indexes(tag, dt, indexes):
+    out = bytearray([tag]) + dt
+    _encode_varint(len(indexes), out)
+    previous = -1
+    for index in indexes:
+        _encode_varint(index - previous - 1, out)
+        previous = index
+    return out
+
+
+def _decode_indexes(buf, pos):
+    """:return: (位图整数, 下一个位置)"""
+    count, pos = _decode_varint(buf, pos)
+    bits, index = 0, -1
+    for _ in range(count):
+        gap, pos = _decode_varint(buf, pos)
+        index += gap + 1
+        bits |= 1 << index
+    return bits, pos
+
+
+def scan(buf):
+    """
+    顺序解析日志内容
+    :param buf: bytes / mmap
+    :yield: (记录结束位置, ts, names, indexes)，快照与时间锚点的 indexes 为 None；
+            末尾不完整的记录（写入中断）被忽略
+    """
+    if buf[: len(MAGIC)] != MAGIC:
+        raise ValueError("不是有效的在线记录日志")
+    pos, size = len(MAGIC), len(buf)
+    ts, names, bits = 0, [], 0
+    while pos < size:
+        try:
+            tag = buf[pos]
+            if tag == SNAPSHOT:
+                record_ts, cur = _decode_varint(buf, pos + 1)
+                length, cur = _decode_varint(buf, cur)
+                if cur + length > size:
+                    return
+                names = json.loads(bytes(buf[cur : cur + length]).decode("utf-8"))
+                ts, pos = record_ts, cur + length
+                yield pos, ts, names, None
+                continue
+            if tag == KEYFRAME:
+                ts, pos = _decode_varint(buf, pos + 1)
+                yield pos, ts, names, None
+                continue
+
+            dt, cur = _decode_varint(buf, pos + 1)
+            if tag == BITSET:
+                length = (len(names) + 7) // 8
+                if cur + length > size:
+                    return
+                tick_bits = int.from_bytes(buf[cur : cur + length], "little")
+                cur += length
+            elif tag == INDEXES:
+                tick_bits, cur = _decode_indexes(buf, cur)
+            elif tag == DELTA:
+                toggled, cur = _decode_indexes(buf, cur)
+                tick_bits = bits ^ toggled
+            else:
+                raise ValueError(f"日志在偏移 {pos} 处损坏")
+        except IndexError:
+            return
+        ts, pos, bits = ts + dt, cur, tick_bits
+        yield pos, ts, names, list(_iter_bits(bits))
+
+
+def read_ticks(path):
+    """
+    以内存映射方式读取日志
+    :yield: (ts, [在线姓名, ...])，每次轮询一条
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for _, ts, names, indexes in scan(buf):
+                if indexes is not None:
+                    yield ts, [names[i] for i in indexes]
+
+
+class PresenceLogWriter:
+    def __init__(self, path, logger=None):
+        """
+        打开（或新建）日志文件，截掉上次写入中断留下的不完整记录
+        :param path: 日志文件路径
+        """
+        self.path = path
+        self.logger = logger
+        self.last_ts = None
+        self.snapshot_ts = None
+        self.names = None
+        self.index_of = {}
+        self.previous_bits = None  # 上一次轮询的在线位图，锚点之后为 None
+
+        end = len(MAGIC)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                data = f.read()
+            for end, ts, names, indexes in scan(data):
+                self.last_ts = ts
+                if indexes is None:
+                    self.snapshot_ts = ts
+                    self._set_names(names)
+                    self.previous_bits = None
+                else:
+                    self.previous_bits = sum(1 << index for index in indexes)
+            if end < len(data) and logger:
+                logger.warning(
+                    f"在线记录日志末尾有 {len(data) - end} 字节不完整，已截断"
+                )
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if end == len(MAGIC):
+            self.file.seek(0)
+            self.file.write(MAGIC)
+        self.file.truncate(end)
+        self.file.seek(end)
+
+    def _set_names(self, names):
+        self.names = list(names)
+        self.index_of = {name: i for i, name in enumerate(self.names)}
+
+    def _write_snapshot(self, ts, names):
+        """名册变化时写入完整快照，否则只写入时间锚点"""
+        self.snapshot_ts = self.last_ts = ts
+        self.previous_bits = None
+        if names == self.names:
+            out = bytearray([KEYFRAME])
+            _encode_varint(ts, out)
+            return bytes(out)
+        payload = json.dumps(names, ensure_ascii=False).encode("utf-8")
+        out = bytearray([SNAPSHOT])
+        _encode_varint(ts, out)
+        _encode_varint(len(payload), out)
+        self._set_names(names)
+        return bytes(out) + payload
+
+    def append(self, ts, online, roster_names):
+        """
+        追加一次轮询结果
+        :param ts: 轮询时间戳
+        :param online: 在线姓名列表
+        :param roster_names: 当前名册姓名列表（变化或距上次快照超过间隔时写入新快照）
+        """
+        record = b""
+        if (
+            self.names != list(roster_names)
+            or self.last_ts is None
+            or ts < self.last_ts
+            or ts - self.snapshot_ts >= SNAPSHOT_INTERVAL
+        ):
+            record = self._write_snapshot(ts, list(roster_names))
+
+        bits = 0
+        for name in online:
+            if name in self.index_of:
+                bits |= 1 << self.index_of[name]
+        dt = bytearray()
+        _encode_varint(ts - self.last_ts, dt)
+
+        # 取位图、序号列表、增量三种编码中最短的一种
+        bitset_length = (len(self.names) + 7) // 8
+        candidates = [
+            bytes([BITSET]) + dt + bits.to_bytes(bitset_length, "little"),
+            _encode_indexes(INDEXES, dt, list(_iter_bits(bits))),
+        ]
+        if self.previous_bits is not None:
+            toggled = list(_iter_bits(bits ^ self.previous_bits))
+            candidates.append(_encode_indexes(DELTA, dt, toggled))
+        tick = min(candidates, key=len)
+
+        self.file.write(record + tick)
+        self.file.flush()
+        self.last_ts = ts
+        self.previous_bits = bits
+
+    def close(self):
+        self.file.close()
+
+
+# --------------------------
+# 回放：按任意合并间隔从日志重建考勤会话
+# --------------------------
+def replay(ticks, merge_gap, seed=None):
+    """
+    按与考勤服务相同的规则合并在线记录：同一用户两次在线间隔不超过 merge_gap 时延长会话
+    :param ticks: 按时间顺序的 (ts, [在线姓名, ...])
+    :param seed: 各用户回放起点之前的会话 {name: (start, end)}，回放时可被延长
+    :return: 会话列表 [(name, start, end), ...]，按开始时间排序
+    """
+    open_sessions = dict(seed or {})
+    sessions = []
+    for ts, names in ticks:
+        for name in names:
+            session = open_sessions.get(name)
+            if session and ts - session[1] <= merge_gap:
+                open_sessions[name] = (session[0], max(session[1], ts))
+            else:
+                if session:
+                    sessions.append((name, *session))
+                open_sessions[name] = (ts, ts)
+    sessions.extend((name, *session) for name, session in open_sessions.items())
+    sessions.sort(key=lambda session: (session[1], session[0]))
+    return sessions
+
+
+def rebuild_attendance(db, path, merge_gap, since=None):
+    """
+    用日志回放结果替换 attendance 表中开始于 since（缺省为日志首条记录）之后的会话
+    跨越 since 的已有会话作为回放起点参与合并；汇总表与元数据同步更新；
+    已归档的月份不会被改写（since 不早于最后一个归档月份的下一个月）
+    需在考勤服务停止时执行（服务内存中缓存了未结束的会话）
+    :return: (删除的记录数, 写入的记录数)
+    """
+    ticks = list(read_ticks(path))
+    if not ticks:
+        return 0, 0
+    since = ticks[0][0] if since is None else since
+    archived = archive_catalog.months()
+    if archived:
+        since = max(since, add_months(archived[-1][0], 1))
+    ticks = [tick for tick in ticks if tick[0] >= since]
+    if not ticks:
+        return 0, 0
+
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        seed_rows = cursor.execute(
+            """
+            SELECT id, name, start_time, end_time FROM attendance
+            WHERE start_time < ? AND end_time >= ?
+            """,
+            (since, since),
+        ).fetchall()
+        seed = {name: (start, since - 1) for _, name, start, _ in seed_rows}
+        sessions = replay(ticks, merge_gap, seed)
+        # 汇总的重建范围需覆盖被替换的旧会话：日志中无人在线的日期也要清掉旧汇总
+        replaced_end = cursor.execute(
+            "SELECT MAX(end_time) FROM attendance WHERE start_time >= ?", (since,)
+        ).fetchone()[0]
+
+        cursor.executemany(
+            "DELETE FROM attendance WHERE id = ?", [(row[0],) for row in seed_rows]
+        )
+        cursor.execute("DELETE FROM attendance WHERE start_time >= ?", (since,))
+        deleted = len(seed_rows) + cursor.rowcount
+        cursor.executemany(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            sessions,
+        )
+
+        low = min([since] + [start for start, _ in seed.values()])
+        high = max(
+            [ticks[-1][0]]
+            + [end for _, _, _, end in seed_rows]
+            + ([replaced_end] if replaced_end is not None else [])
+            + [end for _, _, end in sessions]
+        )
+        rebuild_rollup(cursor, day_start(low), day_start(high) + SECONDS_PER_DAY)
+        max_span = cursor.execute(
+            "SELECT COALESCE(MAX(end_time - start_time), 0) FROM attendance"
+        ).fetchone()[0]
+        write_meta(cursor, ATTENDANCE_MAX_SPAN, max_span)
+        bump_version(cursor, ATTENDANCE_VERSION)
+        bump_version(cursor, HISTORY_EPOCH)  # 已结束日期的缓存随之失效
+    return deleted, len(sessions)
+
+
+if __name__ == "__main__":
+    from Database import database_manager
+    from Schema import init_schema, parse_date
+
+    parser = argparse.ArgumentParser(description="在线记录日志工具")
+    parser.add_argument(
+        "--log", default=os.getenv("PRESENCE_LOG_PATH") or "presence.log"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="查看日志概况")
+    replay_parser = commands.add_parser(
+        "replay", help="按指定合并间隔重建考勤表（需先停止考勤服务）"
+    )
+    replay_parser.add_argument(
+        "--gap",
+        type=int,
+        default=int(os.getenv("MERGE_GAP_SECONDS", "1800")),
+        help="合并间隔（秒）",
+    )
+    replay_parser.add_argument(
+        "--since", help="只重建该日期 YYYY-MM-DD 之后的记录，缺省为日志起点"
+    )
+    replay_parser.add_argument(
+        "--dry-run", action="store_true", help="只统计回放结果，不写入数据库"
+    )
+    args = parser.parse_args()
+
+    if args.command == "info":
+        ticks = list(read_ticks(args.log))
+        size = os.path.getsize(args.log)
+        if ticks:
+            print(
+                f"{from_timestamp(ticks[0][0])} ~ {from_timestamp(ticks[-1][0])}，"
+                f"{len(ticks)} 次轮询，{size} 字节（平均 {size / len(ticks):.1f} 字节/次）"
+            )
+        else:
+            print("日志为空")
+    elif args.dry_run:
+        since = parse_date(args.since) if args.since else None
+        ticks = [
+            tick for tick in read_ticks(args.log) if since is None or tick[0] >= since
+        ]
+        sessions = replay(ticks, args.gap)
+        print(f"合并间隔 {args.gap}s：{len(ticks)} 次轮询 -> {len(sessions)} 段会话")
+    else:
+        init_schema(database_manager)
+        deleted, inserted = rebuild_attendance(
+            database_manager,
+            args.log,
+            args.gap,
+            parse_date(args.since) if args.since else None,
+        )
+        print(f"已删除 {deleted} 条、写入 {inserted} 条考勤记录")
@@ -0,0 +1,159 @@
+import argparse
+from Archive import archived_sessions, archive_catalog
+from Schema import day_start, parse_date, overlap_query, SECONDS_PER_DAY
+
+FAR_FUTURE = 2**62  # 不限结束时间时的查询上界
+
+
+# --------------------------
+# 按人按天的在岗时长汇总（daily_rollup）
+# 考勤写入方在同一事务内增量维护，也可从历史记录整体重建
+# --------------------------
+def split_by_day(start_ts, end_ts):
+    """
+    将区间 [start_ts, end_ts) 按天拆分
+    :return: [(day_ts, seconds), ...]
+    """
+    parts = []
+    while start_ts < end_ts:
+        next_day = day_start(start_ts) + SECONDS_PER_DAY
+        parts.append((day_start(start_ts), min(end_ts, next_day) - start_ts))
+        start_ts = next_day
+    return parts
+
+
+def session_started(name, start_ts):
+    """新建会话对应的汇总增量"""
+    return [(name, day_start(start_ts), 0, 1)]
+
+
+def session_extended(name, old_end_ts, new_end_ts):
+    """会话从 old_end 延长到 new_end 对应的汇总增量"""
+    return [
+        (name, day_ts, seconds, 0)
+        for day_ts, seconds in split_by_day(old_end_ts, new_end_ts)
+    ]
+
+
+def apply_rollup(cursor, rows):
+    """
+    累加汇总增量
+    :param rows: [(name, day_ts, seconds, sessions), ...]
+    """
+    cursor.executemany(
+        """
+        INSERT INTO daily_rollup (name, day, seconds, sessions)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(name, day) DO UPDATE SET
+            seconds = seconds + excluded.seconds,
+            sessions = sessions + excluded.sessions
+        """,
+        rows,
+    )
+
+
+def rebuild_rollup(cursor, start_ts=None, end_ts=None, catalog=archive_catalog):
+    """
+    从考勤记录重建 [start_ts, end_ts) 内的汇总（均为零点时间戳，缺省表示全部历史）
+    已归档月份的会话一并读取，范围覆盖归档月份时汇总同样完整
+    :return: 写入的汇总行数
+    """
+    low = 0 if start_ts is None else start_ts
+    high = FAR_FUTURE if end_ts is None else end_ts
+    sessions = cursor.execute(
+        overlap_query(), {"range_start": low, "range_end": high}
+    ).fetchall()
+    sessions += archived_sessions(cursor, low, high, catalog)
+    if start_ts is None or end_ts is None:
+        if not sessions:
+            cursor.execute("DELETE FROM daily_rollup")
+            return 0
+        if start_ts is None:
+            start_ts = day_start(min(start for _, start, _ in sessions))
+        if end_ts is None:
+            end_ts = day_start(max(end for _, _, end in sessions)) + SECONDS_PER_DAY
+
+    totals = {}
+    for name, start_time, end_time in sessions:
+        if start_ts <= start_time < end_ts:
+            key = (name, day_start(start_time))
+            seconds_total, sessions_count = totals.get(key, (0, 0))
+            totals[key] = seconds_total, sessions_count + 1
+        for day_ts, seconds in split_by_day(
+            max(start_time, start_ts), min(end_time, end_ts)
+        ):
+            seconds_total, sessions_count = totals.get((name, day_ts), (0, 0))
+            totals[(name, day_ts)] = seconds_total + seconds, sessions_count
+
+    cursor.execute(
+        "DELETE FROM daily_rollup WHERE day >= ? AND day < ?", (start_ts, end_ts)
+    )
+    cursor.executemany(
+        "INSERT INTO daily_rollup (name, day, seconds, sessions) VALUES (?, ?, ?, ?)",
+        [(name, day_ts, *values) for (name, day_ts), values in totals.items()],
+    )
+    return len(totals)
+
+
+def query_stats(conn, start_ts, end_ts, names=None):
+    """
+    统计 [start_ts, end_ts) 内各成员的在岗时长、出勤天数、会话数与最长连续出勤天数
+    :param names: 限定的成员集合，None 表示不限
+    :return: {name: {"seconds", "days", "sessions", "longest_streak"}}
+    """
+    stats = {}
+    for name, seconds, days, sessions in conn.execute(
+        """
+        SELECT name, SUM(seconds), SUM(seconds > 0), SUM(sessions)
+        FROM daily_rollup
+        WHERE day >= ? AND day < ?
+        GROUP BY name
+        """,
+        (start_ts, end_ts),
+    ):
+        if names is None or name in names:
+            stats[name] = {
+                "seconds": seconds,
+                "days": days,
+                "sessions": sessions,
+                "longest_streak": 0,
+            }
+
+    # 连续出勤：同一连续段内 (天序号 - 行号) 相同
+    for name, streak in conn.execute(
+        f"""
+        SELECT name, MAX(length) FROM (
+            SELECT name, COUNT(*) AS length FROM (
+                SELECT
+                    name,
+                    day / {SECONDS_PER_DAY}
+                        - ROW_NUMBER() OVER (PARTITION BY name ORDER BY day) AS island
+                FROM daily_rollup
+                WHERE day >= ? AND day < ? AND seconds > 0
+            )
+            GROUP BY name, island
+        )
+        GROUP BY name
+        """,
+        (start_ts, end_ts),
+    ):
+        if name in stats:
+            stats[name]["longest_streak"] = streak
+    return stats
+
+
+if __name__ == "__main__":
+    from Database import database_manager
+    from Schema import init_schema
+
+    parser = argparse.ArgumentParser(description="重建按人按天的在岗汇总表")
+    parser.add_argument("--start", help="起始日期 YYYY-MM-DD（含），缺省为全部历史")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD（含），缺省为全部历史")
+    args = parser.parse_args()
+
+    init_schema(database_manager)
+    start = parse_date(args.start) if args.start else None
+    end = parse_date(args.end) + SECONDS_PER_DAY if args.end else None
+    with database_manager.get_connection() as conn:
+        count = rebuild_rollup(conn.cursor(), start, end)
+    print(f"已重建 {count} 条汇总记录")
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+_MAC_SEPARATORS = re.compile(r"[^0-9A-Fa-f]")
+
+
+def normalize_mac(mac):
+    """
+    统一 MAC 地址格式为大写冒号分隔（AA:BB:CC:DD:EE:FF）
+    兼容 aa-bb-cc-dd-ee-ff、aabb.ccdd.eeff 等写法，无法识别时原样转大写返回
+    """
+    digits = _MAC_SEPARATORS.sub("", str(mac))
+    if len(digits) != 12:
+        return str(mac).strip().upper()
+    digits = digits.upper()
+    return ":".join(digits[i : i + 2] for i in range(0, 12, 2))
+
+
+# --------------------------
+# 成员名册（按姓名建立索引）
+# --------------------------
+class Roster:
+    def __init__(self, users):
+        """
+        :param users: userlist.json 中的成员列表
+        """
+        self.users = users
+        self.by_name = {}
+        self.by_mac = {}  # 规范化 MAC -> 姓名
+        for user in users:
+            # 同名多条记录（如一人多台设备）只保留第一条的资料
+            self.by_name.setdefault(user["name"], user)
+            # MAC 字段可以是单个地址或地址列表（一人多台设备）
+            macs = user.get("MAC") or []
+            for mac in [macs] if isinstance(macs, str) else macs:
+                self.by_mac.setdefault(normalize_mac(mac), user["name"])
+        self.names = list(self.by_name)
+        # 名册内容的短摘要，名册变化时随之变化（用于缓存校验）
+        self.version = hashlib.sha1(
+            json.dumps(users, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:8]
+
+    @classmethod
+    def load(cls, path):
+        """从 userlist.json 加载名册"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, devices):
+        """
+        根据在线设备列表找出在线成员
+        :param devices: [{"mac": ...}, ...]
+        :return: 按名册顺序排列、去重后的姓名列表
+        """
+        online = {self.by_mac.get(normalize_mac(device["mac"])) for device in devices}
+        return [name for name in self.names if name in online]
+
+    def select(self, names=None, group=None):
+        """
+        按姓名子集和/或分组筛选成员
+        :param names: 姓名列表，None 表示不限
+        :param group: 分组名（userlist.json 中的 group 字段），None 表示不限
+        :return: 按名册顺序排列的姓名列表
+        """
+        wanted = set(names) if names is not None else None
+        return [
+            name
+            for name, user in self.by_name.items()
+            if (wanted is None or name in wanted)
+            and (group is None or user.get("group") == group)
+        ]
+
+    def new_result(self):
+        """生成按姓名索引的空结果 {name: {"name", "date", "onclass_date"}}"""
+        return {
+            name: {"name": name, "date": {}, "onclass_date": []} for name in self.names
+        }
+
+
+# --------------------------
+# 名册热加载：文件修改时间或大小变化时重新加载
+# --------------------------
+class RosterWatcher:
+    def __init__(self, path, logger=None):
+        self.path = path
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+        self.roster = Roster.load(path)
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """获取当前名册；文件有变化时先重新加载，加载失败则继续使用旧名册"""
+        try:
+            stamp = self._file_stamp()
+        except OSError:
+            return self.roster
+        if stamp == self._stamp:
+            return self.roster
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    self.roster = Roster.load(self.path)
+                    if self.logger:
+                        self.logger.info(
+                            f"名册已重新加载: {len(self.roster)}人 {len(self.roster.by_mac)}台设备"
+                        )
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"重新加载名册失败，继续使用旧名册: {str(e)}")
+                self._stamp = stamp
+        return self.roster
@@ -0,0 +1,140 @@
+import threading
+from datetime import datetime
+from Schema import read_versions, SCHEDULE_VERSION
+
+CLASSES_PER_DAY = 5  # 每日上课节数
+DAYS_PER_WEEK = 7
+SLOTS_PER_WEEK = DAYS_PER_WEEK * CLASSES_PER_DAY
+DAY_MASK = (1 << CLASSES_PER_DAY) - 1
+MAX_WEEK = 60  # 超出该周数的课表范围视为无效数据
+FIRST_WEEK_DAY = datetime(2025, 2, 24)  # 第 1 周的周一
+CLASS_TIME_MAP = {
+    1: (8.0, 10.41),  # 8:00 - 10:25
+    2: (10.66, 12.25),  # 10:40 - 12:15
+    3: (14.0, 15.41),  # 14:00 - 15:25
+    4: (15.66, 18.25),  # 15:40 - 18:15
+    5: (19.0, 21.0),  # 19:00 - 21:00
+}
+
+
+def get_weekday_and_week(date):
+    delta_days = (date - FIRST_WEEK_DAY).days  # 计算起始日期到今天的天数
+    week_number = delta_days // 7 + 1  # 计算是第几周（第 1 周从 start_date 开始）
+    weekday = date.weekday() + 1  # `weekday()` 返回 0-6 (周一=0, 周日=6)，调整为 1-7
+    return week_number, weekday
+
+
+def slot_of(week, day, class_index=1):
+    """(周, 星期, 节次) -> 位序号，周/星期/节次均从 1 开始"""
+    return ((week - 1) * DAYS_PER_WEEK + day - 1) * CLASSES_PER_DAY + class_index - 1
+
+
+def class_at_hour(hour):
+    """当天小时数 -> 所在节次，不在任何一节课内时返回 None"""
+    for class_index, (start, end) in CLASS_TIME_MAP.items():
+        if start <= hour < end:
+            return class_index
+    return None
+
+
+# --------------------------
+# 课表位图索引
+# 每个用户一个整数位图，每一位对应一个 (周, 星期, 节次)，查询只需移位与位测试
+# --------------------------
+class ScheduleIndex:
+    def __init__(self, rows, version=None):
+        """
+        :param rows: [(name, day, class_index, week_range_start, week_range_end), ...]
+        :param version: 构建时的课表数据版本号
+        """
+        self.version = version
+        self.bitmaps = {}
+        for name, day, class_index, week_start, week_end in rows:
+            bitmap = self.bitmaps.get(name, 0)
+            for week in range(max(week_start, 1), min(week_end, MAX_WEEK) + 1):
+                bitmap |= 1 << slot_of(week, day, class_index)
+            self.bitmaps[name] = bitmap
+
+    @classmethod
+    def load(cls, db):
+        """从 class_schedule 表构建索引（同一读事务内读取版本号，保证两者一致）"""
+        with db.get_read_connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                version = read_versions(conn).get(SCHEDULE_VERSION, 0)
+                rows = conn.execute(
+                    """
+                    SELECT name, day, class_index, week_range_start, week_range_end
+                    FROM class_schedule
+                    """
+                ).fetchall()
+            finally:
+                conn.rollback()
+        return cls(rows, version)
+
+    def classes_of(self, name, week, day):
+        """某用户某天的节次列表"""
+        if not 1 <= week <= MAX_WEEK:
+            return []
+        bits = (self.bitmaps.get(name, 0) >> slot_of(week, day)) & DAY_MASK
+        return [i + 1 for i in range(CLASSES_PER_DAY) if bits >> i & 1]
+
+    def classes_on_day(self, week, day):
+        """
+        某天所有有课的用户
+        :yield: (name, [class_index, ...])
+        """
+        if not 1 <= week <= MAX_WEEK:
+            return
+        shift = slot_of(week, day)
+        for name, bitmap in self.bitmaps.items():
+            bits = (bitmap >> shift) & DAY_MASK
+            if bits:
+                yield name, [i + 1 for i in range(CLASSES_PER_DAY) if bits >> i & 1]
+
+    def in_class(self, week, day, class_index):
+        """某一节课正在上课的用户"""
+        if not 1 <= week <= MAX_WEEK:
+            return []
+        bit = 1 << slot_of(week, day, class_index)
+        return [name for name, bitmap in self.bitmaps.items() if bitmap & bit]
+
+    def class_count(self, name, first_week, first_day, last_week, last_day):
+        """某用户在 [首日, 末日] 范围内（含两端）的总课时数"""
+        first_week, last_week = max(first_week, 1), min(last_week, MAX_WEEK)
+        if (first_week, first_day) > (last_week, last_day):
+            return 0
+        low = slot_of(first_week, first_day)
+        high = slot_of(last_week, last_day) + CLASSES_PER_DAY
+        return (
+            (self.bitmaps.get(name, 0) >> low) & ((1 << (high - low)) - 1)
+        ).bit_count()
+
+
+# --------------------------
+# 线程安全的索引持有者：课表版本号变化时重建
+# --------------------------
+class ScheduleIndexHolder:
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self.index = ScheduleIndex.load(db)
+
+    def get(self, version=None):
+        """
+        获取当前索引
+        :param version: 最新的课表版本号，与索引不一致时先重建（并发请求只重建一次）
+        """
+        index = self.index
+        if version is None or version == index.version:
+            return index
+        with self._lock:
+            if self.index.version != version:
+                self.index = ScheduleIndex.load(self.db)
+            return self.index
+
+    def rebuild(self):
+        """重新从数据库加载索引"""
+        with self._lock:
+            self.index = ScheduleIndex.load(self.db)
+            return self.index
@@ -0,0 +1,110 @@
+import time
+
+
+def parse_hour_range(value):
+    """
+    解析小时区间配置，如 "1-7" 表示 1:00~7:00，"23-6" 表示跨零点
+    :return: (start_hour, end_hour)，配置为空时返回 None
+    """
+    if not value:
+        return None
+    start, end = (int(part) for part in value.split("-"))
+    return start % 24, end % 24
+
+
+# --------------------------
+# 自适应轮询调度器
+# 基于单调时钟在固定节拍上触发，不受每轮执行耗时影响；
+# 在场人员变化时加快轮询，稳定后逐步恢复，夜间降低频率
+# --------------------------
+class PollScheduler:
+    def __init__(
+        self,
+        interval=300,
+        min_interval=60,
+        max_interval=900,
+        night_hours=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """
+        :param interval: 常规轮询间隔（秒）
+        :param min_interval: 人员变化时的最短间隔（秒）
+        :param max_interval: 夜间及出错退避的最长间隔（秒）
+        :param night_hours: 夜间时段 (start_hour, end_hour)，None 表示不区分
+        """
+        if not 0 < min_interval <= interval <= max_interval:
+            raise ValueError("轮询间隔需满足 0 < 最短间隔 <= 常规间隔 <= 最长间隔")
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.night_hours = night_hours
+        self.clock = clock
+        self.sleep = sleep
+
+        self.current_interval = interval
+        self.deadline = None  # 下一次触发的单调时钟时刻
+        self.errors = 0  # 连续出错次数
+        self.ticks = 0
+        self.missed_ticks = 0  # 因单轮耗时过长而跳过的节拍数
+        self.last_lag = 0.0  # 最近一次实际触发时刻与计划时刻之差（秒）
+
+    def _is_night(self, now):
+        if not self.night_hours:
+            return False
+        start, end = self.night_hours
+        if start <= end:
+            return start <= now.hour < end
+        return now.hour >= start or now.hour < end
+
+    def _choose_interval(self, changed, now):
+        """根据人员变化与时段选择下一轮间隔"""
+        if self._is_night(now) and not changed:
+            return self.max_interval
+        if changed:
+            return self.min_interval
+        # 人员稳定后逐步放慢，直至常规间隔
+        return min(self.interval, max(self.current_interval * 2, self.min_interval))
+
+    def wait(self):
+        """
+        阻塞到下一次计划时刻
+        :return: 本轮延迟（秒），即实际触发时刻与计划时刻之差
+        """
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        elif now < self.deadline:
+            self.sleep(self.deadline - now)
+            now = self.clock()
+        self.last_lag = max(0.0, now - self.deadline)
+        self.ticks += 1
+        return self.last_lag
+
+    def schedule_next(self, changed, now):
+        """
+        一轮完成后安排下一次触发时刻（在上一计划时刻基础上累加，不产生漂移）
+        若本轮耗时超过间隔，跳到下一个尚未到达的节拍并记录跳过的节拍数
+        :param changed: 本轮在场人员是否发生变化
+        :param now: 当前本地时间（用于判断夜间）
+        :return: 选定的间隔（秒）
+        """
+        self.errors = 0
+        self.current_interval = self._choose_interval(changed, now)
+        self.deadline += self.current_interval
+        overdue = self.clock() - self.deadline
+        if overdue >= 0:
+            skipped = int(overdue // self.current_interval) + 1
+            self.missed_ticks += skipped
+            self.deadline += skipped * self.current_interval
+        return self.current_interval
+
+    def schedule_retry(self):
+        """
+        出错后按指数退避安排重试（以最短间隔为起点，不超过最长间隔）
+        :return: 退避时长（秒）
+        """
+        self.errors += 1
+        delay = min(self.min_interval * 2 ** (self.errors - 1), self.max_interval)
+        self.deadline = self.clock() + delay
+        return delay
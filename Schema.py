@@ -0,0 +1,301 @@
+import calendar
+from datetime import datetime, timedelta
+from Logger import setup_logger
+from Database import database_manager
+
+logger = setup_logger("schema")
+
+# --------------------------
+# 时间编码
+# 考勤时间统一存储为整数秒：本地时间按 UTC 解释得到的时间戳，
+# 因此 ts - ts % 86400 即为当天零点，ts % 86400 即为当天已过秒数
+# --------------------------
+SECONDS_PER_DAY = 86400
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp(dt: datetime) -> int:
+    """本地时间 -> 整数时间戳"""
+    return calendar.timegm(dt.timetuple())
+
+
+def from_timestamp(ts: int) -> datetime:
+    """整数时间戳 -> 本地时间"""
+    return _EPOCH + timedelta(seconds=ts)
+
+
+def day_start(ts: int) -> int:
+    """时间戳所在日的零点"""
+    return ts - ts % SECONDS_PER_DAY
+
+
+def parse_date(date_str: str) -> int:
+    """'YYYY-MM-DD' -> 当天零点时间戳"""
+    return to_timestamp(datetime.strptime(date_str, "%Y-%m-%d"))
+
+
+# --------------------------
+# 数据版本号（写入方在同一事务内递增，读取方据此判断缓存是否过期）
+# --------------------------
+ATTENDANCE_VERSION = "attendance_version"
+SCHEDULE_VERSION = "schedule_version"
+HISTORY_EPOCH = "history_epoch"  # 改写已结束日期的考勤（日志回放、删除归档等）时递增
+SCHEDULE_SHEET_HASH = "schedule_sheet_hash"  # 上次同步的课表表格内容摘要
+# 最长考勤会话时长（秒），限定归档文件的附加范围
+ATTENDANCE_MAX_SPAN = "attendance_max_span"
+
+LONG_SESSION_SPAN = SECONDS_PER_DAY  # 时长不短于此值的会话经部分索引单独查找
+
+
+def overlap_query(columns="name, start_time, end_time", table="attendance"):
+    """
+    与 [:range_start, :range_end) 有交集的考勤会话（命名参数）
+    短会话的开始时间必然晚于 range_start - LONG_SESSION_SPAN，按 start_time 索引做范围扫描；
+    长会话（如长时间不关机的设备）数量很少，经部分索引 idx_attendance_long 单独查找，
+    个别长会话不会扩大所有查询的扫描范围
+    :return: SELECT {columns} 语句，两部分互不重叠
+    """
+    return f"""
+        SELECT {columns} FROM {table}
+        WHERE start_time > :range_start - {LONG_SESSION_SPAN}
+            AND start_time < :range_end
+            AND end_time >= :range_start
+            AND end_time - start_time < {LONG_SESSION_SPAN}
+        UNION ALL
+        SELECT {columns} FROM {table}
+        WHERE end_time - start_time >= {LONG_SESSION_SPAN}
+            AND start_time < :range_end
+            AND end_time >= :range_start
+    """
+
+
+def clip_to_day(start_ts, end_ts, day_ts):
+    """将会话截取到某一天内，返回当天的 (开始小时, 结束小时)，当天最晚记到 23:59:59"""
+    start = max(start_ts, day_ts)
+    end = min(end_ts, day_ts + SECONDS_PER_DAY - 1)
+    return (start - day_ts) / 3600, (end - day_ts) / 3600
+
+
+def bump_version(cursor, key):
+    """递增数据版本号"""
+    cursor.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+
+
+def read_meta(conn, key, default=None):
+    """读取元数据"""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def write_meta(cursor, key, value):
+    """写入元数据（不存在则新建）"""
+    cursor.execute(
+        """
+        INSERT INTO meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """,
+        (key, value),
+    )
+
+
+def read_versions(conn):
+    """读取全部数据版本号 {key: version}"""
+    return dict(
+        conn.execute(
+            "SELECT key, value FROM meta WHERE key IN (?, ?, ?)",
+            (ATTENDANCE_VERSION, SCHEDULE_VERSION, HISTORY_EPOCH),
+        ).fetchall()
+    )
+
+
+# --------------------------
+# 结构迁移（按版本号递增追加，已发布的迁移不要修改）
+# --------------------------
+def _migration_1_baseline(cursor):
+    """初始表结构（与早期版本一致，已存在的表保持不变）"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            start_time DATETIME NOT NULL,
+            end_time DATETIME NOT NULL
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS class_schedule (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            day INT NOT NULL CHECK(day BETWEEN 1 AND 7),
+            class_index INT NOT NULL CHECK(class_index BETWEEN 1 AND 5),
+            week_range_start INT NOT NULL,
+            week_range_end INT NOT NULL,
+            UNIQUE(name, day, class_index, week_range_start)
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_schedule ON class_schedule (name, day)"
+    )
+
+
+def _migration_2_integer_timestamps(cursor):
+    """考勤时间改为整数时间戳，并建立按时间范围查询的覆盖索引"""
+    cursor.execute(
+        """
+        CREATE TABLE attendance_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            start_time INTEGER NOT NULL,
+            end_time INTEGER NOT NULL
+        )
+    """
+    )
+    # strftime('%s') 将文本时间按 UTC 解释，与 to_timestamp 的编码一致
+    cursor.execute(
+        """
+        INSERT INTO attendance_new (id, name, start_time, end_time)
+        SELECT id, name,
+            CAST(strftime('%s', start_time) AS INTEGER),
+            CAST(strftime('%s', end_time) AS INTEGER)
+        FROM attendance
+    """
+    )
+    cursor.execute("DROP TABLE attendance")
+    cursor.execute("ALTER TABLE attendance_new RENAME TO attendance")
+    cursor.execute(
+        """
+        CREATE INDEX idx_attendance_name_start
+        ON attendance (name, start_time, end_time)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX idx_attendance_start
+        ON attendance (start_time, end_time, name)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_schedule_day_week
+        ON class_schedule (day, week_range_start, week_range_end, name, class_index)
+    """
+    )
+
+
+def _migration_3_meta(cursor):
+    """元数据表，记录各表的写入版本号（供缓存校验）"""
+    cursor.execute(
+        """
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value
+        )
+    """
+    )
+    cursor.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, 0)",
+        [(ATTENDANCE_VERSION,), (SCHEDULE_VERSION,)],
+    )
+
+
+def _migration_4_max_span(cursor):
+    """记录最长会话时长（会话改为原地延长、跨天会话在查询时拆分）"""
+    cursor.execute(
+        """
+        INSERT INTO meta (key, value)
+        SELECT ?, COALESCE(MAX(end_time - start_time), 0) FROM attendance
+    """,
+        (ATTENDANCE_MAX_SPAN,),
+    )
+
+
+def _migration_5_daily_rollup(cursor):
+    """按人按天的在岗汇总表，并从历史记录初始化"""
+    from Rollup import rebuild_rollup
+
+    cursor.execute(
+        """
+        CREATE TABLE daily_rollup (
+            name TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            seconds INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, day)
+        ) WITHOUT ROWID
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX idx_rollup_day
+        ON daily_rollup (day, name, seconds, sessions)
+    """
+    )
+    rebuild_rollup(cursor)
+
+
+def _migration_6_events(cursor):
+    """变更事件表（写入方在同一事务内发布，Web 端据此推送增量）"""
+    cursor.execute(
+        """
+        CREATE TABLE events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL
+        )
+    """
+    )
+    cursor.execute("CREATE INDEX idx_events_ts ON events (ts)")
+
+
+def _migration_7_metrics(cursor):
+    """各进程的指标快照（考勤服务等独立进程定期写入，Web 端统一输出）"""
+    cursor.execute(
+        """
+        CREATE TABLE metrics (
+            process TEXT NOT NULL,
+            name TEXT NOT NULL,
+            snapshot TEXT NOT NULL,
+            updated INTEGER NOT NULL,
+            PRIMARY KEY (process, name)
+        )
+    """
+    )
+
+
+def _migration_8_long_sessions(cursor):
+    """长会话部分索引（查询时与短会话分开查找，见 overlap_query）"""
+    cursor.execute(
+        f"""
+        CREATE INDEX idx_attendance_long
+        ON attendance (start_time, end_time, name)
+        WHERE end_time - start_time >= {LONG_SESSION_SPAN}
+    """
+    )
+
+
+def _migration_9_history_epoch(cursor):
+    """历史数据版本号（已结束日期的缓存只跟随该版本号失效）"""
+    cursor.execute("INSERT INTO meta (key, value) VALUES (?, 0)", (HISTORY_EPOCH,))
+
+
+MIGRATIONS = [
+    (1, "初始表结构", _migration_1_baseline),
+    (2, "考勤时间整数化及范围索引", _migration_2_integer_timestamps),
+    (3, "元数据表", _migration_3_meta),
+    (4, "最长会话时长", _migration_4_max_span),
+    (5, "按人按天在岗汇总", _migration_5_daily_rollup),
+    (6, "变更事件表", _migration_6_events),
+    (7, "指标快照表", _migration_7_metrics),
+    (8, "长会话部分索引", _migration_8_long_sessions),
+    (9, "历史数据版本号", _migration_9_history_epoch),
+]
+
+
+def init_schema(db=database_manager):
+    """将数据库升级到最新结构（可重复调用）"""
+    for version, description in db.migrate(MIGRATIONS):
+        logger.info(f"已应用数据库迁移 v{version}: {description}")
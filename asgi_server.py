@@ -0,0 +1,462 @@
+"""
+异步服务模式（ASGI）
+
+/get_data、/update_course_schedule 与主页由本模块直接处理，
+数据库操作在有界线程池中执行，事件循环只负责收发请求：
+- 读取数据版本（快）与生成当天响应（可能较慢）使用两个独立的线程池，
+  慢查询占满生成线程时，缓存命中的请求仍可直接返回，不会排在其后；
+- 同一 ETag 的并发未命中只生成一次，其余请求等待同一结果；
+- 排队中的数据库任务超过上限时返回 503，避免请求无限堆积。
+
+其余路由（/events、/get_range、/stats、/heatmap、/overlap、/metrics 等）
+按 WSGI 调用 server.app，同样在有界线程池中执行，流式响应逐块转发；
+/events 的每个连接在整个推送期间占用一个线程，使用单独的线程池，
+连接数再多也不会占满其他接口的线程。
+
+用法（需安装 uvicorn）:
+    python asgi_server.py --port 5000
+    或 uvicorn asgi_server:app --port 5000
+"""
+
+import argparse
+import asyncio
+import contextvars
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+import server
+from Schema import parse_date, SCHEDULE_VERSION
+
+ASGI_READ_WORKERS = int(os.getenv("ASGI_READ_WORKERS", "4"))
+ASGI_BUILD_WORKERS = int(os.getenv("ASGI_BUILD_WORKERS", "4"))
+ASGI_MAX_PENDING = int(os.getenv("ASGI_MAX_PENDING", "256"))  # 排队中的数据库任务上限
+ASGI_QUEUE_TIMEOUT = float(os.getenv("ASGI_QUEUE_TIMEOUT", "5"))  # 等待排队的秒数
+ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", "8"))  # 其余路由的线程数
+ASGI_STREAM_WORKERS = int(os.getenv("ASGI_STREAM_WORKERS", "32"))  # 事件流连接上限
+
+STREAM_PATHS = {"/events"}  # 长连接推送的路由
+STREAM_BUFFER_CHUNKS = 16  # 流式响应中已生成、尚未发出的块数上限
+STREAM_POLL_SECONDS = 0.5  # 等待发送时检查客户端是否断开的间隔
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.html")
+
+
+class Overloaded(Exception):
+    """数据库任务排队已满"""
+
+
+# --------------------------
+# 有界执行器（限制排队中的任务数，超时未能排入时拒绝）
+# --------------------------
+class BoundedExecutor:
+    def __init__(self, name, workers, slots):
+        """
+        :param workers: 线程数
+        :param slots: 与其他执行器共享的排队名额（asyncio.Semaphore）
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=f"asgi-{name}"
+        )
+        self.slots = slots
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个排队名额，超时未能取得时抛出 Overloaded"""
+        try:
+            await asyncio.wait_for(self.slots.acquire(), ASGI_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise Overloaded() from None
+        try:
+            yield
+        finally:
+            self.slots.release()
+
+    def call(self, func, *args):
+        """在线程池中执行（不占用名额，由调用方持有 slot）:return: asyncio.Future"""
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def run(self, func, *args):
+        async with self.slot():
+            return await self.call(func, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _lookup_day(day_ts):
+    """读取数据版本并查找缓存（在读线程池中执行）:return: (etag, versions, 缓存项或 None)"""
+    versions = server.read_data_versions()
+    etag = server.get_day_etag(day_ts, versions)
+    return etag, versions, server.response_cache.get(etag)
+
+
+def _build_day(date_str, day_ts, etag, versions):
+    """查询并序列化当天数据后放入缓存（在生成线程池中执行）"""
+    index = server.schedule_index.get(versions.get(SCHEDULE_VERSION))
+    return server.response_cache.put(
+        server.build_day_response(date_str, day_ts, etag, index)
+    )
+
+
+# --------------------------
+# WSGI 桥接：其余路由交给 Flask 应用
+# --------------------------
+def _wsgi_environ(scope, body):
+    """由 ASGI 请求构造 WSGI environ（PEP 3333）"""
+    host, port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": host,
+        "SERVER_PORT": str(port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "CONTENT_LENGTH": str(len(body)) if body else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if environ.get(key) else value
+    return environ
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _wait_disconnect(receive, disconnected):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.set()
+
+
+def _drive_wsgi(wsgi_app, environ, emit, credits, stop):
+    """
+    在同一线程内调用 WSGI 应用并消费完整个响应（含 close()）：
+    流式响应的生成器在同一线程、同一上下文中进入和退出，
+    其中的 app context 与线程局部的数据库连接才能正确释放
+    :param emit: 线程安全地向事件循环发送 (kind, value)
+    :param credits: 未发送的块数上限（threading.Semaphore），事件循环发送后归还
+    :param stop: 客户端断开时置位，生成器在产出下一块后结束
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+        return None  # 不支持 write()，Flask 不使用
+
+    iterable = wsgi_app(environ, start_response)
+    try:
+        for chunk in iterable:
+            if started:
+                emit("start", (started.pop("status"), started.pop("headers")))
+            if not chunk:
+                continue
+            while not credits.acquire(timeout=STREAM_POLL_SECONDS):
+                if stop.is_set():
+                    return
+            if stop.is_set():
+                return
+            emit("body", chunk)
+        if started:
+            emit("start", (started.pop("status"), started.pop("headers")))
+    finally:
+        close = getattr(iterable, "close", None)
+        if close is not None:
+            close()
+
+
+class WsgiBridge:
+    def __init__(self, wsgi_app, executor):
+        """
+        :param executor: 执行 WSGI 调用的 BoundedExecutor，每个请求（含流式响应的
+                         整个推送过程）占用一个名额与一个线程
+        """
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        body = await _read_body(receive)
+        if body is None:
+            return
+        try:
+            async with self.executor.slot():
+                await self._respond(scope, body, receive, send)
+        except Overloaded:
+            await _send(
+                send,
+                503,
+                {**_json_headers(), "Retry-After": "1"},
+                b'{"error": "server busy"}',
+            )
+
+    async def _respond(self, scope, body, receive, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        credits = threading.Semaphore(STREAM_BUFFER_CHUNKS)
+        stop = threading.Event()
+
+        def emit(kind, value):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+            except RuntimeError:  # 事件循环已关闭
+                stop.set()
+
+        context = contextvars.copy_context()
+        task = self.executor.call(
+            context.run,
+            _drive_wsgi,
+            self.wsgi_app,
+            _wsgi_environ(scope, body),
+            emit,
+            credits,
+            stop,
+        )
+        # 任务结束（含异常）后再放入结束标记，此前 emit 的消息均已入队
+        task.add_done_callback(lambda _: queue.put_nowait(("done", None)))
+
+        disconnected = asyncio.Event()
+        watcher = asyncio.ensure_future(_wait_disconnect(receive, disconnected))
+        started = False
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    {getter, watcher}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not getter.done():
+                    getter.cancel()
+                    stop.set()  # 客户端已断开，生成器产出下一块后结束并 close()
+                    return
+                kind, value = getter.result()
+                if kind == "start":
+                    status, headers = value
+                    await send(
+                        {
+                            "type": "http.response.start",
+                            "status": status,
+                            "headers": [
+                                (name.lower().encode("latin-1"), text.encode("latin-1"))
+                                for name, text in headers
+                            ],
+                        }
+                    )
+                    started = True
+                elif kind == "body":
+                    await send(
+                        {"type": "http.response.body", "body": value, "more_body": True}
+                    )
+                    credits.release()
+                else:
+                    break
+        finally:
+            stop.set()
+            watcher.cancel()
+
+        error = task.exception()
+        if error is not None:
+            server.logger.error(f"转发 WSGI 响应失败 {scope['path']}: {str(error)}")
+            if started:
+                raise error  # 响应已开始，由服务器中断连接
+            await _send(send, 500, _json_headers(), b'{"error": "internal error"}')
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class AsgiApp:
+    def __init__(
+        self,
+        read_workers=ASGI_READ_WORKERS,
+        build_workers=ASGI_BUILD_WORKERS,
+        max_pending=ASGI_MAX_PENDING,
+        wsgi_workers=ASGI_WSGI_WORKERS,
+        stream_workers=ASGI_STREAM_WORKERS,
+    ):
+        slots = asyncio.Semaphore(max_pending)
+        self.reader = BoundedExecutor("read", read_workers, slots)
+        self.builder = BoundedExecutor("build", build_workers, slots)
+        self._building = {}  # etag -> 生成中的 asyncio.Future
+        self.wsgi = WsgiBridge(
+            server.app,
+            BoundedExecutor("wsgi", wsgi_workers, asyncio.Semaphore(max_pending)),
+        )
+        # 每个事件流连接占用一个线程，名额与线程数相同，超出时返回 503
+        self.stream = WsgiBridge(
+            server.app,
+            BoundedExecutor(
+                "stream", stream_workers, asyncio.Semaphore(stream_workers)
+            ),
+        )
+        self.routes = {
+            "/get_data": self.get_data,
+            "/update_course_schedule": self.update_course_schedule,
+            "/update_course_schedule/status": self.update_course_schedule_status,
+            "/": self.home,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler = self.routes.get(scope["path"])
+        if handler is None:
+            bridge = self.stream if scope["path"] in STREAM_PATHS else self.wsgi
+            await bridge(scope, receive, send)
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            await _send(send, 405, {**_json_headers(), "Allow": "GET, HEAD"}, b"{}")
+            return
+        try:
+            status, headers, body = await handler(scope)
+        except Overloaded:
+            status, headers = 503, {**_json_headers(), "Retry-After": "1"}
+            body = b'{"error": "server busy"}'
+        except Exception as e:
+            server.logger.error(f"处理请求失败 {scope['path']}: {str(e)}")
+            status, headers, body = 500, _json_headers(), b'{"error": "internal"}'
+        if scope["method"] == "HEAD":
+            headers = {**headers, "Content-Length": str(len(body))}
+            body = b""
+        await _send(send, status, headers, body)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for executor in (
+                    self.reader,
+                    self.builder,
+                    self.wsgi.executor,
+                    self.stream.executor,
+                ):
+                    executor.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --------------------------
+    # 路由
+    # --------------------------
+    async def get_data(self, scope):
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        date_str = query.get("date", [""])[0]
+        try:
+            day_ts = parse_date(date_str)
+        except ValueError:
+            return 400, _json_headers(), _json({"error": "date 需为 YYYY-MM-DD 格式"})
+
+        start = time.perf_counter()
+        try:
+            etag, versions, entry = await self.reader.run(_lookup_day, day_ts)
+            server.GET_DATA_REQUESTS.inc(cache="miss" if entry is None else "hit")
+            if entry is None:
+                entry = await self._build_once(date_str, day_ts, etag, versions)
+
+            request_headers = _headers(scope)
+            status, headers, body = entry.negotiate(
+                request_headers.get("if-none-match"),
+                request_headers.get("accept-encoding"),
+            )
+        finally:
+            server.GET_DATA_SECONDS.observe(time.perf_counter() - start, phase="total")
+        return status, {**headers, "Access-Control-Allow-Origin": "*"}, body
+
+    async def _build_once(self, date_str, day_ts, etag, versions):
+        """同一 ETag 的并发未命中共用一次生成"""
+        future = self._building.get(etag)
+        if future is None:
+            future = asyncio.ensure_future(
+                self.builder.run(_build_day, date_str, day_ts, etag, versions)
+            )
+            self._building[etag] = future
+            future.add_done_callback(lambda _: self._building.pop(etag, None))
+        return await asyncio.shield(future)
+
+    async def update_course_schedule(self, scope):
+        """提交课表刷新任务（后台单飞任务，不占用请求处理）"""
+        submitted, status = server.course_refresh_job.submit()
+        if not submitted:
+            server.logger.info("课表刷新任务进行中，本次请求已合并")
+        return 202, _json_headers(), _json(status)
+
+    async def update_course_schedule_status(self, scope):
+        return 200, _json_headers(), _json(server.course_refresh_job.status())
+
+    async def home(self, scope):
+        with open(INDEX_PATH, "rb") as f:
+            body = f.read()
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, body
+
+
+def _headers(scope):
+    """请求头 {小写名称: 值}"""
+    return {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in scope["headers"]
+    }
+
+
+def _json_headers():
+    return {"Content-Type": "application/json"}
+
+
+def _json(payload):
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+async def _send(send, status, headers, body):
+    headers = {"Content-Length": str(len(body)), **headers}
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (name.lower().encode("latin-1"), str(value).encode("latin-1"))
+                for name, value in headers.items()
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+app = AsgiApp()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="以 ASGI 模式运行 Web 服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, access_log=False)
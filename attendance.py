@@ -1,17 +1,61 @@
 import os
+import asyncio
 import sqlite3
-import json
 import time
 import requests
 import random
 import hashlib
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
-from Logger import setup_logger
+from Archive import run_archive, ARCHIVE_KEEP_MONTHS
+from Events import (
+    publish_events,
+    prune_events,
+    session_event,
+    SESSION_STARTED,
+    SESSION_EXTENDED,
+    SESSION_ENDED,
+    EVENT_RETENTION,
+)
+from Logger import setup_logger, RateLimiter
+from Metrics import publish_metrics, registry, SIZE_BUCKETS
+from PresenceLog import PresenceLogWriter
 from Database import database_manager
+from Roster import RosterWatcher, normalize_mac
+from Rollup import apply_rollup, session_started, session_extended
+from Scheduler import PollScheduler, parse_hour_range
+from Schema import (
+    init_schema,
+    to_timestamp,
+    bump_version,
+    read_meta,
+    write_meta,
+    ATTENDANCE_VERSION,
+    ATTENDANCE_MAX_SPAN,
+)
 
 logger = setup_logger("attendance")
 
+METRICS_PROCESS = "attendance"
+ROUTER_REQUEST_SECONDS = registry.histogram(
+    "router_request_seconds", "路由器接口请求耗时（秒）"
+)
+ROUTER_FAILURES = registry.counter(
+    "router_request_failures_total", "路由器接口请求失败次数"
+)
+TICK_SECONDS = registry.histogram("tick_seconds", "一次轮询节拍的总耗时（秒）")
+TICK_WRITE_SECONDS = registry.histogram(
+    "tick_db_write_seconds", "批量写入考勤记录的语句执行耗时（秒）"
+)
+TICK_COMMIT_SECONDS = registry.histogram(
+    "tick_db_commit_seconds", "批量写入考勤记录的提交耗时（秒）"
+)
+TICK_ROWS = registry.histogram(
+    "tick_rows", "每次轮询写入的会话数（按开始/延长/结束区分）", SIZE_BUCKETS
+)
+TICK_FAILURES = registry.counter("tick_failures_total", "批量写入考勤记录失败次数")
+
 
 # --------------------------
 # 配置类（常量集中管理）
@@ -22,18 +66,49 @@ class AttendanceConfig:
         self.USER_MAC_LIST_PATH = os.getenv("USER_MAC_LIST_PATH", "userlist.json")
         self.ROUTER_URL = os.getenv("ROUTER_URL", "192.168.1.1")
         self.ROUTER_PWD = os.getenv("ROUTER_PWD", "default_password")
+        # 多台路由器/AP：逗号分隔，密码按顺序对应，缺省时使用 ROUTER_PWD
+        self.ROUTER_URLS = _split_list(os.getenv("ROUTER_URLS")) or [self.ROUTER_URL]
+        pwds = _split_list(os.getenv("ROUTER_PWDS"))
+        self.ROUTER_PWDS = [
+            pwds[i] if i < len(pwds) else self.ROUTER_PWD
+            for i in range(len(self.ROUTER_URLS))
+        ]
+        self.ROUTER_TIMEOUT = float(os.getenv("ROUTER_TIMEOUT", "10"))  # 单台超时（秒）
+        # 轮询调度与会话合并（秒）
+        self.POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "300"))
+        self.POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_INTERVAL", "60"))
+        self.POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", "900"))
+        self.POLL_NIGHT_HOURS = parse_hour_range(os.getenv("POLL_NIGHT_HOURS", "1-7"))
+        self.MERGE_GAP_SECONDS = int(os.getenv("MERGE_GAP_SECONDS", "1800"))
+        # 原始在线记录日志，留空表示不记录
+        self.PRESENCE_LOG_PATH = os.getenv("PRESENCE_LOG_PATH", "presence.log")
+        # 轮询摘要日志的最小输出间隔（秒），人员到达/离开仍逐次记录
+        self.LOG_SUMMARY_INTERVAL = int(os.getenv("LOG_SUMMARY_INTERVAL", "900"))
 
         # 验证必要配置
         if not os.path.exists(self.USER_MAC_LIST_PATH):
             raise FileNotFoundError(f"MAC地址列表文件不存在: {self.USER_MAC_LIST_PATH}")
 
 
+def _split_list(value):
+    """逗号分隔的配置项 -> 列表"""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
 # --------------------------
 # 路由器客户端（封装路由器API操作）
 # --------------------------
 class RouterClient:
-    def __init__(self, config):
+    def __init__(self, config, url=None, password=None):
+        """
+        :param url: 路由器地址，默认取 config.ROUTER_URL
+        :param password: 路由器后台密码，默认取 config.ROUTER_PWD
+        """
         self.config = config
+        self.url = url or config.ROUTER_URL
+        self.password = password or config.ROUTER_PWD
+        self.timeout = getattr(config, "ROUTER_TIMEOUT", 10)
+        self.session = requests.Session()  # 复用长连接
         self.token = None
         self.token_expiry = None
         self.nonce = None
@@ -56,51 +131,145 @@ class RouterClient:
         sha1_pwd = hashlib.sha1((password + key).encode()).hexdigest()
         return hashlib.sha1((self.nonce + sha1_pwd).encode()).hexdigest()
 
+    def _request(self, endpoint, path, params=None):
+        """
+        请求路由器接口并解析 JSON，按接口记录耗时与失败次数
+        :param endpoint: 指标中的接口名（login / devicelist）
+        """
+        try:
+            with ROUTER_REQUEST_SECONDS.time(router=self.url, endpoint=endpoint):
+                response = self.session.get(
+                    f"http://{self.url}/cgi-bin/luci/{path}",
+                    params=params,
+                    timeout=self.timeout,
+                )
+                return response.json()
+        except Exception:
+            ROUTER_FAILURES.inc(router=self.url, endpoint=endpoint)
+            raise
+
     def _refresh_token(self):
         """获取/刷新路由器Token"""
         try:
             params = {
                 "username": "admin",
-                "password": self._encrypt_password(self.config.ROUTER_PWD),
+                "password": self._encrypt_password(self.password),
                 "logtype": 2,
                 "nonce": self.nonce,
             }
-            response = requests.get(
-                f"http://{self.config.ROUTER_URL}/cgi-bin/luci/api/xqsystem/login",
-                params=params,
-                timeout=10,
-            )
-            self.token = response.json().get("token")
+            payload = self._request("login", "api/xqsystem/login", params)
+            self.token = payload.get("token")
             self.token_expiry = time.time() + 3600  # 假设token有效期1小时
             return self.token
         except Exception as e:
-            logger.error(f"获取路由器Token失败: {str(e)}")
+            logger.error(f"获取路由器Token失败({self.url}): {str(e)}")
             return None
 
-    def get_online_devices(self):
-        """获取在线设备列表"""
-        if not self.token or time.time() > self.token_expiry:
-            if not self._refresh_token():
-                return []
+    def fetch_devices(self):
+        """
+        获取在线设备列表，失败时抛出异常
+        Token 失效（401）时重新登录并重试一次
+        """
+        for attempt in range(2):
+            if attempt or not self.token or time.time() > self.token_expiry:
+                if not self._refresh_token():
+                    raise RuntimeError("路由器登录失败")
 
-        try:
-            response = requests.get(
-                f"http://{self.config.ROUTER_URL}/cgi-bin/luci/;stok={self.token}/api/misystem/devicelist",
-                timeout=10,
+            payload = self._request(
+                "devicelist", f";stok={self.token}/api/misystem/devicelist"
             )
-            if response.json().get("code") == 401:
-                self._refresh_token()
-                return self.get_online_devices()
+            if payload.get("code") == 401:
+                self.token = None
+                continue
 
             return [
                 {"mac": device["mac"], "name": device["name"]}
-                for device in response.json().get("list", [])
+                for device in payload.get("list", [])
             ]
+        raise RuntimeError("路由器Token重试后仍然失效")
+
+    def get_online_devices(self):
+        """获取在线设备列表"""
+        try:
+            return self.fetch_devices()
         except Exception as e:
-            logger.error(f"获取设备列表失败: {str(e)}")
+            logger.error(f"获取设备列表失败({self.url}): {str(e)}")
             return []
 
 
+# --------------------------
+# 多路由器并发轮询（asyncio 调度，每台路由器独立超时）
+# --------------------------
+class RouterPoller:
+    def __init__(self, config, clients=None):
+        """
+        :param clients: 路由器客户端列表，默认按 config.ROUTER_URLS 创建
+        """
+        self.clients = clients or [
+            RouterClient(config, url, pwd)
+            for url, pwd in zip(config.ROUTER_URLS, config.ROUTER_PWDS)
+        ]
+        self.timeout = getattr(config, "ROUTER_TIMEOUT", 10)
+        # 同一路由器同时只有一个请求（上次超时的请求返回前跳过该路由器），每台一个线程
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(self.clients), thread_name_prefix="router"
+        )
+        self.pending = {}  # url -> 进行中的请求（concurrent.futures.Future）
+        self.loop = asyncio.new_event_loop()
+        self.stats = {
+            client.url: {"latency": None, "successes": 0, "failures": 0}
+            for client in self.clients
+        }
+
+    async def _poll_one(self, client):
+        """轮询单台路由器，记录耗时与失败次数"""
+        stats = self.stats[client.url]
+        pending = self.pending.get(client.url)
+        if pending is not None and not pending.done():
+            # 客户端的会话与 token 不支持并发使用，上次的请求仍在执行时不再提交
+            stats["failures"] += 1
+            logger.error(f"获取设备列表失败({client.url}): 上次请求尚未返回，跳过本轮")
+            return []
+        start = time.perf_counter()
+        try:
+            future = self.executor.submit(client.fetch_devices)
+            self.pending[client.url] = future
+            devices = await asyncio.wait_for(
+                asyncio.wrap_future(future, loop=self.loop), self.timeout
+            )
+            stats["successes"] += 1
+            return devices
+        except Exception as e:
+            stats["failures"] += 1
+            reason = "超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+            logger.error(f"获取设备列表失败({client.url}): {reason}")
+            return []
+        finally:
+            stats["latency"] = round(time.perf_counter() - start, 3)
+
+    async def poll(self):
+        """并发轮询全部路由器，按 MAC 合并去重"""
+        results = await asyncio.gather(
+            *(self._poll_one(client) for client in self.clients)
+        )
+        merged = {}
+        for devices in results:
+            for device in devices:
+                merged.setdefault(normalize_mac(device["mac"]), device)
+        return list(merged.values())
+
+    def get_online_devices(self):
+        """同步入口：执行一轮并发轮询"""
+        return self.loop.run_until_complete(self.poll())
+
+    def summary(self):
+        """各路由器的耗时与失败次数摘要"""
+        return ", ".join(
+            f"{url} {stats['latency']}s 失败{stats['failures']}"
+            for url, stats in self.stats.items()
+        )
+
+
 # --------------------------
 # 考勤服务（核心业务逻辑）
 # --------------------------
@@ -108,34 +277,91 @@ class AttendanceService:
     def __init__(self, config):
         self.config = config
         self.db = database_manager
-        self.router = RouterClient(config)
-        self.user_list = self._load_user_list()
+        self.router = RouterPoller(config)
+        self.merge_gap = getattr(config, "MERGE_GAP_SECONDS", 1800)
+        self.scheduler = PollScheduler(
+            interval=getattr(config, "POLL_INTERVAL", 300),
+            min_interval=getattr(config, "POLL_MIN_INTERVAL", 60),
+            max_interval=getattr(config, "POLL_MAX_INTERVAL", 900),
+            night_hours=getattr(config, "POLL_NIGHT_HOURS", None),
+        )
+        if self.scheduler.max_interval > self.merge_gap:
+            logger.warning("最长轮询间隔大于会话合并间隔，夜间持续在场会被拆成多段")
+        self.roster_watcher = RosterWatcher(config.USER_MAC_LIST_PATH, logger)
+        log_path = getattr(config, "PRESENCE_LOG_PATH", None)
+        self.presence_log = PresenceLogWriter(log_path, logger) if log_path else None
+        self.open_sessions = {}  # 各用户最新会话缓存 {name: (id, start, end)}
+        self.live_names = set()  # 最新会话尚未发布结束事件的用户
+        self.next_record_id = None  # 下一个可用的记录id，None 表示缓存未就绪
+        self.max_span = 0  # 已记录的最长会话时长（秒）
+        self.last_archive_day = None  # 上次执行归档的日期
+        self.summary_limiter = RateLimiter(config.LOG_SUMMARY_INTERVAL)
+        self._init_db()
+        self._rebuild_session_cache()
 
     def _init_db(self):
-        """初始化数据库结构"""
-        with self.db.get_connection() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS attendance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    start_time DATETIME NOT NULL,
-                    end_time DATETIME NOT NULL
-                )
-            """
-            )
+        """初始化数据库结构（升级到最新版本）"""
+        init_schema(self.db)
 
-    def _load_user_list(self):
-        """加载MAC地址白名单"""
+    def _rebuild_session_cache(self):
+        """
+        从数据库重建未结束会话缓存
+        每个用户仅保留最新一条记录 {name: (id, start, end)}，并同步下一个可用的记录id
+        """
+        self.open_sessions = {}
+        self.next_record_id = None
         try:
-            with open(self.config.USER_MAC_LIST_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT id, name, start_time, MAX(end_time)
+                    FROM attendance
+                    GROUP BY name"""
+                )
+                recent = to_timestamp(datetime.now()) - self.merge_gap
+                for record_id, name, start_ts, end_ts in cursor.fetchall():
+                    self.open_sessions[name] = (record_id, start_ts, end_ts)
+                self.live_names = {
+                    name
+                    for name, (_, _, end_ts) in self.open_sessions.items()
+                    if end_ts >= recent
+                }
+                # AUTOINCREMENT 不复用已删除的id，需同时参考 sqlite_sequence
+                cursor.execute(
+                    """
+                    SELECT MAX(
+                        COALESCE((SELECT MAX(id) FROM attendance), 0),
+                        COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'attendance'), 0)
+                    )"""
+                )
+                self.next_record_id = cursor.fetchone()[0] + 1
+                self.max_span = read_meta(conn, ATTENDANCE_MAX_SPAN, 0)
+            logger.info(f"已加载{len(self.open_sessions)}个用户的最新考勤会话")
+            return True
         except Exception as e:
-            logger.error(f"加载用户列表失败: {str(e)}")
-            return []
+            logger.error(f"加载考勤会话缓存失败: {str(e)}")
+            return False
+
+    def _plan_session(self, session, now_ts):
+        """
+        根据用户最新会话判断本次是延长该会话还是新建会话（含时间合并逻辑）
+        会话跨天时不再拆分，按天拆分由查询端完成
+        :param session: 最新会话 (id, start_ts, end_ts)，无记录时为 None
+        :param now_ts: 当前时间戳
+        :return: 需延长的记录id，需新建会话时为 None
+        """
+        if not session:
+            return None
+        record_id, start_ts, end_ts = session
+        # 判断是否需要合并
+        if now_ts - end_ts > self.merge_gap:
+            return None
+        return record_id
 
     def _update_attendance_record(self, name, current_time):
         """更新考勤记录（含时间合并逻辑）"""
+        now_ts = to_timestamp(current_time)
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             try:
@@ -149,91 +375,258 @@ class AttendanceService:
                     LIMIT 1""",
                     (name,),
                 )
-                record = cursor.fetchone()
+                session = cursor.fetchone()
+                record_id = self._plan_session(session, now_ts)
 
-                current_str = current_time.strftime("%Y-%m-%d %H:%M:%S")
-
-                if not record:
+                if record_id is not None:
+                    # 延长原会话
                     cursor.execute(
-                        """
-                            INSERT INTO attendance (name, start_time, end_time)
-                            VALUES (?, ?, ?)""",
-                        (name, current_str, current_str),
+                        "UPDATE attendance SET end_time = ? WHERE id = ?",
+                        (now_ts, record_id),
                     )
-                    conn.commit()
-                    return
-
-                record_id, start_str, end_str = record
-                start_dt = datetime.strptime(start_str, "%Y-%m-%d %H:%M:%S")
-                end_dt = datetime.strptime(end_str, "%Y-%m-%d %H:%M:%S")
-
-                # 判断是否需要合并
-                if (current_time - end_dt).total_seconds() <= 1800:  # 30分钟
-                    periods = []
-                    # 处理跨天分割
-                    temp_start = start_dt
-                    while temp_start.date() < current_time.date():
-                        day_end = datetime(
-                            temp_start.year,
-                            temp_start.month,
-                            temp_start.day,
-                            23,
-                            59,
-                            59,
-                        )
-                        periods.append((temp_start, day_end))
-                        temp_start = day_end + timedelta(seconds=1)
-                    periods.append((temp_start, current_time))
-
-                    # 删除原记录
-                    cursor.execute("DELETE FROM attendance WHERE id = ?", (record_id,))
-
+                    apply_rollup(cursor, session_extended(name, session[2], now_ts))
+                    session = (record_id, session[1], now_ts)
+                    kind = SESSION_EXTENDED
                 else:
-                    periods = [(current_time, current_time)]
-
-                for s, e in periods:
                     cursor.execute(
                         """
                         INSERT INTO attendance (name, start_time, end_time)
                         VALUES (?, ?, ?)""",
-                        (
-                            name,
-                            s.strftime("%Y-%m-%d %H:%M:%S"),
-                            e.strftime("%Y-%m-%d %H:%M:%S"),
-                        ),
+                        (name, now_ts, now_ts),
                     )
+                    apply_rollup(cursor, session_started(name, now_ts))
+                    session = (cursor.lastrowid, now_ts, now_ts)
+                    kind = SESSION_STARTED
+                max_span = self._update_max_span(cursor, [session])
+                publish_events(cursor, [session_event(kind, name, session)], now_ts)
+                bump_version(cursor, ATTENDANCE_VERSION)
                 conn.commit()
+                self.max_span = max_span
+                self.open_sessions[name] = session
+                self.live_names.add(name)
+                if self.next_record_id is not None:
+                    self.next_record_id = max(self.next_record_id, session[0] + 1)
             except Exception as e:
                 conn.rollback()
                 logger.error(f"更新考勤记录失败: {str(e)}")
+                self._rebuild_session_cache()
+
+    def _update_max_span(self, cursor, sessions):
+        """
+        记录最长会话时长，查询端据此限定按开始时间的扫描下界
+        :return: 更新后的最长时长（提交成功后再写回缓存）
+        """
+        max_span = max([end - start for _, start, end in sessions] + [self.max_span])
+        if max_span > self.max_span:
+            write_meta(cursor, ATTENDANCE_MAX_SPAN, max_span)
+        return max_span
+
+    def _apply_tick(self, names, current_time):
+        """
+        批量更新一次轮询内所有在线用户的考勤记录（单连接、单事务）
+        合并判断基于内存中的会话缓存，不再逐个查询最新记录；
+        持续在场只更新 end_time，离开超过合并间隔后才新建记录；
+        会话的开始/延长/结束事件在同一事务内发布
+        :param names: 在线用户名列表
+        :return: 本次提交耗时（秒），失败或无需写入时为 None
+        """
+        names = list(dict.fromkeys(names))  # 去重并保持顺序
+        if self.next_record_id is None and not self._rebuild_session_cache():
+            return None
+
+        now_ts = to_timestamp(current_time)
+        # 离开超过合并间隔的会话视为结束
+        ended = [
+            name
+            for name in self.live_names
+            if now_ts - self.open_sessions[name][2] > self.merge_gap
+        ]
+        if not names and not ended:
+            return None
+
+        events = [
+            session_event(SESSION_ENDED, name, self.open_sessions[name])
+            for name in ended
+        ]
+        extends, inserts, rollups, updated = [], [], [], {}
+        next_id = self.next_record_id
+        for name in names:
+            session = self.open_sessions.get(name)
+            record_id = self._plan_session(session, now_ts)
+            if record_id is not None:
+                extends.append((now_ts, record_id))
+                rollups.extend(session_extended(name, session[2], now_ts))
+                updated[name] = (record_id, session[1], now_ts)
+                events.append(session_event(SESSION_EXTENDED, name, updated[name]))
+            else:
+                inserts.append((next_id, name, now_ts, now_ts))
+                rollups.extend(session_started(name, now_ts))
+                updated[name] = (next_id, now_ts, now_ts)
+                events.append(session_event(SESSION_STARTED, name, updated[name]))
+                next_id += 1
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                write_start = time.perf_counter()
+                cursor.executemany(
+                    "UPDATE attendance SET end_time = ? WHERE id = ?", extends
+                )
+                cursor.executemany(
+                    """
+                    INSERT INTO attendance (id, name, start_time, end_time)
+                    VALUES (?, ?, ?, ?)""",
+                    inserts,
+                )
+                apply_rollup(cursor, rollups)
+                max_span = self._update_max_span(cursor, updated.values())
+                publish_events(cursor, events, now_ts)
+                prune_events(cursor, now_ts - EVENT_RETENTION)
+                if updated:
+                    bump_version(cursor, ATTENDANCE_VERSION)
+
+                commit_start = time.perf_counter()
+                conn.commit()
+                commit_seconds = time.perf_counter() - commit_start
+            except Exception as e:
+                conn.rollback()
+                TICK_FAILURES.inc()
+                logger.error(f"批量更新考勤记录失败: {str(e)}")
+                self._rebuild_session_cache()
+                return None
+
+        TICK_WRITE_SECONDS.observe(commit_start - write_start)
+        TICK_COMMIT_SECONDS.observe(commit_seconds)
+        TICK_ROWS.observe(len(inserts), kind="started")
+        TICK_ROWS.observe(len(extends), kind="extended")
+        TICK_ROWS.observe(len(ended), kind="ended")
+
+        # 提交成功后再更新缓存
+        self.open_sessions.update(updated)
+        self.live_names.difference_update(ended)
+        self.live_names.update(updated)
+        self.next_record_id = next_id
+        self.max_span = max_span
+        logger.debug(
+            f"批量更新考勤记录: 用户{len(names)} 延长{len(extends)} "
+            f"新建{len(inserts)} 结束{len(ended)} 提交耗时{commit_seconds * 1000:.1f}ms"
+        )
+        return commit_seconds
+
+    def _log_presence(self, names, current_time, roster):
+        """将本轮在线用户追加到原始在线记录日志（失败不影响考勤写入）"""
+        if self.presence_log is None:
+            return
+        try:
+            self.presence_log.append(to_timestamp(current_time), names, roster.names)
+        except Exception as e:
+            logger.error(f"写入在线记录日志失败: {str(e)}")
+
+    def _publish_metrics(self):
+        """将本进程的指标快照写入数据库，供 Web 端的 /metrics 输出"""
+        try:
+            with self.db.get_connection() as conn:
+                publish_metrics(conn.cursor(), METRICS_PROCESS)
+        except Exception as e:
+            logger.error(f"写入指标快照失败: {str(e)}")
+
+    def _maybe_archive(self, current_time):
+        """每天首次轮询后归档已结束月份的考勤记录（ARCHIVE_KEEP_MONTHS 为 0 时不归档）"""
+        if not ARCHIVE_KEEP_MONTHS or self.last_archive_day == current_time.date():
+            return
+        self.last_archive_day = current_time.date()
+        try:
+            result = run_archive(
+                self.db, to_timestamp(current_time), merge_gap=self.merge_gap
+            )
+        except Exception as e:
+            logger.error(f"归档考勤记录失败: {str(e)}")
+            return
+        if result["archived"] or result["removed"]:
+            logger.info(
+                f"归档完成: 移出{sum(result['archived'].values())}条记录 "
+                f"删除{len(result['removed'])}个过期归档文件"
+            )
+
+    def _log_changes(self, online_users, previous, current):
+        """记录本轮到达与离开的用户（只列出变化的部分）"""
+        arrived = [name for name in online_users if name not in previous]
+        left = sorted(previous - current)
+        logger.info(
+            f"在线变化: 到达{len(arrived)} {', '.join(arrived)} "
+            f"离开{len(left)} {', '.join(left)}",
+            extra={"data": {"arrived": arrived, "left": left}},
+        )
+
+    def _log_summary(self, online_users, lag, interval, tick_seconds, commit_seconds):
+        """轮询摘要（按 LOG_SUMMARY_INTERVAL 限频，期间省略的次数随下一条输出）"""
+        allowed, suppressed = self.summary_limiter.allow()
+        if not allowed:
+            return
+        scheduler = self.scheduler
+        logger.info(
+            f"轮询摘要: 在线{len(online_users)} - {', '.join(online_users)}; "
+            f"路由器 {self.router.summary()}; "
+            f"耗时{tick_seconds * 1000:.0f}ms 延迟{lag:.2f}s 下次间隔{interval}s "
+            f"累计跳过{scheduler.missed_ticks}拍"
+            + (f"（此前省略{suppressed}条摘要）" if suppressed else ""),
+            extra={
+                "data": {
+                    "online": len(online_users),
+                    "routers": {
+                        url: dict(stats) for url, stats in self.router.stats.items()
+                    },
+                    "tick_ms": round(tick_seconds * 1000, 1),
+                    "commit_ms": (
+                        round(commit_seconds * 1000, 1)
+                        if commit_seconds is not None
+                        else None
+                    ),
+                    "lag": round(lag, 2),
+                    "interval": interval,
+                    "missed_ticks": scheduler.missed_ticks,
+                    "suppressed": suppressed,
+                }
+            },
+        )
 
     def run_monitoring(self):
-        """启动监控主循环"""
+        """启动监控主循环（按调度器的固定节拍轮询）"""
         logger.info("启动考勤监控服务")
+        scheduler = self.scheduler
+        previous = None
         while True:
             try:
+                lag = scheduler.wait()
+                tick_start = time.perf_counter()
                 devices = self.router.get_online_devices()
-                online_users = [
-                    user["name"]
-                    for user in self.user_list
-                    if any(d["mac"] == user["MAC"] for d in devices)
-                ]
+                roster = self.roster_watcher.get()
+                online_users = roster.match(devices)
 
                 current_time = datetime.now()
-                for user in self.user_list:
-                    if user["name"] in online_users:
-                        self._update_attendance_record(user["name"], current_time)
+                self._log_presence(online_users, current_time, roster)
+                commit_seconds = self._apply_tick(online_users, current_time)
+                self._maybe_archive(current_time)
+                tick_seconds = time.perf_counter() - tick_start
+                TICK_SECONDS.observe(tick_seconds)
+                self._publish_metrics()
 
-                logger.info(
-                    f"在线用户: {len(online_users)} - {', '.join(online_users)}"
+                # 在场人员变化（有人到达或离开）时加快下一轮轮询
+                current = set(online_users)
+                changed = previous is not None and current != previous
+                if changed:
+                    self._log_changes(online_users, previous, current)
+                previous = current
+                interval = scheduler.schedule_next(changed, datetime.now())
+                self._log_summary(
+                    online_users, lag, interval, tick_seconds, commit_seconds
                 )
-                time.sleep(300)
             except KeyboardInterrupt:
                 logger.info("服务已手动终止")
                 break
             except Exception as e:
-                logger.error(f"监控循环错误: {str(e)}")
-                time.sleep(60)
+                delay = scheduler.schedule_retry()
+                logger.error(f"监控循环错误: {str(e)}，{delay}s 后重试")
 
 
 # --------------------------
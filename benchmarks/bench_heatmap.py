@@ -0,0 +1,62 @@
+"""
+占用热力图基准：在一年的合成考勤数据上测量 Analytics.occupancy_heatmap 的耗时
+
+用法（在仓库根目录执行）:
+    python benchmarks/bench_heatmap.py --users 60 --days 365
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analytics import occupancy_heatmap  # noqa: E402
+from Schema import parse_date, SECONDS_PER_DAY  # noqa: E402
+from synthetic import build_database, generate_sessions, user_names  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="占用热力图基准测试")
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--slot", type=int, default=5, help="时间槽分钟数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    names = user_names(args.users)
+    start_ts = parse_date("2025-01-01")
+    end_ts = start_ts + args.days * SECONDS_PER_DAY
+    rows = generate_sessions(names, start_ts, args.days)
+
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir:
+        db = build_database(os.path.join(workdir, "bench.db"), rows)
+        for _ in range(args.repeat):
+            with db.get_read_connection() as conn:
+                begin = time.perf_counter()
+                occupancy_heatmap(conn, start_ts, end_ts, names, args.slot * 60)
+                timings.append(time.perf_counter() - begin)
+        db.close()
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "heatmap",
+                "users": args.users,
+                "days": args.days,
+                "sessions": len(rows),
+                "slot_minutes": args.slot,
+                "best_ms": round(min(timings) * 1000, 2),
+                "mean_ms": round(sum(timings) / len(timings) * 1000, 2),
+            },
+            ensure_ascii=False,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
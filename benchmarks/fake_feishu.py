@@ -0,0 +1,244 @@
+"""
+本地模拟飞书表格服务：提供获取 tenant_access_token 与读取单个范围的开放接口，
+并附带一个与 APIContainer 同形的最小客户端（spreadsheet.reading_a_single_range），
+可直接传给 CourseManager 使用
+
+用法:
+    python benchmarks/fake_feishu.py --users 200 --latency 100
+    然后设置 LARK_HOST=http://127.0.0.1:<端口> 运行 course_schedule.py
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TOKEN_PATH = "/open-apis/auth/v3/tenant_access_token/internal"
+VALUES_PATH = re.compile(r"^/open-apis/sheets/v2/spreadsheets/([^/]+)/values/([^/]+)$")
+RANGE_PATTERN = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+TENANT_TOKEN = "t-fake-tenant-token"
+
+
+def column_index(letters):
+    """列字母 -> 从 0 开始的列号（A -> 0, AZ -> 51）"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def slice_range(rows, cell_range):
+    """
+    按 A1 表示法截取表格内容（如 A1:AZ、A101:AZ200），超出已有数据的部分不返回
+    """
+    match = RANGE_PATTERN.match(cell_range)
+    if not match:
+        raise ValueError(f"无效的范围: {cell_range}")
+    first_col, first_row, last_col, last_row = match.groups()
+    col_start = column_index(first_col)
+    col_end = column_index(last_col or first_col) + 1
+    row_start = int(first_row or 1) - 1
+    row_end = int(last_row) if last_row else len(rows)
+    return [row[col_start:col_end] for row in rows[row_start:row_end]]
+
+
+class FakeSheetServer:
+    def __init__(
+        self, sheets, latency=0.0, failure_rate=0.0, seed=0, host="127.0.0.1", port=0
+    ):
+        """
+        :param sheets: {(spreadsheet_token, sheet_id): rows}
+        :param latency: 每个请求的固定延迟（秒）
+        :param failure_rate: 读取请求返回限流错误（HTTP 429）的概率
+        """
+        self.sheets = sheets
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self.requests = {"token": 0, "values": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-feishu", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def values(self, spreadsheet_token, full_range):
+        """:return: 与开放接口一致的响应体"""
+        sheet_id, _, cell_range = full_range.partition("!")
+        rows = self.sheets.get((spreadsheet_token, sheet_id))
+        if rows is None:
+            return {"code": 90215, "msg": "sheet not found"}
+        try:
+            values = slice_range(rows, cell_range)
+        except ValueError as e:
+            return {"code": 90202, "msg": str(e)}
+        return {
+            "code": 0,
+            "msg": "success",
+            "data": {
+                "spreadsheetToken": spreadsheet_token,
+                "revision": 1,
+                "valueRange": {
+                    "majorDimension": "ROWS",
+                    "range": full_range,
+                    "revision": 1,
+                    "values": values,
+                },
+            },
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if urlsplit(self.path).path != TOKEN_PATH:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests["token"] += 1
+                self._reply(
+                    200,
+                    {
+                        "code": 0,
+                        "msg": "ok",
+                        "tenant_access_token": TENANT_TOKEN,
+                        "expire": 7200,
+                    },
+                )
+
+            def do_GET(self):
+                match = VALUES_PATH.match(urlsplit(self.path).path)
+                if not match:
+                    self.send_error(404)
+                    return
+                if self.headers.get("Authorization") != f"Bearer {TENANT_TOKEN}":
+                    self._reply(401, {"code": 99991663, "msg": "invalid token"})
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    failed = server._rng.random() < server.failure_rate
+                    server.requests["failed" if failed else "values"] += 1
+                if failed:
+                    self._reply(
+                        429,
+                        {"code": 99991400, "msg": "request trigger frequency limit"},
+                    )
+                    return
+                self._reply(200, server.values(match.group(1), unquote(match.group(2))))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+# --------------------------
+# 最小客户端（与 APIContainer 的调用方式一致）
+# --------------------------
+class _Spreadsheet:
+    def __init__(self, client):
+        self.client = client
+
+    def reading_a_single_range(self, spreadsheet_token, sheet_id, cell_range):
+        """读取单个范围，返回开放接口的原始响应体"""
+        response = self.client.session.get(
+            f"{self.client.host}/open-apis/sheets/v2/spreadsheets/"
+            f"{spreadsheet_token}/values/{sheet_id}!{cell_range}",
+            headers={"Authorization": f"Bearer {self.client.tenant_token()}"},
+            timeout=self.client.timeout,
+        )
+        return response.json()
+
+
+class SheetClient:
+    def __init__(self, app_id, app_secret, host, timeout=10, pool_size=16):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+        # 连接池大小需不小于并发请求数，否则多余的连接用完即关闭
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+        self._token = None
+        self.spreadsheet = _Spreadsheet(self)
+
+    def tenant_token(self):
+        if self._token is None:
+            response = self.session.post(
+                f"{self.host}{TOKEN_PATH}",
+                json={"app_id": self.app_id, "app_secret": self.app_secret},
+                timeout=self.timeout,
+            )
+            self._token = response.json()["tenant_access_token"]
+        return self._token
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synthetic import generate_schedule, sheet_rows, user_names
+
+    parser = argparse.ArgumentParser(description="本地模拟飞书表格服务")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--token", default="bench-sheet", help="表格 token")
+    parser.add_argument("--sheet", default="bench", help="工作表 ID")
+    parser.add_argument("--latency", type=float, default=0, help="固定延迟（毫秒）")
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = sheet_rows(generate_schedule(user_names(args.users), args.seed))
+    server = FakeSheetServer(
+        {(args.token, args.sheet): rows},
+        args.latency / 1000,
+        args.failure_rate,
+        args.seed,
+        port=args.port,
+    ).start()
+    print(
+        f"模拟飞书表格服务已启动: LARK_HOST={server.url} "
+        f"COURSE_SHEET_TOKEN={args.token} COURSE_SHEET_ID={args.sheet}（Ctrl+C 退出）"
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
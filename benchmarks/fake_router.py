@@ -0,0 +1,172 @@
+"""
+本地模拟路由器：提供与小米路由器后台一致的登录与在线设备列表接口，
+在线设备按设定的比例随轮询变化，并可附加固定/随机延迟
+
+用法:
+    python benchmarks/fake_router.py --devices 3000 --churn 0.05 --latency 50
+    然后设置 ROUTER_URL=127.0.0.1:<端口> 运行 attendance.py
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+LOGIN_PATH = "/cgi-bin/luci/api/xqsystem/login"
+DEVICELIST_SUFFIX = "/api/misystem/devicelist"
+STOK_PREFIX = "/cgi-bin/luci/;stok="
+
+
+class FakeRouter:
+    def __init__(
+        self,
+        macs,
+        online_ratio=0.5,
+        churn=0.05,
+        latency=0.0,
+        jitter=0.0,
+        token_ttl=0,
+        seed=0,
+        host="127.0.0.1",
+        port=0,
+    ):
+        """
+        :param macs: 连接过该路由器的全部设备 MAC
+        :param online_ratio: 初始在线比例
+        :param churn: 每次查询设备列表时，每台设备切换在线状态的概率
+        :param latency: 每个请求的固定延迟（秒）
+        :param jitter: 在固定延迟之上附加的随机延迟上限（秒）
+        :param token_ttl: token 可用的查询次数，超过后返回 401，0 表示永不失效
+        """
+        self.macs = list(macs)
+        self.churn = churn
+        self.latency = latency
+        self.jitter = jitter
+        self.token_ttl = token_ttl
+        self._rng = random.Random(seed)
+        self._delay_rng = random.Random(seed + 1)  # 延迟抖动不影响设备变化序列
+        self._lock = threading.Lock()
+        self.online = {mac for mac in self.macs if self._rng.random() < online_ratio}
+        self.token = None
+        self.token_uses = 0
+        self.requests = {"login": 0, "devicelist": 0, "unauthorized": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        """RouterClient 使用的地址（host:port）"""
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-router", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._delay_rng.random() * self.jitter)
+
+    def login(self):
+        with self._lock:
+            self.requests["login"] += 1
+            self.token = f"{self._rng.getrandbits(64):016x}"
+            self.token_uses = 0
+            return {"code": 0, "token": self.token}
+
+    def devicelist(self, token):
+        with self._lock:
+            if token != self.token or (
+                self.token_ttl and self.token_uses >= self.token_ttl
+            ):
+                self.requests["unauthorized"] += 1
+                return {"code": 401, "msg": "Invalid token"}
+            self.requests["devicelist"] += 1
+            self.token_uses += 1
+            if self.churn:
+                for mac in self.macs:
+                    if self._rng.random() < self.churn:
+                        self.online.symmetric_difference_update((mac,))
+            online = [mac for mac in self.macs if mac in self.online]
+        return {
+            "code": 0,
+            "list": [{"mac": mac, "name": f"host-{mac[-5:]}"} for mac in online],
+        }
+
+    def _handler(self):
+        router = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                router._delay()
+                if path == LOGIN_PATH:
+                    payload = router.login()
+                elif path.startswith(STOK_PREFIX) and path.endswith(DEVICELIST_SUFFIX):
+                    token = path[len(STOK_PREFIX) : -len(DEVICELIST_SUFFIX)]
+                    payload = router.devicelist(token)
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synthetic import user_mac, stranger_mac
+
+    parser = argparse.ArgumentParser(description="本地模拟路由器")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--devices", type=int, default=1000, help="名册内设备数")
+    parser.add_argument("--strangers", type=int, default=0, help="名册外设备数")
+    parser.add_argument("--online", type=float, default=0.5, help="初始在线比例")
+    parser.add_argument("--churn", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0, help="固定延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="随机延迟上限（毫秒）")
+    parser.add_argument("--token-ttl", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    macs = [user_mac(i) for i in range(args.devices)]
+    macs += [stranger_mac(i) for i in range(args.strangers)]
+    router = FakeRouter(
+        macs,
+        online_ratio=args.online,
+        churn=args.churn,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        token_ttl=args.token_ttl,
+        seed=args.seed,
+        port=args.port,
+    ).start()
+    print(f"模拟路由器已启动: ROUTER_URL={router.address}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        router.stop()
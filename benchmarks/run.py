@@ -0,0 +1,746 @@
+"""
+基准测试套件：在合成数据与本地模拟的路由器/飞书服务上测量各关键路径，结果写入 JSON
+
+用法（在仓库根目录执行）:
+    python benchmarks/run.py --users 300 --days 180 --devices 3000 --output bench.json
+    python benchmarks/run.py --only get_data,tick --baseline bench.json
+
+包含的测试:
+    parse       parse_week_ranges / _process_data_row 解析速度
+    get_data    /get_data 首次生成、缓存命中与 304 协商的延迟分位数
+    serving     同等并发下 Flask 与 ASGI 模式的对比（缓存命中 / 命中与生成混合）
+    heatmap     占用热力图计算耗时（需要 numpy）
+    sheet_sync  经模拟飞书服务的课表同步（全量比对 / 未变化跳过 / 大量变更）
+    tick        逐用户写入（_update_attendance_record）与批量写入（_apply_tick）的吞吐
+    end_to_end  多台模拟路由器、数千台设备下的完整轮询节拍
+
+course_schedule 依赖的飞书 API 封装不可用时，parse 与 sheet_sync 记为 skipped；
+未安装 uvicorn 时 serving 记为 skipped
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+SUITES = [
+    "parse",
+    "get_data",
+    "serving",
+    "heatmap",
+    "sheet_sync",
+    "tick",
+    "end_to_end",
+]
+TICK_SECONDS = 300  # 模拟轮询的节拍间隔
+
+
+def percentiles(samples):
+    """:return: 毫秒单位的分位数摘要"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(rank(50) * 1000, 3),
+        "p90_ms": round(rank(90) * 1000, 3),
+        "p99_ms": round(rank(99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class SimClock:
+    """模拟时钟：每次 tick 前进一个轮询节拍，各测试共享，写入的时间单调递增"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def tick(self):
+        self.now += timedelta(seconds=TICK_SECONDS)
+        return self.now
+
+
+def simulate_online(names, rng, online, churn):
+    """在上一轮在线集合的基础上按 churn 随机切换，得到本轮在线用户"""
+    for name in names:
+        if rng.random() < churn:
+            online.symmetric_difference_update((name,))
+    return [name for name in names if name in online]
+
+
+def import_course_schedule():
+    try:
+        import course_schedule
+    except ImportError as e:
+        return None, f"course_schedule 不可用: {e}"
+    return course_schedule, None
+
+
+# --------------------------
+# 各项测试
+# --------------------------
+def bench_parse(ctx, args):
+    course_schedule, reason = import_course_schedule()
+    if course_schedule is None:
+        return {"skipped": reason}
+    from synthetic import sheet_rows
+
+    manager = course_schedule.CourseManager.__new__(course_schedule.CourseManager)
+    manager.logger = logging.getLogger("bench.parse")
+    manager.logger.addHandler(logging.NullHandler())
+    manager.logger.propagate = False
+
+    rows = sheet_rows(ctx.workspace["schedule"])
+    cells = [cell for row in rows[1:] for cell in row[2:] if cell]
+    parse = course_schedule.CourseManager.parse_week_ranges
+
+    timings = []
+    for _ in range(args.repeat):
+        begin = time.perf_counter()
+        for cell in cells:
+            parse(cell)
+        timings.append(time.perf_counter() - begin)
+    best_parse = min(timings)
+
+    data_start, name_col, day_cols = manager._fetch_index(rows)
+    timings, records = [], 0
+    for _ in range(args.repeat):
+        begin = time.perf_counter()
+        records = sum(
+            1
+            for _ in manager._process_data_row(
+                rows[data_start:], name_col, day_cols, data_start + 1
+            )
+        )
+        timings.append(time.perf_counter() - begin)
+    best_rows = min(timings)
+
+    return {
+        "rows": len(rows),
+        "cells": len(cells),
+        "records": records,
+        "parse_week_ranges": {
+            "best_ms": round(best_parse * 1000, 3),
+            "cells_per_s": round(len(cells) / best_parse),
+        },
+        "process_rows": {
+            "best_ms": round(best_rows * 1000, 3),
+            "rows_per_s": round(len(rows) / best_rows),
+        },
+    }
+
+
+def _get_data_phase(base_url, dates, requests_total, concurrency, headers=None):
+    """
+    并发请求 /get_data，各线程依次取日期
+    :param headers: date -> 请求头，None 表示不带额外请求头
+    :return: (各请求耗时, 状态码计数, 总耗时)
+    """
+    import requests
+
+    timings, statuses = [], {}
+    lock = threading.Lock()
+    counter = iter(range(requests_total))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            date = dates[number % len(dates)]
+            begin = time.perf_counter()
+            response = session.get(
+                f"{base_url}/get_data",
+                params={"date": date},
+                headers=headers(date) if headers else None,
+            )
+            elapsed = time.perf_counter() - begin
+            with lock:
+                timings.append(elapsed)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, statuses, time.perf_counter() - begin
+
+
+def bench_get_data(ctx, args):
+    import requests
+    from werkzeug.serving import make_server
+    import server
+    from Schema import from_timestamp, SECONDS_PER_DAY
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # 不输出逐请求日志
+    http = make_server("127.0.0.1", 0, server.app, threaded=True)
+    thread = threading.Thread(target=http.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{http.server_port}"
+    try:
+        workspace = ctx.workspace
+        rng = random.Random(args.seed)
+        days = list(range(workspace["start_ts"], workspace["end_ts"], SECONDS_PER_DAY))
+        dates = [
+            from_timestamp(day_ts).strftime("%Y-%m-%d")
+            for day_ts in rng.sample(days, min(len(days), args.get_data_dates))
+        ]
+
+        # 首次生成：清空响应缓存，每个日期请求一次
+        server.response_cache = type(server.response_cache)(server.HTTP_CACHE_MAX_BYTES)
+        cold, cold_status, _ = _get_data_phase(base_url, dates, len(dates), 1)
+
+        # 缓存命中：响应已生成，并发读取
+        warm, warm_status, warm_wall = _get_data_phase(
+            base_url, dates, args.get_data_requests, args.concurrency
+        )
+
+        # 协商缓存：携带 ETag，期望 304
+        etags = {
+            date: requests.get(
+                f"{base_url}/get_data", params={"date": date}
+            ).headers.get("ETag")
+            for date in dates
+        }
+        revalidate, revalidate_status, _ = _get_data_phase(
+            base_url,
+            dates,
+            args.get_data_requests,
+            args.concurrency,
+            headers=lambda date: {"If-None-Match": etags[date]},
+        )
+    finally:
+        http.shutdown()
+        http.server_close()
+
+    return {
+        "dates": len(dates),
+        "concurrency": args.concurrency,
+        "cold": {**percentiles(cold), "status": cold_status},
+        "warm": {
+            **percentiles(warm),
+            "status": warm_status,
+            "requests_per_s": round(len(warm) / warm_wall, 1),
+        },
+        "revalidate": {**percentiles(revalidate), "status": revalidate_status},
+    }
+
+
+# --------------------------
+# Flask 与 ASGI 服务对比：两种服务各自在独立子进程中运行，避免与压测线程争用 GIL
+# --------------------------
+FLASK_COMMAND = (
+    "import sys, logging, server; from werkzeug.serving import run_simple; "
+    "logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+    "run_simple('127.0.0.1', int(sys.argv[1]), server.app, threaded=True)"
+)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(command, base_url, timeout=30):
+    """启动服务子进程并等待主页可访问"""
+    import requests
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])
+        ),
+    }
+    process = subprocess.Popen(
+        command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败: {process.stderr.read().decode()}")
+        try:
+            requests.get(f"{base_url}/", timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"服务启动超时: {' '.join(command)}")
+
+
+def _serving_phases(base_url, hot_dates, cold_dates, args):
+    """
+    :return: 缓存命中阶段与混合阶段的结果；混合阶段中部分并发请求未生成过的日期，
+             其余并发持续请求已缓存的日期，观察命中请求是否被生成请求拖慢
+    """
+    _get_data_phase(base_url, hot_dates, len(hot_dates), 1)  # 预热缓存
+
+    warm, warm_status, warm_wall = _get_data_phase(
+        base_url, hot_dates, args.get_data_requests, args.concurrency
+    )
+
+    cold_workers = max(1, args.concurrency // 4)
+    lanes = {}
+
+    def run_lane(name, dates, total, concurrency):
+        lanes[name] = _get_data_phase(base_url, dates, total, concurrency)
+
+    threads = [
+        threading.Thread(
+            target=run_lane,
+            args=(
+                "hot",
+                hot_dates,
+                args.get_data_requests,
+                args.concurrency - cold_workers,
+            ),
+        ),
+        threading.Thread(
+            target=run_lane,
+            args=("cold", cold_dates, len(cold_dates), cold_workers),
+        ),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    hot, hot_status, hot_wall = lanes["hot"]
+    cold, cold_status, _ = lanes["cold"]
+    return {
+        "warm": {
+            **percentiles(warm),
+            "status": warm_status,
+            "requests_per_s": round(len(warm) / warm_wall, 1),
+        },
+        "mixed_hot": {
+            **percentiles(hot),
+            "status": hot_status,
+            "requests_per_s": round(len(hot) / hot_wall, 1),
+        },
+        "mixed_cold": {**percentiles(cold), "status": cold_status},
+    }
+
+
+def bench_serving(ctx, args):
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError as e:
+        return {"skipped": f"uvicorn 不可用: {e}"}
+    from Schema import from_timestamp, SECONDS_PER_DAY
+
+    if args.concurrency < 2:
+        return {"skipped": "混合阶段需要 --concurrency >= 2"}
+
+    workspace = ctx.workspace
+    rng = random.Random(args.seed)
+    days = list(range(workspace["start_ts"], workspace["end_ts"], SECONDS_PER_DAY))
+    rng.shuffle(days)
+    dates = [from_timestamp(day_ts).strftime("%Y-%m-%d") for day_ts in days]
+    hot_dates = dates[: min(len(dates) // 2, args.get_data_dates)]
+    cold_dates = dates[len(hot_dates) :]
+
+    servers = {
+        "flask": lambda port: [sys.executable, "-c", FLASK_COMMAND, str(port)],
+        "asgi": lambda port: [
+            sys.executable,
+            os.path.join(REPO_DIR, "asgi_server.py"),
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+        ],
+    }
+    results = {
+        "concurrency": args.concurrency,
+        "hot_dates": len(hot_dates),
+        "cold_dates": len(cold_dates),
+    }
+    for name, command in servers.items():
+        # 每种服务使用新进程，两者的响应缓存都从空开始
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = _start_server(command(port), base_url)
+        try:
+            results[name] = _serving_phases(base_url, hot_dates, cold_dates, args)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+    return results
+
+
+def bench_heatmap(ctx, args):
+    try:
+        from Analytics import occupancy_heatmap
+    except ImportError as e:
+        return {"skipped": f"numpy 不可用: {e}"}
+    from Database import database_manager
+
+    workspace = ctx.workspace
+    timings = []
+    for _ in range(args.repeat):
+        with database_manager.get_read_connection() as conn:
+            begin = time.perf_counter()
+            occupancy_heatmap(
+                conn, workspace["start_ts"], workspace["end_ts"], workspace["names"]
+            )
+            timings.append(time.perf_counter() - begin)
+    return {
+        "days": args.days,
+        "best_ms": round(min(timings) * 1000, 3),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+    }
+
+
+def bench_sheet_sync(ctx, args):
+    course_schedule, reason = import_course_schedule()
+    if course_schedule is None:
+        return {"skipped": reason}
+    from fake_feishu import FakeSheetServer, SheetClient
+    from synthetic import generate_schedule, sheet_rows
+
+    token, sheet_id = "bench-sheet", "bench"
+    rows = sheet_rows(ctx.workspace["schedule"])
+    fake = FakeSheetServer(
+        {(token, sheet_id): rows},
+        latency=args.sheet_latency / 1000,
+        failure_rate=args.sheet_failure_rate,
+        seed=args.seed,
+    ).start()
+    try:
+        config = SimpleNamespace(
+            sheet_token=token,
+            sheet_id=sheet_id,
+            app_id="cli_bench",
+            app_secret="bench",
+            lark_host=fake.url,
+            chunk_rows=args.sheet_chunk_rows,
+            concurrency=args.sheet_concurrency,
+            retries=3,
+            backoff=0.05,
+        )
+        client = SheetClient(config.app_id, config.app_secret, fake.url)
+        manager = course_schedule.CourseManager(config, client)
+
+        result = {
+            "rows": len(rows),
+            "latency_ms": args.sheet_latency,
+            "chunk_rows": args.sheet_chunk_rows,
+            "concurrency": args.sheet_concurrency,
+        }
+        changed_rows = sheet_rows(
+            generate_schedule(ctx.workspace["names"], args.seed + 1)
+        )
+        for phase, sheet, force in [
+            ("full_compare", rows, True),
+            ("unchanged_skip", rows, False),
+            ("changed", changed_rows, False),
+            ("restore", rows, False),
+        ]:
+            fake.sheets[(token, sheet_id)] = sheet
+            begin = time.perf_counter()
+            ok = manager.refresh_course_data(force=force)
+            result[phase] = {
+                "ms": round((time.perf_counter() - begin) * 1000, 3),
+                "ok": ok,
+                **manager.last_stats,
+            }
+        result["requests"] = dict(fake.requests)
+    finally:
+        fake.stop()
+    return result
+
+
+def _make_service(ctx, router_urls):
+    import attendance
+
+    config = SimpleNamespace(
+        USER_MAC_LIST_PATH="userlist.json",
+        ROUTER_URL=router_urls[0],
+        ROUTER_PWD="bench",
+        ROUTER_URLS=router_urls,
+        ROUTER_PWDS=["bench"] * len(router_urls),
+        ROUTER_TIMEOUT=10,
+        POLL_INTERVAL=TICK_SECONDS,
+        POLL_MIN_INTERVAL=60,
+        POLL_MAX_INTERVAL=900,
+        POLL_NIGHT_HOURS=None,
+        MERGE_GAP_SECONDS=1800,
+        PRESENCE_LOG_PATH=os.path.join(ctx.workdir, "presence.log"),
+        LOG_SUMMARY_INTERVAL=900,
+    )
+    return attendance.AttendanceService(config)
+
+
+def bench_tick(ctx, args):
+    service = _make_service(ctx, ["127.0.0.1:9"])
+    names = ctx.workspace["names"]
+    rng = random.Random(args.seed)
+    online = set(rng.sample(names, len(names) // 2))
+
+    result = {"users": len(names), "ticks": args.ticks}
+    for phase in ["per_user", "batched"]:
+        timings, writes = [], 0
+        for _ in range(args.ticks):
+            current = simulate_online(names, rng, online, args.churn)
+            current_time = ctx.clock.tick()
+            begin = time.perf_counter()
+            if phase == "per_user":
+                for name in current:
+                    service._update_attendance_record(name, current_time)
+            else:
+                service._apply_tick(current, current_time)
+            timings.append(time.perf_counter() - begin)
+            writes += len(current)
+        if phase == "per_user":
+            # 逐用户写入不维护内存缓存，切换到批量写入前重新加载
+            service._rebuild_session_cache()
+        total = sum(timings)
+        result[phase] = {
+            **percentiles(timings),
+            "ticks_per_s": round(len(timings) / total, 2),
+            "users_per_s": round(writes / total),
+        }
+    service.router.executor.shutdown(wait=False)
+    return result
+
+
+def bench_end_to_end(ctx, args):
+    from fake_router import FakeRouter
+    from synthetic import user_mac, stranger_mac
+
+    users = len(ctx.workspace["names"])
+    macs = [user_mac(i) for i in range(users)]
+    macs += [stranger_mac(i) for i in range(max(0, args.devices - users))]
+    random.Random(args.seed).shuffle(macs)
+    # 设备按路由器均分（如多台 AP 各自覆盖一部分区域）
+    routers = [
+        FakeRouter(
+            macs[i :: args.routers],
+            churn=args.churn,
+            latency=args.router_latency / 1000,
+            jitter=args.router_latency / 1000,
+            seed=args.seed + i,
+        ).start()
+        for i in range(args.routers)
+    ]
+    try:
+        service = _make_service(ctx, [router.address for router in routers])
+        phases = {"poll": [], "match": [], "log": [], "apply": [], "total": []}
+        devices_seen, online_users = 0, 0
+        for _ in range(args.ticks):
+            current_time = ctx.clock.tick()
+            begin = time.perf_counter()
+            devices = service.router.get_online_devices()
+            polled = time.perf_counter()
+            roster = service.roster_watcher.get()
+            names = roster.match(devices)
+            matched = time.perf_counter()
+            service._log_presence(names, current_time, roster)
+            logged = time.perf_counter()
+            service._apply_tick(names, current_time)
+            applied = time.perf_counter()
+            for phase, elapsed in [
+                ("poll", polled - begin),
+                ("match", matched - polled),
+                ("log", logged - matched),
+                ("apply", applied - logged),
+                ("total", applied - begin),
+            ]:
+                phases[phase].append(elapsed)
+            devices_seen += len(devices)
+            online_users += len(names)
+        service.router.executor.shutdown(wait=False)
+        if service.presence_log is not None:
+            service.presence_log.close()
+    finally:
+        for router in routers:
+            router.stop()
+
+    return {
+        "routers": args.routers,
+        "devices": len(macs),
+        "users": users,
+        "ticks": args.ticks,
+        "mean_online_devices": round(devices_seen / args.ticks),
+        "mean_online_users": round(online_users / args.ticks),
+        "router_latency_ms": args.router_latency,
+        "presence_log_bytes": os.path.getsize(
+            os.path.join(ctx.workdir, "presence.log")
+        ),
+        **{phase: percentiles(timings) for phase, timings in phases.items()},
+    }
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "get_data": bench_get_data,
+    "serving": bench_serving,
+    "heatmap": bench_heatmap,
+    "sheet_sync": bench_sheet_sync,
+    "tick": bench_tick,
+    "end_to_end": bench_end_to_end,
+}
+
+
+# --------------------------
+# 与基线结果比较
+# --------------------------
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(baseline, results):
+    """:return: [(指标, 基线值, 当前值, 变化比例), ...]，只比较 *_ms 与 *_per_s 指标"""
+    old = dict(_flatten(baseline.get("results", {})))
+    rows = []
+    for key, value in _flatten(results):
+        if key in old and key.endswith(("_ms", "_per_s")) and old[key]:
+            rows.append((key, old[key], value, value / old[key] - 1))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="考勤系统基准测试")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument(
+        "--devices", type=int, default=3000, help="端到端测试的设备总数"
+    )
+    parser.add_argument("--routers", type=int, default=3)
+    parser.add_argument("--router-latency", type=float, default=20, help="毫秒")
+    parser.add_argument("--sheet-latency", type=float, default=50, help="毫秒")
+    parser.add_argument("--sheet-chunk-rows", type=int, default=100)
+    parser.add_argument("--sheet-concurrency", type=int, default=4)
+    parser.add_argument(
+        "--sheet-failure-rate", type=float, default=0, help="读取请求的失败比例"
+    )
+    parser.add_argument("--churn", type=float, default=0.05)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--get-data-dates", type=int, default=60)
+    parser.add_argument("--get-data-requests", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help=f"逗号分隔的测试名: {','.join(SUITES)}")
+    parser.add_argument("--workdir", help="数据目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline", help="与之比较的历史结果 JSON")
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else SUITES
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的测试: {', '.join(unknown)}")
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench-"))
+    os.makedirs(workdir, exist_ok=True)
+
+    # 各模块在导入时读取配置，需先指向基准数据目录
+    os.environ.update(
+        DATABASE_PATH=os.path.join(workdir, "database.db"),
+        USER_MAC_LIST_PATH="userlist.json",
+        ARCHIVE_DIR=os.path.join(workdir, "archive"),
+        LOG_DIR=os.path.join(workdir, "logs"),
+    )
+    os.chdir(workdir)
+    sys.path[:0] = [BENCH_DIR, REPO_DIR]
+
+    from Schema import parse_date
+    from synthetic import build_workspace
+
+    today = parse_date(datetime.now().strftime("%Y-%m-%d"))
+    begin = time.perf_counter()
+    workspace = build_workspace(workdir, args.users, args.days, today, args.seed)
+    ctx = SimpleNamespace(
+        workdir=workdir,
+        workspace=workspace,
+        clock=SimClock(
+            datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        ),
+    )
+    results = {
+        "setup": {
+            "users": args.users,
+            "days": args.days,
+            "sessions": workspace["sessions"],
+            "build_s": round(time.perf_counter() - begin, 3),
+        }
+    }
+
+    try:
+        for name in selected:
+            print(f"[{name}] ...", file=sys.stderr, flush=True)
+            results[name] = BENCHMARKS[name](ctx, args)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n与基线 {baseline['meta'].get('revision')} 比较:")
+        for key, old, new, change in compare(baseline, results):
+            print(f"  {key:<50} {old:>12} -> {new:<12} {change:+.1%}")
+
+
+if __name__ == "__main__":
+    main()
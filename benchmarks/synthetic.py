@@ -0,0 +1,204 @@
+"""
+基准测试用的合成数据：成员名册、在岗会话、整学期课表及对应的飞书表格内容
+
+生成结果只取决于参数与随机种子，同样的参数总是得到同样的数据，便于前后对比
+"""
+
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Database import DatabaseManager  # noqa: E402
+from Rollup import rebuild_rollup  # noqa: E402
+from Schema import (  # noqa: E402
+    init_schema,
+    bump_version,
+    write_meta,
+    ATTENDANCE_VERSION,
+    ATTENDANCE_MAX_SPAN,
+    SCHEDULE_VERSION,
+    SECONDS_PER_DAY,
+)
+
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+CLASSES_PER_DAY = 5
+SEMESTER_WEEKS = 18
+GROUPS = ["machine", "control", "vision", "operation"]
+
+# 表格中常见的周数写法（含全角逗号、波浪线等变体）
+WEEK_PATTERNS = [
+    "1-16",
+    "1-8",
+    "9-16",
+    "1-4,6-16",
+    "2-17",
+    "1，3，5，7，9，11，13，15",
+    "2~16",
+    "1-18",
+    "5-12、14",
+]
+
+
+def user_names(count):
+    return [f"user{i:04d}" for i in range(count)]
+
+
+def user_mac(index):
+    """成员设备 MAC（本地管理地址段，不与真实设备冲突）"""
+    return "02:00:" + ":".join(f"{b:02X}" for b in index.to_bytes(4, "big"))
+
+
+def stranger_mac(index):
+    """名册之外的设备 MAC"""
+    return "06:00:" + ":".join(f"{b:02X}" for b in index.to_bytes(4, "big"))
+
+
+def make_roster(count):
+    """:return: userlist.json 格式的成员列表，每人一台设备"""
+    return [
+        {
+            "name": name,
+            "group": GROUPS[i % len(GROUPS)],
+            "device_name": f"device{i:04d}",
+            "MAC": user_mac(i),
+        }
+        for i, name in enumerate(user_names(count))
+    ]
+
+
+def generate_sessions(names, start_ts, days, seed=0):
+    """每人每天 0~3 段在岗会话，集中在 8:00~23:00"""
+    rng = random.Random(seed)
+    rows = []
+    for day in range(days):
+        day_ts = start_ts + day * SECONDS_PER_DAY
+        for name in names:
+            cursor = day_ts + 8 * 3600 + rng.randrange(0, 4 * 3600)
+            for _ in range(rng.randrange(0, 4)):
+                length = rng.randrange(600, 4 * 3600)
+                if cursor + length > day_ts + 23 * 3600:
+                    break
+                rows.append((name, cursor, cursor + length))
+                cursor += length + rng.randrange(1800, 3 * 3600)
+    return rows
+
+
+def generate_schedule(names, seed=0, density=0.35):
+    """
+    整学期课表：工作日每节课以 density 的概率有课，周数取常见写法之一
+    :return: {name: {(day, class_index): 周数字符串}}，day 与 class_index 从 1 开始
+    """
+    rng = random.Random(seed)
+    return {
+        name: {
+            (day, class_index): rng.choice(WEEK_PATTERNS)
+            for day in range(1, 6)
+            for class_index in range(1, CLASSES_PER_DAY + 1)
+            if rng.random() < density
+        }
+        for name in names
+    }
+
+
+def parse_weeks(week_str):
+    """解析周数字符串（仅用于生成数据库内容，与 CourseManager.parse_week_ranges 写法一致）"""
+    ranges = []
+    for part in week_str.translate(str.maketrans("，、～~", ",,--")).split(","):
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            ranges.append((start, end))
+        elif part.strip():
+            ranges.append((int(part), int(part)))
+    return ranges
+
+
+def schedule_records(schedule):
+    """:return: class_schedule 表记录 [(name, day, class_index, week_start, week_end), ...]"""
+    return [
+        (name, day, class_index, week_start, week_end)
+        for name, classes in schedule.items()
+        for (day, class_index), week_str in sorted(classes.items())
+        for week_start, week_end in parse_weeks(week_str)
+    ]
+
+
+def sheet_rows(schedule):
+    """
+    按飞书课程表的版式生成表格内容：首行为表头（序号、姓名、周一~周日各占 5 列），
+    其后每人一行
+    """
+    header = ["序号", "姓名"]
+    for day in WEEKDAYS:
+        header += [day] + [""] * (CLASSES_PER_DAY - 1)
+    rows = [header]
+    for number, (name, classes) in enumerate(schedule.items(), 1):
+        row = [str(number), name] + [""] * (len(WEEKDAYS) * CLASSES_PER_DAY)
+        for (day, class_index), week_str in classes.items():
+            row[2 + (day - 1) * CLASSES_PER_DAY + class_index - 1] = week_str
+        rows.append(row)
+    return rows
+
+
+def build_database(path, sessions, schedule=None):
+    """
+    创建并填充基准数据库（含统计汇总、最长会话时长与数据版本号）
+    :param sessions: [(name, start_ts, end_ts), ...]
+    :param schedule: generate_schedule 的结果，None 表示不写入课表
+    """
+    db = DatabaseManager(path)
+    init_schema(db)
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            sessions,
+        )
+        if sessions:
+            write_meta(
+                cursor,
+                ATTENDANCE_MAX_SPAN,
+                max(end - start for _, start, end in sessions),
+            )
+        rebuild_rollup(cursor)
+        bump_version(cursor, ATTENDANCE_VERSION)
+        if schedule:
+            cursor.executemany(
+                """
+                INSERT INTO class_schedule
+                (name, day, class_index, week_range_start, week_range_end)
+                VALUES (?, ?, ?, ?, ?)""",
+                schedule_records(schedule),
+            )
+            bump_version(cursor, SCHEDULE_VERSION)
+    return db
+
+
+def build_workspace(directory, users, days, end_ts, seed=0):
+    """
+    在 directory 下生成 userlist.json 与 database.db
+    :param end_ts: 会话数据截止日期（不含）的零点时间戳
+    :return: {"names", "roster", "schedule", "sessions", "start_ts", "end_ts", "db_path"}
+    """
+    os.makedirs(directory, exist_ok=True)
+    roster = make_roster(users)
+    names = [user["name"] for user in roster]
+    with open(os.path.join(directory, "userlist.json"), "w", encoding="utf-8") as f:
+        json.dump(roster, f, ensure_ascii=False)
+
+    start_ts = end_ts - days * SECONDS_PER_DAY
+    sessions = generate_sessions(names, start_ts, days, seed)
+    schedule = generate_schedule(names, seed)
+    db_path = os.path.join(directory, "database.db")
+    build_database(db_path, sessions, schedule).close()
+    return {
+        "names": names,
+        "roster": roster,
+        "schedule": schedule,
+        "sessions": len(sessions),
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "db_path": db_path,
+    }
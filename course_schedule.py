@@ -1,16 +1,41 @@
-import sqlite3
 import logging
+import hashlib
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Tuple, Generator
+from typing import Iterator, List, Tuple, Generator
 import os
 from dotenv import load_dotenv
 from logging.handlers import TimedRotatingFileHandler
 from api.feishu.api_servers import APIContainer  # 假设飞书API封装
+from Events import publish_events, SCHEDULE_REFRESHED
 from Logger import setup_logger
+from Metrics import publish_metrics, registry
 from Database import database_manager
+from Schema import (
+    init_schema,
+    to_timestamp,
+    bump_version,
+    read_meta,
+    write_meta,
+    SCHEDULE_VERSION,
+    SCHEDULE_SHEET_HASH,
+)
 
 logger = setup_logger("course_manager")
 
+SHEET_FETCH_SECONDS = registry.histogram(
+    "sheet_fetch_seconds", "读取飞书课程表的耗时（秒）"
+)
+SHEET_PARSE_SECONDS = registry.histogram(
+    "sheet_parse_seconds", "解析课程表内容的耗时（秒）"
+)
+SHEET_SYNC = registry.counter(
+    "sheet_sync_total", "课程表同步次数，按结果区分: updated / skipped / failed"
+)
+
 
 class CourseConfig:
     """课程表配置管理"""
@@ -22,6 +47,11 @@ class CourseConfig:
         self.app_id = os.getenv("APP_ID")
         self.app_secret = os.getenv("APP_SECRET")
         self.lark_host = os.getenv("LARK_HOST")
+        # 分块读取：每块行数、并发请求数、失败重试次数与退避基数（秒）
+        self.chunk_rows = int(os.getenv("COURSE_SHEET_CHUNK_ROWS", "200"))
+        self.concurrency = int(os.getenv("COURSE_SHEET_CONCURRENCY", "4"))
+        self.retries = int(os.getenv("COURSE_SHEET_RETRIES", "3"))
+        self.backoff = float(os.getenv("COURSE_SHEET_BACKOFF", "0.5"))
 
         # 验证必要配置
         if not all([self.sheet_token, self.sheet_id, self.app_id, self.app_secret]):
@@ -34,6 +64,7 @@ class CourseManager:
     WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
     USERNAME_COLUMN = "姓名"
     CLASSES_PER_DAY = 5
+    LAST_COLUMN = "AZ"  # 读取范围的最后一列
 
     def __init__(self, config: CourseConfig, fs_api: APIContainer):
         """
@@ -45,27 +76,12 @@ class CourseManager:
         self.fs_api = fs_api
         self.logger = logger
         self.db = database_manager
+        self.last_stats = {}  # 最近一次同步的统计 {added, removed, unchanged, skipped}
         self._init_database()
 
     def _init_database(self):
-        """初始化数据库结构"""
-        with self.db.get_connection() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS class_schedule (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    day INT NOT NULL CHECK(day BETWEEN 1 AND 7),
-                    class_index INT NOT NULL CHECK(class_index BETWEEN 1 AND 5),
-                    week_range_start INT NOT NULL,
-                    week_range_end INT NOT NULL,
-                    UNIQUE(name, day, class_index, week_range_start)
-                )
-            """
-            )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_schedule ON class_schedule (name, day)"
-            )
+        """初始化数据库结构（升级到最新版本）"""
+        init_schema(self.db)
 
     @staticmethod
     def parse_week_ranges(week_str: str) -> List[Tuple[int, int]]:
@@ -96,43 +112,39 @@ class CourseManager:
 
         return sorted(ranges, key=lambda x: x[0])
 
-    def _fetch_index(self, rows: List[str]) -> Tuple[int, List[int]]:
+    def _fetch_index(self, rows: List[List]) -> Tuple[int, int, List[int]]:
         """
-        获取关键索引
-        :return: (姓名列索引, 星期列索引列表)
+        单次扫描定位表头（姓名列与星期列可以位于不同的表头行）
+        :return: (首个数据行的下标, 姓名列索引, 星期列索引列表)
         """
-        name_col = None
-        day_cols = []
-        # 查找姓名列
-        for row in rows:
-            try:
-                name_col = row.index(self.USERNAME_COLUMN)
-            except ValueError as e:
-                continue
-        # 查找星期列
-        for row in rows:
-            try:
-                day_cols = (
-                    [row.index(day) for day in self.WEEKDAYS if day in row]
-                    if row.index(self.WEEKDAYS[0])
-                    else day_cols
-                )
-            except ValueError:
-                continue
-        if not name_col or not day_cols:
-            self.logger.error("表解析失败: %s", str(e))
-            raise RuntimeError("无法定位必要列") from e
-        return name_col, day_cols
+        name_row = day_row = None
+        name_col, day_cols = None, []
+        for row_index, row in enumerate(rows):
+            if name_row is None and self.USERNAME_COLUMN in row:
+                name_row, name_col = row_index, row.index(self.USERNAME_COLUMN)
+            if day_row is None and self.WEEKDAYS[0] in row:
+                day_row = row_index
+                day_cols = [row.index(day) for day in self.WEEKDAYS if day in row]
+            if name_row is not None and day_row is not None:
+                return max(name_row, day_row) + 1, name_col, day_cols
+        self.logger.error(
+            "表解析失败: 未找到%s",
+            "姓名列" if name_row is None else "星期列",
+        )
+        raise RuntimeError("无法定位必要列")
 
     def _process_data_row(
-        self, data: List[str], name_col: int, day_cols: List[int]
+        self, data: List[List], name_col: int, day_cols: List[int], first_row: int = 1
     ) -> Generator:
         """
-        逐行处理数据并生成课程记录
+        逐行处理数据并生成课程记录（姓名为空的行跳过）
+        :param first_row: data[0] 在表格中的行号，用于日志定位
         :yield: (name, day, class_index, week_start, week_end)
         """
-        for row in data:
-            name = row[name_col]
+        for row_number, row in enumerate(data, first_row):
+            name = row[name_col] if name_col < len(row) else None
+            if not name:
+                continue
 
             for day_idx, col in enumerate(day_cols):
                 for class_num in range(self.CLASSES_PER_DAY):
@@ -157,62 +169,242 @@ class CourseManager:
                     except ValueError as e:
                         self.logger.warning(
                             "跳过无效周数数据: 行%d 列%d - %s",
-                            data.index(row) + 1,
+                            row_number,
                             cell_idx + 1,
                             str(e),
                         )
 
-    def refresh_course_data(self) -> bool:
-        """从飞书表格刷新课程数据"""
-        try:
-            # 获取表格数据
-            resp = self.fs_api.spreadsheet.reading_a_single_range(
-                self.config.sheet_token, self.config.sheet_id, "A1:AZ"
+    # --------------------------
+    # 分块读取（按行窗口并发请求，失败按指数退避重试，按顺序逐块产出）
+    # --------------------------
+    def _read_range(self, cell_range: str) -> List[List]:
+        """读取单个范围，接口报错或请求异常时重试"""
+        retries = self.config.retries
+        backoff = self.config.backoff
+        for attempt in range(retries + 1):
+            try:
+                resp = self.fs_api.spreadsheet.reading_a_single_range(
+                    self.config.sheet_token, self.config.sheet_id, cell_range
+                )
+                if resp.get("code", 0) != 0:
+                    raise RuntimeError(
+                        f"接口返回错误 {resp.get('code')}: {resp.get('msg')}"
+                    )
+                return resp.get("data", {}).get("valueRange", {}).get("values") or []
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2**attempt * (1 + random.random())
+                self.logger.warning(
+                    "读取表格范围 %s 失败（第%d次）: %s，%.1fs 后重试",
+                    cell_range,
+                    attempt + 1,
+                    str(e),
+                    delay,
+                )
+                time.sleep(delay)
+
+    def _iter_chunks(self, executor, stats) -> Iterator[Tuple[int, List[List]]]:
+        """
+        首块单独请求（含表头，小表格一次即可读完），之后预先提交后续窗口的请求
+        （不超过并发数），读到不满一块或全空的块时结束
+        :param stats: 累计等待网络的耗时 {"fetch_seconds"}
+        :yield: (该块首行的行号, 行列表)
+        """
+        size = self.config.chunk_rows
+        concurrency = self.config.concurrency
+        pending = {}
+        submitted = 0
+
+        def submit():
+            nonlocal submitted
+            first = submitted * size + 1
+            pending[submitted] = executor.submit(
+                self._read_range, f"A{first}:{self.LAST_COLUMN}{first + size - 1}"
             )
-            data = resp.get("data", {}).get("valueRange", {}).get("values", [])
+            submitted += 1
+
+        try:
+            index = 0
+            while True:
+                while len(pending) < (concurrency if index else 1):
+                    submit()
+                wait_start = time.perf_counter()
+                rows = pending.pop(index).result()
+                stats["fetch_seconds"] += time.perf_counter() - wait_start
+                yield index * size + 1, rows
+                if len(rows) < size or not any(any(row) for row in rows if row):
+                    return
+                index += 1
+        finally:
+            for future in pending.values():
+                future.cancel()
 
-            if not data:
-                self.logger.warning("未获取到表格数据")
-                return False
+    def _stage_records(self, cursor, records) -> int:
+        """
+        写入暂存表，按唯一键 (name, day, class_index, week_start) 去重（先出现者优先）
+        :return: 写入的记录数
+        """
+        staged = 0
+        for record in records:
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO temp.schedule_staging
+                (name, day, class_index, week_range_start, week_range_end)
+                VALUES (?, ?, ?, ?, ?)""",
+                record,
+            )
+            if cursor.rowcount:
+                staged += 1
+            else:
+                self.logger.warning("跳过重复记录: %s", str(record))
+        return staged
 
-            # 处理获取索引值
-            name_col, day_cols = self._fetch_index(data)
+    def _diff_staging(self, cursor) -> Tuple[int, int, int]:
+        """
+        暂存表与 class_schedule 比对，只写入差异
+        :return: (新增, 删除, 未变化)
+        """
+        current = cursor.execute("SELECT COUNT(*) FROM class_schedule").fetchone()[0]
+        # 先删除（周数结束值变化的记录唯一键不变，需先删后插）
+        removed = cursor.execute(
+            """
+            DELETE FROM class_schedule
+            WHERE NOT EXISTS (
+                SELECT 1 FROM temp.schedule_staging s
+                WHERE s.name = class_schedule.name
+                  AND s.day = class_schedule.day
+                  AND s.class_index = class_schedule.class_index
+                  AND s.week_range_start = class_schedule.week_range_start
+                  AND s.week_range_end = class_schedule.week_range_end
+            )"""
+        ).rowcount
+        added = cursor.execute(
+            """
+            INSERT INTO class_schedule
+            (name, day, class_index, week_range_start, week_range_end)
+            SELECT name, day, class_index, week_range_start, week_range_end
+            FROM temp.schedule_staging s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM class_schedule c
+                WHERE c.name = s.name
+                  AND c.day = s.day
+                  AND c.class_index = s.class_index
+                  AND c.week_range_start = s.week_range_start
+            )
+            ORDER BY name, day, class_index, week_range_start"""
+        ).rowcount
+        return added, removed, current - removed
 
-            # 事务处理
-            with self.db.get_connection() as conn:
+    def refresh_course_data(self, force: bool = False) -> bool:
+        """
+        从飞书表格刷新课程数据：按行窗口分块并发读取，各块到达后依次解析并写入暂存表，
+        读取完毕后与现有数据比对，只写入差异（表格未变化时跳过）
+        :param force: 忽略表格摘要，强制重新比对
+        """
+        self.last_stats = {"added": 0, "removed": 0, "unchanged": 0, "skipped": False}
+        stats = {"fetch_seconds": 0.0}
+        parse_seconds = 0.0
+        try:
+            digest = hashlib.sha256()
+            header = None
+            rows_read = 0
+            with self.db.get_connection() as conn, ThreadPoolExecutor(
+                max_workers=self.config.concurrency,
+                thread_name_prefix="sheet",
+            ) as executor:
                 cursor = conn.cursor()
-
-                # 清空旧数据
-                cursor.execute("DELETE FROM class_schedule")
                 cursor.execute(
-                    "UPDATE SQLITE_SEQUENCE SET SEQ=0 WHERE NAME='class_schedule'"
+                    """
+                    CREATE TEMP TABLE IF NOT EXISTS schedule_staging (
+                        name TEXT NOT NULL,
+                        day INT NOT NULL,
+                        class_index INT NOT NULL,
+                        week_range_start INT NOT NULL,
+                        week_range_end INT NOT NULL,
+                        PRIMARY KEY (name, day, class_index, week_range_start)
+                    )"""
                 )
+                try:
+                    cursor.execute("DELETE FROM temp.schedule_staging")
+                    for first_row, rows in self._iter_chunks(executor, stats):
+                        if not rows:
+                            break
+                        parse_start = time.perf_counter()
+                        digest.update(
+                            json.dumps(rows, ensure_ascii=False).encode("utf-8")
+                        )
+                        rows_read += len(rows)
+                        if header is None:
+                            # 表头位于第一块内
+                            header = self._fetch_index(rows)
+                            rows = rows[header[0] :]
+                            first_row += header[0]
+                        records = self._process_data_row(
+                            rows, header[1], header[2], first_row
+                        )
+                        self._stage_records(cursor, records)
+                        parse_seconds += time.perf_counter() - parse_start
+                    # 暂存表只在本连接可见，先提交，比对与写入另起一个短事务
+                    conn.commit()
 
-                # 插入新数据
-                valid_records = 0
-                for record in self._process_data_row(data, name_col, day_cols):
-                    try:
-                        cursor.execute(
-                            """
-                            INSERT INTO class_schedule 
-                            (name, day, class_index, week_range_start, week_range_end)
-                            VALUES (?, ?, ?, ?, ?)
-                        """,
-                            record,
+                    if not rows_read:
+                        self.logger.warning("未获取到表格数据")
+                        SHEET_SYNC.inc(result="failed")
+                        return False
+
+                    sheet_hash = digest.hexdigest()
+                    if not force and read_meta(conn, SCHEDULE_SHEET_HASH) == sheet_hash:
+                        self.last_stats.update(
+                            skipped=True,
+                            unchanged=conn.execute(
+                                "SELECT COUNT(*) FROM class_schedule"
+                            ).fetchone()[0],
                         )
-                        valid_records += 1
-                    except sqlite3.IntegrityError as e:
-                        self.logger.warning(
-                            "跳过重复记录: %s - %s", str(record), str(e)
+                        self.logger.info(
+                            "课程表未变化，跳过更新（%d条）",
+                            self.last_stats["unchanged"],
                         )
+                        SHEET_SYNC.inc(result="skipped")
+                        return True
 
-                conn.commit()
-                self.logger.info("成功更新%d条课程记录", valid_records)
-                return True
+                    added, removed, unchanged = self._diff_staging(cursor)
+                    if added or removed:
+                        bump_version(cursor, SCHEDULE_VERSION)
+                        publish_events(
+                            cursor,
+                            [
+                                (
+                                    SCHEDULE_REFRESHED,
+                                    {"added": added, "removed": removed},
+                                )
+                            ],
+                            to_timestamp(datetime.now()),
+                        )
+                    write_meta(cursor, SCHEDULE_SHEET_HASH, sheet_hash)
+                    conn.commit()
+                finally:
+                    conn.rollback()
+                    cursor.execute("DROP TABLE IF EXISTS temp.schedule_staging")
+
+            self.last_stats.update(added=added, removed=removed, unchanged=unchanged)
+            self.logger.info(
+                "课程表同步完成: 读取%d行 新增%d条 删除%d条 未变化%d条",
+                rows_read,
+                added,
+                removed,
+                unchanged,
+            )
+            SHEET_SYNC.inc(result="updated")
+            return True
 
         except Exception as e:
+            SHEET_SYNC.inc(result="failed")
             self.logger.error("课程数据更新失败: %s", str(e), exc_info=True)
             return False
+        finally:
+            SHEET_FETCH_SECONDS.observe(stats["fetch_seconds"])
+            SHEET_PARSE_SECONDS.observe(parse_seconds)
 
 
 # 使用示例
@@ -229,6 +421,8 @@ if __name__ == "__main__":
             logger.info("课程表更新成功")
         else:
             logger.error("课程表更新失败")
+        with database_manager.get_connection() as conn:
+            publish_metrics(conn.cursor(), "course_schedule")
 
     except Exception as e:
         logger.critical("服务启动失败: %s", str(e))
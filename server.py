@@ -1,14 +1,55 @@
 import json
+import os
 import signal
 import sys
+from collections import Counter
+from itertools import chain
 from datetime import datetime
-from flask import Flask, jsonify, request, send_file
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    request,
+    send_file,
+    stream_with_context,
+)
 
+from Archive import overlapping_sessions
 from Component import Component
 from Logger import setup_logger
 from Database import database_manager
+from Events import EventBroadcaster
+from HttpCache import CachedResponse, ResponseCache
+from Jobs import SingleFlightJob
+from Metrics import read_published, registry, render_prometheus
+from Overlap import overlap_report
+from Roster import RosterWatcher
+from Rollup import query_stats
+from ScheduleIndex import (
+    ScheduleIndexHolder,
+    get_weekday_and_week,
+    CLASS_TIME_MAP,
+)
+from Schema import (
+    init_schema,
+    parse_date,
+    to_timestamp,
+    from_timestamp,
+    read_versions,
+    clip_to_day,
+    SECONDS_PER_DAY,
+    ATTENDANCE_VERSION,
+    HISTORY_EPOCH,
+    SCHEDULE_VERSION,
+)
+
+try:
+    from Analytics import occupancy_heatmap
+except ImportError:  # numpy 未安装时占用热力图接口不可用
+    occupancy_heatmap = None
 
 logger = setup_logger("server")
+init_schema(database_manager)
 
 app = Flask(__name__)
 
@@ -24,141 +65,526 @@ WEEK_REFER = [
 ]  # 表格内各日期的表示方式，从周一开始
 USERNAME_REFER = "姓名"  # 表格内姓名列的标题
 CLASS_NUM_PER_DAY = 5  # 每日上课节数
-FIRST_WEEK_DAY = datetime(2025, 2, 24)
-
-# init username_list
-username_list = []
-with open(USERLIST_PATH, "r", encoding="utf-8") as f:
-    userlist = json.load(f)
-    username_list = [user["name"] for user in userlist]
-
-
-def get_onwork_time(date_str):
-    with database_manager.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT 
-                name,
-                start_time,
-                end_time,
-                (strftime('%s', end_time) - strftime('%s', start_time)) / 3600 AS duration_hours
-            FROM attendance
-            WHERE DATE(start_time) = ?
-            """,
-            (date_str,),
-        )
-    rows = cursor.fetchall()
-    result = [{"name": username, "date": {}} for username in username_list]
-    for row in rows:
-        (
-            name,
-            start_time,
-            end_time,
-            duration_hours,
-        ) = row
-        info = next((info for info in result if info["name"] == name), None)
+
+MAX_RANGE_DAYS = 400  # 范围查询允许的最大天数
+
+ATTENDANCE_MERGE_GAP = int(os.getenv("MERGE_GAP_SECONDS", "1800"))  # 与考勤服务一致
+PAST_DAY_MAX_AGE = int(os.getenv("PAST_DAY_MAX_AGE", str(7 * 86400)))  # 秒
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+EVENT_HEARTBEAT = 15  # 事件流无数据时发送心跳的间隔（秒）
+
+# init roster（userlist.json 修改后自动重新加载）
+roster_watcher = RosterWatcher(USERLIST_PATH, logger)
+response_cache = ResponseCache(HTTP_CACHE_MAX_BYTES)
+schedule_index = ScheduleIndexHolder(database_manager)
+event_broadcaster = EventBroadcaster(database_manager, logger=logger)
+
+METRICS_PROCESS = "server"
+GET_DATA_SECONDS = registry.histogram(
+    "get_data_seconds", "/get_data 耗时（秒），按阶段区分: total / query / serialize"
+)
+GET_DATA_REQUESTS = registry.counter(
+    "get_data_requests_total", "/get_data 请求数，按响应缓存是否命中区分"
+)
+
+
+def get_class_relative_hour(class_index):
+    return {
+        "start": CLASS_TIME_MAP[class_index][0],
+        "end": CLASS_TIME_MAP[class_index][1],
+    }
+
+
+def get_onwork_time(date_str, result, unknown):
+    """将当天的在岗时段填入 result，名册外的姓名计入 unknown"""
+    day_ts = parse_date(date_str)
+    day = from_timestamp(day_ts).strftime("%Y-%m-%d")
+    params = {"range_start": day_ts, "range_end": day_ts + SECONDS_PER_DAY}
+    rows = []
+    with database_manager.get_read_connection() as conn:
+        # 按整数时间戳做索引范围扫描（含所需的归档文件），跨天会话截取到当天，
+        # 小时数直接在 SQL 中计算
+        for sessions in overlapping_sessions(
+            conn, day_ts, params["range_end"], "id, name, start_time, end_time"
+        ):
+            rows += conn.execute(
+                f"""
+                SELECT
+                    id,
+                    name,
+                    (MAX(start_time, :range_start) - :range_start) / 3600.0,
+                    (MIN(end_time, :range_end - 1) - :range_start) / 3600.0
+                FROM ({sessions})
+                """,
+                params,
+            ).fetchall()
+    for record_id, name, start_hour, end_hour in rows:
+        info = result.get(name)
         if not info:
+            unknown[name] += 1
             continue
-        day = "20" + datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S").strftime(
-            "%y-%m-%d"
+        # id 供页面按事件流增量更新对应色块
+        info["date"].setdefault(day, []).append(
+            {"id": record_id, "start": start_hour, "end": end_hour}
         )
-        if not info["date"].get(day):
-            info["date"][day] = []
+    return result
 
-        def get_relative_hour(dt_str):
-            dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-            return dt.hour + dt.minute / 60 + dt.second / 3600  # 计算小时的小数表示
 
-        info["date"][day].append(
-            {"start": get_relative_hour(start_time), "end": get_relative_hour(end_time)}
+def get_onclass_time(date_str, result, unknown, index):
+    """将当天的上课时段填入 result（基于课表位图索引），名册外的姓名计入 unknown"""
+    date = datetime.strptime(date_str, "%Y-%m-%d")
+    week, day = get_weekday_and_week(date)
+    for name, class_indexes in index.classes_on_day(week, day):
+        info = result.get(name)
+        if not info:
+            unknown[name] += len(class_indexes)
+            continue
+        info["onclass_date"].extend(
+            get_class_relative_hour(class_index) for class_index in class_indexes
         )
     return result
 
 
-def get_onclass_time(date_str):
-    def get_weekday_and_week(date):
-        delta_days = (date - FIRST_WEEK_DAY).days  # 计算起始日期到今天的天数
-        week_number = delta_days // 7 + 1  # 计算是第几周（第 1 周从 start_date 开始）
-        weekday = (
-            date.weekday() + 1
-        )  # `weekday()` 返回 0-6 (周一=0, 周日=6)，调整为 1-7
-        return week_number, weekday
-
-    def get_class_relative_hour(class_index):
-        class_time_map = {
-            1: (8.0, 10.41),  # 8:00 - 10:25
-            2: (10.66, 12.25),  # 10:40 - 12:15
-            3: (14.0, 15.41),  # 14:00 - 15:25
-            4: (15.66, 18.25),  # 15:40 - 18:15
-            5: (19.0, 21.0),  # 19:00 - 21:00
-        }
-        return {
-            "start": class_time_map[class_index][0],
-            "end": class_time_map[class_index][1],
-        }
-
-    with database_manager.get_connection() as conn:
-        cursor = conn.cursor()
-        date = datetime.strptime(date_str, "%Y-%m-%d")
-        week, day = get_weekday_and_week(date)
-        cursor.execute(
-            """SELECT 
-            name,
-            class_index
-            FROM class_schedule
-                    WHERE ? BETWEEN week_range_start AND week_range_end AND day = ?
-            """,
-            (week, day),
+def build_day_response(date_str, day_ts, etag, index):
+    """查询并序列化某一天的数据，生成可缓存的响应"""
+    # 两类数据填入同一份按姓名索引的结果
+    with GET_DATA_SECONDS.time(phase="query"):
+        result = roster_watcher.get().new_result()
+        unknown = Counter()
+        get_onwork_time(date_str, result, unknown)
+        get_onclass_time(date_str, result, unknown, index)
+    if unknown:
+        logger.warning(
+            f"{date_str} 存在名册外的用户记录: "
+            + ", ".join(f"{name}({count})" for name, count in unknown.items())
         )
-        rows = [
-            {
-                "name": name,
-                "class_index": class_index,
-            }
-            for name, class_index in cursor.fetchall()
-        ]
-        result = [{"name": username, "onclass_date": []} for username in username_list]
-        for row in rows:
-            info = next((info for info in result if info["name"] == row["name"]), None)
-            if not info:
-                continue
-            info["onclass_date"].append(get_class_relative_hour(row["class_index"]))
 
-        return result
+    # 考勤合并间隔过后当天数据不再变化，可长期缓存；当天数据每次都需协商
+    closed = day_ts + SECONDS_PER_DAY + ATTENDANCE_MERGE_GAP <= to_timestamp(
+        datetime.now()
+    )
+    headers = {
+        "Content-Type": "application/json",
+        "Cache-Control": (
+            f"public, max-age={PAST_DAY_MAX_AGE}" if closed else "no-cache"
+        ),
+        "X-Unknown-Users": str(sum(unknown.values())),
+    }
+    with GET_DATA_SECONDS.time(phase="serialize"):
+        body = app.json.dumps(list(result.values())).encode("utf-8")
+        return CachedResponse(etag, body, headers)
+
+
+def read_data_versions():
+    """读取当前的数据版本号 {key: version}"""
+    with database_manager.get_read_connection() as conn:
+        return read_versions(conn)
+
+
+def get_day_etag(day_ts, versions):
+    """
+    生成某一天数据的 ETag：日期 + 数据版本号 + 名册版本（同时作为服务端缓存的键）
+    已结束的日期不受后续考勤写入影响，只跟随历史数据版本号（日志回放等改写历史时递增）
+    """
+    closed = day_ts + SECONDS_PER_DAY + ATTENDANCE_MERGE_GAP <= to_timestamp(
+        datetime.now()
+    )
+    attendance_version = (
+        f"c{versions.get(HISTORY_EPOCH, 0)}"
+        if closed
+        else versions.get(ATTENDANCE_VERSION, 0)
+    )
+    return (
+        f"{from_timestamp(day_ts):%Y%m%d}.{attendance_version}"
+        f".{versions.get(SCHEDULE_VERSION, 0)}.{roster_watcher.get().version}"
+    )
 
 
 @app.route("/get_data")
 def get_data():
     date_str = request.args.get("date", "")  # 获取日期参数
+    try:
+        day_ts = parse_date(date_str)
+    except ValueError:
+        return jsonify({"error": "date 需为 YYYY-MM-DD 格式"}), 400
 
-    onwork_time = get_onwork_time(date_str)
-    onclass_time = get_onclass_time(date_str)
-
-    # 合并结果
-    merged_dict = {}
-    for item in onwork_time:
-        merged_dict[item["name"]] = {"name": item["name"], "date": item["date"]}
-    for item in onclass_time:
-        if item["name"] in merged_dict:
-            merged_dict[item["name"]]["onclass_date"] = item["onclass_date"]
-        else:
-            merged_dict[item["name"]] = {
-                "name": item["name"],
-                "onclass_date": item["onclass_date"],
-            }
-    # 转换回列表
-    merged_list = list(merged_dict.values())
+    with GET_DATA_SECONDS.time(phase="total"):
+        versions = read_data_versions()
+        etag = get_day_etag(day_ts, versions)
+        entry = response_cache.get(etag)
+        GET_DATA_REQUESTS.inc(cache="miss" if entry is None else "hit")
+        if entry is None:
+            index = schedule_index.get(versions.get(SCHEDULE_VERSION))
+            entry = response_cache.put(
+                build_day_response(date_str, day_ts, etag, index)
+            )
 
-    response = jsonify(merged_list)
+        status, headers, body = entry.negotiate(
+            request.headers.get("If-None-Match"),
+            request.headers.get("Accept-Encoding"),
+        )
+        response = Response(body, status=status, headers=headers)
     response.headers.add("Access-Control-Allow-Origin", "*")
     return response  # 以 JSON 格式返回数据
 
 
+def parse_date_range(max_days=MAX_RANGE_DAYS):
+    """
+    解析 start/end 参数（YYYY-MM-DD，含两端）
+    :param max_days: 允许的最大天数，None 表示不限
+    :return: ((start_ts, end_ts), None)，参数无效时为 (None, 400 响应)
+    """
+    try:
+        start_ts = parse_date(request.args.get("start", ""))
+        end_ts = parse_date(request.args.get("end", "")) + SECONDS_PER_DAY
+    except ValueError:
+        return None, (jsonify({"error": "start/end 需为 YYYY-MM-DD 格式"}), 400)
+    if end_ts <= start_ts:
+        return None, (jsonify({"error": "结束日期不能早于起始日期"}), 400)
+    if max_days is not None and (end_ts - start_ts) // SECONDS_PER_DAY > max_days:
+        return None, (jsonify({"error": f"查询范围不能超过 {max_days} 天"}), 400)
+    return (start_ts, end_ts), None
+
+
+def iter_range_records(start_ts, end_ts, names, unknown, index, roster):
+    """
+    逐日生成 [start_ts, end_ts) 内各用户的在岗/上课记录（生成器，供流式输出）
+    考勤表只执行一次索引范围查询，按开始时间顺序边读边分日，跨天会话拆分到各天；
+    上课时段取自课表位图索引
+    :yield: 与 /get_data 单项结构相同的字典，另含 "day" 字段；无数据的用户不输出
+    """
+    wanted = set(names)
+    params = {"range_start": start_ts, "range_end": end_ts}
+    with database_manager.get_read_connection() as conn:
+        # 逐批（归档文件在前、主库在后）按开始时间读取，拼接后整体有序
+        rows = chain.from_iterable(
+            conn.execute(f"SELECT * FROM ({sessions}) ORDER BY start_time", params)
+            for sessions in overlapping_sessions(
+                conn, start_ts, end_ts, "id, name, start_time, end_time"
+            )
+        )
+        pending = next(rows, None)
+        ongoing = []  # 延续到之后几天的会话
+        for day_ts in range(start_ts, end_ts, SECONDS_PER_DAY):
+            day = from_timestamp(day_ts).strftime("%Y-%m-%d")
+            next_day_ts = day_ts + SECONDS_PER_DAY
+            records = {}
+
+            sessions = ongoing
+            while pending and pending[2] < next_day_ts:
+                record_id, name, start_time, end_time = pending
+                pending = next(rows, None)
+                if name not in wanted:
+                    if name not in roster:
+                        unknown[name] += 1
+                    continue
+                sessions.append((record_id, name, start_time, end_time))
+
+            ongoing = []
+            for record_id, name, start_time, end_time in sessions:
+                if end_time >= next_day_ts:
+                    ongoing.append((record_id, name, start_time, end_time))
+                if end_time < day_ts:
+                    continue
+                start_hour, end_hour = clip_to_day(start_time, end_time, day_ts)
+                record = records.setdefault(
+                    name,
+                    {"day": day, "name": name, "date": {day: []}, "onclass_date": []},
+                )
+                # id 与 /get_data 及事件流一致，供客户端去重
+                record["date"].setdefault(day, []).append(
+                    {"id": record_id, "start": start_hour, "end": end_hour}
+                )
+
+            week, weekday = get_weekday_and_week(from_timestamp(day_ts))
+            for name in names:
+                class_indexes = index.classes_of(name, week, weekday)
+                if class_indexes:
+                    record = records.setdefault(
+                        name, {"day": day, "name": name, "date": {}, "onclass_date": []}
+                    )
+                    record["onclass_date"].extend(
+                        get_class_relative_hour(class_index)
+                        for class_index in class_indexes
+                    )
+
+            yield from records.values()
+
+
+@app.route("/get_range")
+def get_range():
+    """
+    多日范围查询，以 JSON Lines 分块流式返回
+    参数: start/end (YYYY-MM-DD，含两端)，users (逗号分隔，可选)，group (可选)
+    """
+    date_range, error = parse_date_range()
+    if error:
+        return error
+    start_ts, end_ts = date_range
+    days = (end_ts - start_ts) // SECONDS_PER_DAY
+
+    users = request.args.get("users")
+    roster = roster_watcher.get()
+    names = roster.select(
+        [name.strip() for name in users.split(",")] if users else None,
+        request.args.get("group") or None,
+    )
+
+    index = schedule_index.get(read_data_versions().get(SCHEDULE_VERSION))
+
+    def generate():
+        unknown = Counter()
+        count = 0
+        for record in iter_range_records(
+            start_ts, end_ts, names, unknown, index, roster
+        ):
+            count += 1
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        if unknown:
+            logger.warning(
+                "范围查询存在名册外的用户记录: "
+                + ", ".join(f"{name}({n})" for name, n in unknown.items())
+            )
+        # 末行为汇总信息
+        yield json.dumps(
+            {
+                "summary": {
+                    "days": days,
+                    "records": count,
+                    "unknown_users": sum(unknown.values()),
+                }
+            }
+        ) + "\n"
+
+    response = Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+
+@app.route("/stats")
+def stats():
+    """
+    统计接口：日期范围内的个人排行与分组汇总（直接读取 daily_rollup）
+    参数: start/end (YYYY-MM-DD，含两端)，group (可选)，limit (排行条数，可选)
+    """
+    date_range, error = parse_date_range(max_days=None)  # 汇总表查询，不限范围
+    if error:
+        return error
+    start_ts, end_ts = date_range
+    try:
+        limit = int(request.args.get("limit", 0))
+    except ValueError:
+        return jsonify({"error": "limit 需为非负整数"}), 400
+    if limit < 0:
+        return jsonify({"error": "limit 需为非负整数"}), 400
+    limit = limit or None  # 0 表示不限
+
+    roster = roster_watcher.get()
+    group = request.args.get("group") or None
+    names = set(roster.select(group=group)) if group else None
+    with database_manager.get_read_connection() as conn:
+        user_stats = query_stats(conn, start_ts, end_ts, names)
+
+    leaderboard = sorted(
+        (
+            {
+                "name": name,
+                "group": roster.by_name.get(name, {}).get("group"),
+                "hours": round(item["seconds"] / 3600, 2),
+                "days": item["days"],
+                "sessions": item["sessions"],
+                "longest_streak": item["longest_streak"],
+            }
+            for name, item in user_stats.items()
+        ),
+        key=lambda item: item["hours"],
+        reverse=True,
+    )
+
+    groups = {}
+    for user in roster.by_name.values():
+        if group is None or user.get("group") == group:
+            info = groups.setdefault(
+                user.get("group"),
+                {"group": user.get("group"), "hours": 0, "members": 0, "active": 0},
+            )
+            info["members"] += 1
+    for item in leaderboard:
+        info = groups.setdefault(
+            item["group"],
+            {"group": item["group"], "hours": 0, "members": 0, "active": 0},
+        )
+        info["hours"] = round(info["hours"] + item["hours"], 2)
+        info["active"] += item["days"] > 0
+
+    response = jsonify(
+        {
+            "start": request.args["start"],
+            "end": request.args["end"],
+            "leaderboard": leaderboard[:limit],
+            "groups": sorted(groups.values(), key=lambda g: g["hours"], reverse=True),
+        }
+    )
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+
+@app.route("/heatmap")
+def heatmap():
+    """
+    实验室占用热力图：日期范围内每个时间槽的平均/最高在场人数（整体及按星期）
+    参数: start/end (YYYY-MM-DD，含两端)，group (可选)，slot (时间槽分钟数，默认 5)
+    """
+    if occupancy_heatmap is None:
+        return jsonify({"error": "服务器未安装 numpy，无法生成热力图"}), 501
+    date_range, error = parse_date_range()
+    if error:
+        return error
+    start_ts, end_ts = date_range
+    try:
+        slot_minutes = int(request.args.get("slot", 5))
+    except ValueError:
+        return jsonify({"error": "slot 需为能整除 1440 的正整数"}), 400
+    if slot_minutes <= 0 or 1440 % slot_minutes:
+        return jsonify({"error": "slot 需为能整除 1440 的正整数"}), 400
+
+    roster = roster_watcher.get()
+    names = roster.select(group=request.args.get("group") or None)
+    with database_manager.get_read_connection() as conn:
+        result = occupancy_heatmap(conn, start_ts, end_ts, names, slot_minutes * 60)
+
+    response = jsonify(
+        {
+            "start": request.args["start"],
+            "end": request.args["end"],
+            "members": len(names),
+            **result,
+        }
+    )
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+
+@app.route("/overlap")
+def overlap():
+    """
+    在岗与课表重叠报告：各成员上课期间在实验室的时长、空闲时间利用率与冲突课次
+    参数: start/end (YYYY-MM-DD，含两端)，group (可选)
+    """
+    date_range, error = parse_date_range()
+    if error:
+        return error
+    start_ts, end_ts = date_range
+
+    roster = roster_watcher.get()
+    names = roster.select(group=request.args.get("group") or None)
+    index = schedule_index.get(read_data_versions().get(SCHEDULE_VERSION))
+    with database_manager.get_read_connection() as conn:
+        report = overlap_report(conn, index, names, start_ts, end_ts)
+
+    response = jsonify(
+        {"start": request.args["start"], "end": request.args["end"], "users": report}
+    )
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+
+def refresh_course_schedule():
+    """在进程内刷新课表（首次调用时创建飞书客户端，之后复用）"""
+    global course_manager
+    if course_manager is None:
+        from course_schedule import APIContainer, CourseConfig, CourseManager
+
+        config = CourseConfig()
+        fs_api = APIContainer(
+            app_id=config.app_id, app_secret=config.app_secret, host=config.lark_host
+        )
+        course_manager = CourseManager(config, fs_api)
+
+    if not course_manager.refresh_course_data():
+        raise RuntimeError("课程数据更新失败，详见 course_manager 日志")
+    schedule_index.rebuild()
+    return dict(course_manager.last_stats)
+
+
+course_manager = None
+course_refresh_job = SingleFlightJob(
+    "course_schedule", refresh_course_schedule, logger=logger
+)
+
+
 @app.route("/update_course_schedule")
 def update_course_schedule():
-    Component("course_schedule.py")
-    return "success"
+    """提交课表刷新任务；已有任务在进行时合并到该任务"""
+    submitted, status = course_refresh_job.submit()
+    if not submitted:
+        logger.info("课表刷新任务进行中，本次请求已合并")
+    return jsonify(status), 202
+
+
+@app.route("/update_course_schedule/status")
+def update_course_schedule_status():
+    """课表刷新任务状态：queued / running / done / failed"""
+    return jsonify(course_refresh_job.status())
+
+
+def format_event(row):
+    """事件表记录 -> SSE 消息"""
+    event_id, kind, payload = row
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+@app.route("/events")
+def events():
+    """
+    事件流（Server-Sent Events）：推送会话开始/延长/结束与课表刷新的增量
+    断线重连时浏览器携带 Last-Event-ID，先补发其后的事件；
+    事件由单个后台线程从数据库读取后分发，各连接只等待自己的队列
+    """
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+    subscription, backlog = event_broadcaster.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            for row in backlog:
+                yield format_event(row)
+            while True:
+                row = subscription.get(EVENT_HEARTBEAT)
+                if row:
+                    yield format_event(row)
+                elif subscription.dropped:
+                    break  # 积压过多被移除，断开后由浏览器重连补发
+                else:
+                    yield ": ping\n\n"
+        finally:
+            event_broadcaster.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # 禁止反向代理缓冲
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """
+    Prometheus 指标：本进程的指标与其他进程（考勤服务、课表脚本）写入数据库的快照，
+    以 process 标签区分
+    """
+    with database_manager.get_read_connection() as conn:
+        families, updated = read_published(conn, exclude=METRICS_PROCESS)
+    families[METRICS_PROCESS] = registry.collect()
+    return Response(
+        render_prometheus(families, updated),
+        mimetype="text/plain; version=0.0.4",
+    )
 
 
 @app.route("/")
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 各模块在导入时读取配置，先指向临时目录，避免写入仓库目录下的数据库与日志
+_WORKDIR = tempfile.mkdtemp(prefix="attendance-tests-")
+os.environ.update(
+    DATABASE_PATH=os.path.join(_WORKDIR, "database.db"),
+    ARCHIVE_DIR=os.path.join(_WORKDIR, "archive"),
+    LOG_DIR=os.path.join(_WORKDIR, "logs"),
+)
+# server 等模块按相对路径读取名册
+with open(os.path.join(_WORKDIR, "userlist.json"), "w", encoding="utf-8") as f:
+    json.dump(
+        [
+            {"name": "alice", "group": "machine", "MAC": "02:00:00:00:00:01"},
+            {"name": "bob", "group": "control", "MAC": "02:00:00:00:00:02"},
+        ],
+        f,
+    )
+os.chdir(_WORKDIR)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Archive import ArchiveCatalog  # noqa: E402
+from Database import DatabaseManager, DB_PRAGMAS, DB_READ_PRAGMAS  # noqa: E402
+from Schema import init_schema  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """已升级到最新结构的空数据库"""
+    manager = DatabaseManager(
+        str(tmp_path / "database.db"), DB_PRAGMAS, DB_READ_PRAGMAS
+    )
+    init_schema(manager)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """空的归档目录"""
+    return ArchiveCatalog(str(tmp_path / "archive"))
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import threading
+
+import asgi_server
+import server
+from Schema import parse_date, SECONDS_PER_DAY
+
+
+def _scope(path, query=b""):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query,
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+
+
+async def _request(app, path, query=b""):
+    """发送一个 GET 请求，收齐响应后返回 (status, headers, body)"""
+    messages = []
+    finished = asyncio.Event()
+
+    async def receive():
+        if not messages:
+            messages.append(None)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app(_scope(path, query), receive, send)
+    finished.set()
+    start = sent[0]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+async def _stream(app, path, query=b""):
+    """发送一个 GET 请求，返回发出的全部 ASGI 消息"""
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app(_scope(path, query), receive, send)
+    finished.set()
+    return sent
+
+
+def _run(path, query=b""):
+    async def main():
+        app = asgi_server.AsgiApp()
+        try:
+            return await _request(app, path, query)
+        finally:
+            for executor in (
+                app.reader,
+                app.builder,
+                app.wsgi.executor,
+                app.stream.executor,
+            ):
+                executor.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_fallback_serves_flask_routes():
+    """未由 ASGI 直接处理的路由转发给 Flask 应用"""
+    status, headers, body = _run("/stats", b"start=2024-01-01&end=2024-01-07")
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    json.loads(body)
+
+    status, _, body = _run("/metrics")
+    assert status == 200
+    assert b"# TYPE" in body
+
+    status, _, body = _run("/stats", b"start=2024-13-01&end=2024-01-02")
+    assert status == 400
+
+
+def test_unknown_path_is_flask_404():
+    status, _, _ = _run("/no-such-route")
+    assert status == 404
+
+
+def test_native_route_still_handled():
+    status, headers, body = _run("/get_data", b"date=2024-01-01")
+    assert status == 200
+    assert b"etag" in headers
+
+
+def test_event_stream_unsubscribes_on_disconnect(monkeypatch):
+    """事件流逐块转发，客户端断开后关闭生成器并退订"""
+    monkeypatch.setattr(server, "EVENT_HEARTBEAT", 0.2)
+
+    async def main():
+        app = asgi_server.AsgiApp()
+        received = []
+        first_chunk = asyncio.Event()
+        disconnect = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            received.append(message)
+            if message.get("body"):
+                first_chunk.set()
+
+        task = asyncio.ensure_future(app(_scope("/events"), receive, send))
+        await asyncio.wait_for(first_chunk.wait(), 5)
+        assert server.event_broadcaster.subscriber_count() == 1
+        disconnect.set()
+        await asyncio.wait_for(task, 5)
+        app.stream.executor.executor.shutdown(wait=True)  # 等待后台关闭生成器
+        for executor in (app.reader, app.builder, app.wsgi.executor):
+            executor.shutdown()
+        return received
+
+    received = asyncio.run(main())
+    assert received[0]["status"] == 200
+    assert dict(received[0]["headers"])[b"content-type"].startswith(
+        b"text/event-stream"
+    )
+    assert received[1]["body"].startswith(b"retry: 3000")
+    assert server.event_broadcaster.subscriber_count() == 0
+
+
+def test_streamed_range_finishes_on_one_thread():
+    """
+    流式响应在同一线程内生成并关闭：响应正常结束，
+    各工作线程不残留借出的只读连接
+    """
+    day_ts = parse_date("2024-03-01")
+    with server.database_manager.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            [
+                (name, day_ts + day * SECONDS_PER_DAY + offset, end)
+                for day in range(59)
+                for name, offset in (("alice", 9 * 3600), ("bob", 14 * 3600))
+                for end in [day_ts + day * SECONDS_PER_DAY + offset + 7200]
+            ],
+        )
+    query = b"start=2024-03-01&end=2024-04-29"
+
+    async def main():
+        app = asgi_server.AsgiApp(wsgi_workers=2)
+        try:
+            results = await asyncio.gather(
+                *(_stream(app, "/get_range", query) for _ in range(4))
+            )
+            # 两个工作线程各执行一次，检查线程局部的连接状态
+            barrier = threading.Barrier(2)
+            local = server.database_manager.read_pool._local
+
+            def probe():
+                barrier.wait(5)
+                return getattr(local, "conn", None), getattr(local, "depth", 0)
+
+            leftovers = await asyncio.gather(
+                *(app.wsgi.executor.call(probe) for _ in range(2))
+            )
+            return results, leftovers
+        finally:
+            for executor in (
+                app.reader,
+                app.builder,
+                app.wsgi.executor,
+                app.stream.executor,
+            ):
+                executor.shutdown()
+
+    results, leftovers = asyncio.run(main())
+    for messages in results:
+        assert messages[0]["status"] == 200
+        bodies = messages[1:]
+        assert len(bodies) > 2  # 逐块转发
+        assert all(m["more_body"] for m in bodies[:-1])
+        assert bodies[-1]["more_body"] is False
+        lines = b"".join(m["body"] for m in bodies).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        assert sum(1 for r in records if r.get("name") == "alice") == 59
+    assert leftovers == [(None, 0), (None, 0)]
@@ -0,0 +1,59 @@
+import json
+import os
+
+import Logger
+
+
+def _log_exception(logger):
+    try:
+        {}["missing"]
+    except KeyError:
+        logger.exception("处理 %s 失败", "任务")
+
+
+def _read_lines(log_dir):
+    # 停止后台写线程，确保队列中的记录已写入文件
+    Logger._listeners.pop().stop()
+    (filename,) = os.listdir(log_dir)
+    with open(os.path.join(log_dir, filename), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_json_log_keeps_exception_separate(tmp_path, monkeypatch):
+    monkeypatch.setattr(Logger, "LOG_FORMAT", "json")
+    log_dir = str(tmp_path / "json")
+    _log_exception(Logger.setup_logger("test-json", log_dir))
+
+    (line,) = _read_lines(log_dir)
+    entry = json.loads(line)
+    assert entry["message"] == "处理 任务 失败"
+    assert entry["level"] == "ERROR"
+    assert "Traceback" in entry["exc"]
+    assert "KeyError: 'missing'" in entry["exc"]
+
+
+def test_text_log_appends_exception(tmp_path, monkeypatch):
+    monkeypatch.setattr(Logger, "LOG_FORMAT", "text")
+    log_dir = str(tmp_path / "text")
+    _log_exception(Logger.setup_logger("test-text", log_dir))
+
+    lines = _read_lines(log_dir)
+    assert lines[0].endswith("ERROR - 处理 任务 失败")
+    assert lines[1] == "Traceback (most recent call last):"
+    assert lines[-1] == "KeyError: 'missing'"
+
+
+def test_setup_logger_adds_handler_once(tmp_path):
+    log_dir = str(tmp_path / "once")
+    logger = Logger.setup_logger("test-once", log_dir)
+    assert Logger.setup_logger("test-once", log_dir) is logger
+    assert len(logger.handlers) == 1
+
+
+def test_rate_limiter():
+    limiter = Logger.RateLimiter(60)
+    assert limiter.allow(now=0) == (True, 0)
+    assert limiter.allow(now=10) == (False, 1)
+    assert limiter.allow(now=59) == (False, 2)
+    assert limiter.allow(now=60) == (True, 2)
+    assert limiter.allow(now=61) == (False, 1)
@@ -0,0 +1,153 @@
+import random
+import re
+
+from Archive import overlapping_sessions, run_archive
+from Schema import parse_date, SECONDS_PER_DAY, ATTENDANCE_MAX_SPAN, write_meta
+
+HOUR = 3600
+
+
+def _insert(db, sessions):
+    with db.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            sessions,
+        )
+        write_meta(
+            conn,
+            ATTENDANCE_MAX_SPAN,
+            max(end - start for _, start, end in sessions),
+        )
+
+
+def _random_sessions(rng, first_ts, days):
+    """普通会话若干，外加几段跨数天到一年的长会话"""
+    sessions = []
+    for i in range(2000):
+        start = first_ts + rng.randrange(days * SECONDS_PER_DAY)
+        sessions.append((f"user{i % 20}", start, start + rng.randrange(12 * HOUR)))
+    for span_days in (1, 3, 40, 365):
+        start = first_ts + rng.randrange(days * SECONDS_PER_DAY)
+        sessions.append(("lab-pc", start, start + span_days * SECONDS_PER_DAY))
+    # 恰好一天（长会话的边界）与恰好从范围起点前一天开始的短会话
+    sessions.append(("edge", first_ts, first_ts + SECONDS_PER_DAY))
+    sessions.append(("edge", first_ts + 1, first_ts + SECONDS_PER_DAY))
+    return sessions
+
+
+def _query(db, start_ts, end_ts, catalog):
+    params = {"range_start": start_ts, "range_end": end_ts}
+    with db.get_read_connection() as conn:
+        return sorted(
+            row
+            for sessions in overlapping_sessions(
+                conn, start_ts, end_ts, catalog=catalog
+            )
+            for row in conn.execute(sessions, params)
+        )
+
+
+def _expected(sessions, start_ts, end_ts):
+    return sorted(
+        (name, start, end)
+        for name, start, end in sessions
+        if start < end_ts and end >= start_ts
+    )
+
+
+def _ranges(rng, first_ts, days):
+    for _ in range(200):
+        start = first_ts + rng.randrange(-10, days + 10) * SECONDS_PER_DAY
+        yield start, start + rng.choice([1, 1, 7, 31, 400]) * SECONDS_PER_DAY
+
+
+def test_overlap_matches_full_scan(db, catalog):
+    """分开查找长短会话的结果与逐条判断交集一致"""
+    rng = random.Random(1)
+    first_ts = parse_date("2024-01-01")
+    sessions = _random_sessions(rng, first_ts, 120)
+    _insert(db, sessions)
+
+    for start_ts, end_ts in _ranges(rng, first_ts, 120):
+        assert _query(db, start_ts, end_ts, catalog) == _expected(
+            sessions, start_ts, end_ts
+        )
+
+
+def test_overlap_matches_full_scan_with_archive(db, catalog):
+    """部分月份已归档时，按各月最长会话附加归档文件，结果仍与逐条判断一致"""
+    rng = random.Random(2)
+    first_ts = parse_date("2024-01-01")
+    sessions = _random_sessions(rng, first_ts, 240)
+    _insert(db, sessions)
+    now_ts = first_ts + 240 * SECONDS_PER_DAY
+    result = run_archive(
+        db, now_ts, keep_months=2, compact_mode="none", catalog=catalog
+    )
+    assert result["archived"]
+
+    for start_ts, end_ts in _ranges(rng, first_ts, 240):
+        assert _query(db, start_ts, end_ts, catalog) == _expected(
+            sessions, start_ts, end_ts
+        )
+
+
+def test_long_session_does_not_widen_scan(db, catalog):
+    """个别长会话不应让单日查询的扫描下界退回到该会话的开始时间"""
+    first_ts = parse_date("2024-01-01")
+    sessions = [("lab-pc", first_ts, first_ts + 365 * SECONDS_PER_DAY)]
+    sessions += [
+        (
+            "user",
+            first_ts + day * SECONDS_PER_DAY,
+            first_ts + day * SECONDS_PER_DAY + HOUR,
+        )
+        for day in range(300)
+    ]
+    _insert(db, sessions)
+
+    day_ts = first_ts + 200 * SECONDS_PER_DAY
+    params = {"range_start": day_ts, "range_end": day_ts + SECONDS_PER_DAY}
+    with db.get_read_connection() as conn:
+        (query,) = overlapping_sessions(
+            conn, day_ts, day_ts + SECONDS_PER_DAY, catalog=catalog
+        )
+        plan = " ".join(
+            row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        )
+    assert "idx_attendance_start (start_time>? AND start_time<?)" in plan
+    assert "idx_attendance_long" in plan
+
+
+def test_archive_months_attached_by_own_span(db, catalog):
+    """归档月份按各自的最长会话判断，近期的单日查询不附加早期月份"""
+    first_ts = parse_date("2024-01-01")
+    sessions = [
+        (
+            "user",
+            first_ts + day * SECONDS_PER_DAY,
+            first_ts + day * SECONDS_PER_DAY + HOUR,
+        )
+        for day in range(200)
+    ]
+    # 主库中的长会话不影响归档月份的判断
+    sessions.append(
+        ("lab-pc", first_ts + 160 * SECONDS_PER_DAY, first_ts + 199 * SECONDS_PER_DAY)
+    )
+    _insert(db, sessions)
+    now_ts = first_ts + 200 * SECONDS_PER_DAY
+    run_archive(db, now_ts, keep_months=1, compact_mode="none", catalog=catalog)
+
+    def attached(day_ts):
+        with db.get_read_connection() as conn:
+            queries = list(
+                overlapping_sessions(
+                    conn, day_ts, day_ts + SECONDS_PER_DAY, catalog=catalog
+                )
+            )
+        return set(re.findall(r"archive_\d{6}", " ".join(queries)))
+
+    assert attached(parse_date("2024-07-14")) == set()
+    assert attached(parse_date("2024-05-10")) == {"archive_202405"}
+    # 月初的查询仍需附加上个月（上月末开始的会话可能延续到当天）
+    assert attached(parse_date("2024-05-01")) == {"archive_202404", "archive_202405"}
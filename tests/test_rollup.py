@@ -0,0 +1,206 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import attendance
+from Archive import run_archive
+from PresenceLog import PresenceLogWriter, rebuild_attendance
+from Rollup import rebuild_rollup, split_by_day
+from Schema import parse_date, to_timestamp, SECONDS_PER_DAY
+
+TICK = timedelta(minutes=5)
+
+
+@pytest.fixture
+def service(db, tmp_path):
+    """不连接路由器的考勤服务，写入测试数据库"""
+    (tmp_path / "userlist.json").write_text("[]", encoding="utf-8")
+    config = SimpleNamespace(
+        USER_MAC_LIST_PATH=str(tmp_path / "userlist.json"),
+        ROUTER_URLS=["http://127.0.0.1:9"],
+        ROUTER_PWDS=["test"],
+        MERGE_GAP_SECONDS=1800,
+        POLL_INTERVAL=300,
+        POLL_MIN_INTERVAL=60,
+        POLL_MAX_INTERVAL=900,
+        LOG_SUMMARY_INTERVAL=900,
+    )
+    service = attendance.AttendanceService(config)
+    service.db = db
+    service._rebuild_session_cache()
+    yield service
+    service.router.executor.shutdown(wait=False)
+
+
+def _rollup(db):
+    with db.get_connection() as conn:
+        return conn.execute(
+            "SELECT name, day, seconds, sessions FROM daily_rollup ORDER BY name, day"
+        ).fetchall()
+
+
+def _rebuilt(db, start_ts=None, end_ts=None):
+    with db.get_connection() as conn:
+        rebuild_rollup(conn.cursor(), start_ts, end_ts)
+    return _rollup(db)
+
+
+def _presence(rng, ticks):
+    """
+    各用户每个节拍是否在线：
+    always 连续在线数天（会话原地延长并跨越多个零点），
+    night 每晚在线到次日凌晨，其余用户随机上下线（离开时长有长有短）
+    """
+    for i in range(ticks):
+        current = datetime(2024, 3, 1) + i * TICK
+        names = ["always"]
+        if current.hour >= 20 or current.hour < 3:
+            names.append("night")
+        for user in ("a", "b", "c"):
+            if rng.random() < 0.6:
+                names.append(user)
+        yield current, names
+
+
+def test_tick_rollup_matches_rebuild(service, db):
+    """批量写入（_apply_tick）增量维护的汇总与从考勤表重建的结果一致"""
+    rng = random.Random(0)
+    for current, names in _presence(rng, 4 * 288):
+        service._apply_tick(names, current)
+
+    incremental = _rollup(db)
+    assert {name for name, *_ in incremental} == {"always", "night", "a", "b", "c"}
+    with db.get_connection() as conn:
+        spans = conn.execute(
+            "SELECT MAX(end_time - start_time) FROM attendance WHERE name = 'always'"
+        ).fetchone()[0]
+    assert spans > 3 * SECONDS_PER_DAY  # 覆盖跨多天、原地延长的会话
+    assert incremental == _rebuilt(db)
+
+
+def test_record_rollup_matches_rebuild(service, db):
+    """逐用户写入（_update_attendance_record）增量维护的汇总与重建结果一致"""
+    rng = random.Random(1)
+    for current, names in _presence(rng, 2 * 288):
+        for name in names:
+            service._update_attendance_record(name, current)
+
+    incremental = _rollup(db)
+    assert incremental == _rebuilt(db)
+
+
+def test_partial_rebuild_keeps_other_days(service, db):
+    """只重建部分日期时，范围外的汇总保持不变，范围内与整体重建一致"""
+    rng = random.Random(2)
+    for current, names in _presence(rng, 3 * 288):
+        service._apply_tick(names, current)
+
+    full = _rollup(db)
+    day_ts = parse_date("2024-03-02")
+    assert _rebuilt(db, day_ts, day_ts + SECONDS_PER_DAY) == full
+
+
+def test_split_by_day():
+    day_ts = parse_date("2024-03-01")
+    assert split_by_day(day_ts + 3600, day_ts + 3600) == []
+    assert split_by_day(day_ts - 60, day_ts + 2 * SECONDS_PER_DAY + 30) == [
+        (day_ts - SECONDS_PER_DAY, 60),
+        (day_ts, SECONDS_PER_DAY),
+        (day_ts + SECONDS_PER_DAY, SECONDS_PER_DAY),
+        (day_ts + 2 * SECONDS_PER_DAY, 30),
+    ]
+
+
+def test_rebuild_includes_archived_months(db, catalog):
+    """重建范围覆盖已归档的月份时，汇总行不丢失（含跨月进入主库月份的会话）"""
+    first_ts = parse_date("2024-01-01")
+    hour = 3600
+    sessions = [
+        (
+            "alice",
+            first_ts + day * SECONDS_PER_DAY + 9 * hour,
+            first_ts + day * SECONDS_PER_DAY + 12 * hour,
+        )
+        for day in range(0, 90, 3)
+    ]
+    # 1 月 31 日晚开始、持续到 2 月 1 日凌晨的会话
+    crossing = parse_date("2024-01-31") + 22 * hour
+    sessions.append(("bob", crossing, crossing + 5 * hour))
+    with db.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            sessions,
+        )
+        rebuild_rollup(conn.cursor(), catalog=catalog)
+    expected = _rollup(db)
+
+    result = run_archive(
+        db,
+        parse_date("2024-03-15"),
+        keep_months=1,
+        compact_mode="none",
+        catalog=catalog,
+    )
+    assert list(result["archived"]) == ["2024-01"]
+
+    with db.get_connection() as conn:
+        rebuild_rollup(conn.cursor(), catalog=catalog)
+    assert _rollup(db) == expected
+
+    # 只重建主库中的 2 月，跨月会话在 2 月 1 日的部分仍来自归档文件
+    feb_ts = parse_date("2024-02-01")
+    with db.get_connection() as conn:
+        rebuild_rollup(conn.cursor(), feb_ts, parse_date("2024-03-01"), catalog)
+    assert _rollup(db) == expected
+    assert ("bob", feb_ts, 3 * hour, 0) in expected
+
+
+def test_replay_rebuilds_days_without_presence(db, tmp_path):
+    """日志回放：无人在线的时段不报错，旧会话所在日期的汇总随之清除"""
+    day_ts = parse_date("2024-03-04")
+    hour = 3600
+    with db.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            (
+                "alice",
+                day_ts + SECONDS_PER_DAY + 9 * hour,
+                day_ts + SECONDS_PER_DAY + 12 * hour,
+            ),
+        )
+        rebuild_rollup(conn.cursor())
+    assert _rollup(db)
+
+    # 日志中两天都无人在线（只有空的轮询记录）
+    path = str(tmp_path / "presence.log")
+    writer = PresenceLogWriter(path)
+    for ts in range(day_ts, day_ts + 2 * SECONDS_PER_DAY, 1800):
+        writer.append(ts, [], ["alice", "bob"])
+    writer.close()
+
+    assert rebuild_attendance(db, path, merge_gap=1800) == (1, 0)
+    assert _rollup(db) == []
+
+
+def test_archive_keeps_open_sessions(service, db, catalog):
+    """仍在延长的长会话（开始于待归档月份）留在主库，考勤服务可继续延长"""
+    now = datetime(2024, 3, 15, 12)
+    service._apply_tick(["bob"], datetime(2024, 1, 10, 9))
+    current = datetime(2024, 1, 31, 22)
+    while current <= now:
+        service._apply_tick(["alice"], current)
+        current += timedelta(minutes=20)
+
+    result = run_archive(
+        db, to_timestamp(now), keep_months=1, compact_mode="none", catalog=catalog
+    )
+    assert result["archived"] == {"2024-01": 1}  # 只移出已结束的 bob 会话
+
+    service._apply_tick(["alice"], now + TICK)
+    with db.get_connection() as conn:
+        (end_ts,) = conn.execute(
+            "SELECT MAX(end_time) FROM attendance WHERE name = 'alice'"
+        ).fetchone()
+    assert end_ts == to_timestamp(now + TICK)
@@ -0,0 +1,50 @@
+import threading
+from types import SimpleNamespace
+
+from attendance import RouterPoller
+
+
+class _SlowClient:
+    """首次请求阻塞到 release 置位，记录同时执行的请求数"""
+
+    url = "http://router.test"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def fetch_devices(self):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            first = self.calls == 1
+        try:
+            if first:
+                self.release.wait(5)
+            return [{"mac": "02:00:00:00:00:01"}]
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_timed_out_router_is_not_polled_concurrently():
+    client = _SlowClient()
+    poller = RouterPoller(SimpleNamespace(ROUTER_TIMEOUT=0.1), clients=[client])
+    try:
+        assert poller.get_online_devices() == []  # 超时
+        assert poller.get_online_devices() == []  # 上次请求未返回，跳过
+        assert client.calls == 1
+
+        client.release.set()
+        poller.pending[client.url].result(5)
+        assert len(poller.get_online_devices()) == 1
+        assert client.calls == 2
+        assert client.max_running == 1
+        assert poller.stats[client.url]["failures"] == 2
+    finally:
+        client.release.set()
+        poller.executor.shutdown(wait=True)
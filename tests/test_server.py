@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+import server
+from PresenceLog import PresenceLogWriter, rebuild_attendance
+from Schema import parse_date
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+def _skip_without_numpy(path):
+    if path == "/heatmap" and server.occupancy_heatmap is None:
+        pytest.skip("numpy 不可用")
+
+
+@pytest.mark.parametrize("path", ["/stats", "/heatmap", "/overlap", "/get_range"])
+@pytest.mark.parametrize(
+    "query, message",
+    [
+        ("start=2024-13-01&end=2024-01-02", "YYYY-MM-DD"),
+        ("start=2024-01-01", "YYYY-MM-DD"),
+        ("start=2024-01-02&end=2024-01-01", "结束日期不能早于起始日期"),
+    ],
+)
+def test_invalid_date_range(client, path, query, message):
+    _skip_without_numpy(path)
+    response = client.get(f"{path}?{query}")
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("path", ["/heatmap", "/overlap", "/get_range"])
+def test_range_too_long(client, path):
+    _skip_without_numpy(path)
+    response = client.get(f"{path}?start=2020-01-01&end=2024-01-01")
+    assert response.status_code == 400
+    assert str(server.MAX_RANGE_DAYS) in response.get_json()["error"]
+
+
+def test_stats_range_not_limited(client):
+    response = client.get("/stats?start=2020-01-01&end=2024-01-01")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("limit", ["-1", "abc", "1.5"])
+def test_stats_invalid_limit(client, limit):
+    response = client.get(f"/stats?start=2024-01-01&end=2024-01-07&limit={limit}")
+    assert response.status_code == 400
+    assert "limit" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("limit, expected", [("0", 2), ("1", 1)])
+def test_stats_limit(client, limit, expected):
+    day_ts = parse_date("2024-01-03")
+    with server.database_manager.get_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO daily_rollup VALUES (?, ?, ?, ?)",
+            [("alice", day_ts, 7200, 1), ("bob", day_ts, 3600, 1)],
+        )
+    response = client.get(f"/stats?start=2024-01-01&end=2024-01-07&limit={limit}")
+    assert response.status_code == 200
+    leaderboard = response.get_json()["leaderboard"]
+    assert [item["name"] for item in leaderboard] == ["alice", "bob"][:expected]
+
+
+def test_history_rewrite_invalidates_closed_day(client, tmp_path):
+    """日志回放改写已结束日期后，该日期的 ETag 与内容随之更新"""
+    day_ts = parse_date("2024-02-01")
+    hour = 3600
+    with server.database_manager.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            [
+                ("alice", day_ts + 9 * hour, day_ts + 10 * hour),
+                ("alice", day_ts + 10 * hour + 1200, day_ts + 11 * hour),
+            ],
+        )
+    first = client.get("/get_data?date=2024-02-01")
+    etag = first.headers["ETag"]
+    assert "public" in first.headers["Cache-Control"]
+    assert (
+        client.get(
+            "/get_data?date=2024-02-01", headers={"If-None-Match": etag}
+        ).status_code
+        == 304
+    )
+
+    # 按更长的合并间隔回放，两段会话合并为一段
+    path = str(tmp_path / "presence.log")
+    writer = PresenceLogWriter(path)
+    for ts in range(day_ts + 9 * hour, day_ts + 11 * hour + 1, 300):
+        if not day_ts + 10 * hour < ts < day_ts + 10 * hour + 1200:
+            writer.append(ts, ["alice"], ["alice", "bob"])
+    writer.close()
+    rebuild_attendance(server.database_manager, path, merge_gap=1800)
+
+    second = client.get("/get_data?date=2024-02-01", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != etag
+    (alice,) = [user for user in second.get_json() if user["name"] == "alice"]
+    assert len(alice["date"]["2024-02-01"]) == 1
+
+
+def test_get_range_records_carry_session_id(client):
+    """范围查询的每段记录带会话 id，跨天会话在各天使用同一 id"""
+    day_ts = parse_date("2024-05-10")
+    with server.database_manager.get_connection() as conn:
+        record_id = conn.execute(
+            "INSERT INTO attendance (name, start_time, end_time) VALUES (?, ?, ?)",
+            ("bob", day_ts + 22 * 3600, day_ts + 26 * 3600),
+        ).lastrowid
+    response = client.get("/get_range?start=2024-05-10&end=2024-05-11")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    records = [line for line in lines if line.get("name") == "bob"]
+    assert [record["day"] for record in records] == ["2024-05-10", "2024-05-11"]
+    for record in records:
+        (session,) = record["date"][record["day"]]
+        assert session["id"] == record_id